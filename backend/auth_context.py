@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, select
+
+import models
+from database import AsyncSessionLocal, SessionLocal
+
+load_dotenv()
+
+
+@dataclass(frozen=True)
+class PlanInfo:
+    id: int
+    name: str
+    price: float
+    currency: str
+    tokens_per_month: int
+    requests_per_minute: int
+    burst: int
+
+
+@dataclass(frozen=True)
+class SubscriptionInfo:
+    id: int
+    plan_id: int
+    status: str
+    start_date: datetime
+    end_date: Optional[datetime]
+    used_tokens: int     # as of load time; live value is in utils.quota
+    tokens_reset_at: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class AuthContext:
+    """Everything an authenticated request needs about its user."""
+    id: int
+    email: str
+    role: str
+    created_at: datetime
+    subscription: Optional[SubscriptionInfo]
+    plan: Optional[PlanInfo]
+
+
+def _context_query(user_id: int):
+    """User + latest active subscription + its plan in a single query."""
+    return (
+        select(models.User, models.Subscription, models.Plan)
+        .outerjoin(
+            models.Subscription,
+            and_(
+                models.Subscription.user_id == models.User.id,
+                models.Subscription.status == "active",
+            ),
+        )
+        .outerjoin(models.Plan, models.Plan.id == models.Subscription.plan_id)
+        .where(models.User.id == user_id)
+        .order_by(models.Subscription.start_date.desc())
+        .limit(1)
+    )
+
+
+def _to_context(row) -> Optional[AuthContext]:
+    if row is None:
+        return None
+
+    user, sub, plan = row
+    return AuthContext(
+        id=user.id,
+        email=user.email,
+        role=user.role,
+        created_at=user.created_at,
+        subscription=SubscriptionInfo(
+            id=sub.id,
+            plan_id=sub.plan_id,
+            status=sub.status,
+            start_date=sub.start_date,
+            end_date=sub.end_date,
+            used_tokens=sub.used_tokens or 0,
+            tokens_reset_at=sub.tokens_reset_at,
+        ) if sub else None,
+        plan=PlanInfo(
+            id=plan.id,
+            name=plan.name,
+            price=plan.price,
+            currency=plan.currency,
+            tokens_per_month=plan.tokens_per_month,
+            requests_per_minute=plan.requests_per_minute,
+            burst=plan.burst,
+        ) if plan else None,
+    )
+
+
+def load_auth_context(user_id: int) -> Optional[AuthContext]:
+    db = SessionLocal()
+    try:
+        return _to_context(db.execute(_context_query(user_id)).first())
+    finally:
+        db.close()
+
+
+async def load_auth_context_async(user_id: int) -> Optional[AuthContext]:
+    async with AsyncSessionLocal() as db:
+        return _to_context((await db.execute(_context_query(user_id))).first())
+
+
+class AuthContextCache:
+    """
+    Bounded LRU + TTL cache of AuthContext by user id.
+
+    Writes that change a user's subscription call `invalidate(user_id)`,
+    plan changes call `clear()`. The TTL bounds staleness in other workers.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 10_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # user_id -> (ctx, expires_at)
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def get(self, user_id: int) -> Optional[AuthContext]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def _store(self, user_id: int, ctx: Optional[AuthContext], generation: int):
+        if ctx is None:
+            return
+        with self._lock:
+            # don't store a row read before an invalidation that raced with us
+            if generation == self._generation:
+                self._entries[user_id] = (ctx, time.monotonic() + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+    def load(self, user_id: int) -> Optional[AuthContext]:
+        """Cache miss path: query the DB and remember the result."""
+        with self._lock:
+            generation = self._generation
+        ctx = load_auth_context(user_id)
+        self._store(user_id, ctx, generation)
+        return ctx
+
+    async def aload(self, user_id: int) -> Optional[AuthContext]:
+        """Same as load(), on the async engine."""
+        with self._lock:
+            generation = self._generation
+        ctx = await load_auth_context_async(user_id)
+        self._store(user_id, ctx, generation)
+        return ctx
+
+    def get_or_load(self, user_id: int) -> Optional[AuthContext]:
+        return self.get(user_id) or self.load(user_id)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+auth_cache = AuthContextCache(
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60")),
+    max_size=int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000")),
+)
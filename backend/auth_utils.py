@@ -1,6 +1,10 @@
+import asyncio
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from jose import jwt, JWTError
 from passlib.context import CryptContext
@@ -12,7 +16,10 @@ SECRET_KEY = os.getenv("JWT_SECRET", "change_this_in_env")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 day
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; hashes made with another cost are re-hashed on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -25,6 +32,76 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify, and return a new hash if the stored one uses an outdated cost."""
+    plain_password = plain_password[:72]
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordPoolBusy(Exception):
+    """Too many hashes queued; the caller should fail fast (503)."""
+
+
+class PasswordHasherPool:
+    """
+    Runs bcrypt in a small process pool so hashing neither holds the GIL
+    nor a threadpool slot of the API worker.
+
+    At most `max_workers + max_queue` calls are in flight; past that
+    `PasswordPoolBusy` is raised at once instead of queueing forever.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that already runs threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                raise PasswordPoolBusy()
+            self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordHasherPool(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(os.cpu_count() or 1, 4)))),
+    max_queue=int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32")),
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password in the process pool."""
+    return await password_pool.run(verify_and_update_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash in the process pool."""
+    return await password_pool.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
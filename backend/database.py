@@ -1,19 +1,89 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
 
+from utils.db_metrics import instrument, timed_pool_class
+
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-)
+# Connection pool, per engine and worker process (see README "Database Access")
+POOL_CONFIG = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    # always: ping on every checkout / idle: only connections idle for more
+    # than DB_POOL_PING_IDLE seconds / never: rely on pool_recycle
+    "pre_ping": os.getenv("DB_POOL_PRE_PING", "idle").lower(),
+    "ping_idle": float(os.getenv("DB_POOL_PING_IDLE", "30")),
+}
+
+
+def _engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    pool_class = parsed.get_dialect().get_pool_class(parsed)
+    options = {"pool_pre_ping": POOL_CONFIG["pre_ping"] not in ("idle", "never")}
+    # SQLite in-memory etc. use single-connection pools without sizing
+    if issubclass(pool_class, QueuePool):
+        options.update(
+            poolclass=timed_pool_class(pool_class),
+            pool_size=POOL_CONFIG["pool_size"],
+            max_overflow=POOL_CONFIG["max_overflow"],
+            pool_timeout=POOL_CONFIG["pool_timeout"],
+            pool_recycle=POOL_CONFIG["pool_recycle"],
+        )
+    return options
 
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+instrument("sync", engine, POOL_CONFIG["pre_ping"], POOL_CONFIG["ping_idle"])
+
+# Sync engine: seeders, migrations, scripts and the background workers
 SessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine
 )
 
+# asyncio drivers for the same database, used by the API routers
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """DATABASE_URL with its asyncio driver, e.g. mysql+pymysql -> mysql+aiomysql."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(
+        hide_password=False
+    )
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+instrument("async", async_engine.sync_engine, POOL_CONFIG["pre_ping"], POOL_CONFIG["ping_idle"])
+
+# expire_on_commit=False: committed objects keep their loaded attributes
+# instead of lazy-loading them again (which AsyncSession can't do implicitly)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
+
+
+def run_migrations(revision: str = "head"):
+    """Apply Alembic migrations (same as `alembic upgrade head`)."""
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(BASE_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BASE_DIR, "migrations"))
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, revision)
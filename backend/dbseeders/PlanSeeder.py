@@ -7,26 +7,32 @@ def run(db: Session):
         plans = [
             Plan(
                 name="Free Tier",
-                description="Features: Limited response speed\nTokens/Month: 50 requests",
+                description="Features: Limited response speed\nTokens/Month: 50K tokens",
                 price=0,
                 currency="INR",
-                tokens_per_month=50,
+                tokens_per_month=50_000,
+                requests_per_minute=6,
+                burst=3,
                 is_active=True,
             ),
             Plan(
                 name="Pro Monthly",
-                description="Features: Fast responses\nTokens/Month: 1000 requests",
+                description="Features: Fast responses\nTokens/Month: 1M tokens",
                 price=299,
                 currency="INR",
-                tokens_per_month=1000,
+                tokens_per_month=1_000_000,
+                requests_per_minute=30,
+                burst=10,
                 is_active=True,
             ),
             Plan(
                 name="Pro Plus",
-                description="Features: Priority support\nTokens/Month: 3000 requests",
+                description="Features: Priority support\nTokens/Month: 3M tokens",
                 price=599,
                 currency="INR",
-                tokens_per_month=3000,
+                tokens_per_month=3_000_000,
+                requests_per_minute=60,
+                burst=20,
                 is_active=True,
             )
         ]
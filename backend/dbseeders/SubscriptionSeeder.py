@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from models import Subscription, User, Plan
 from datetime import datetime, timedelta
+from utils.scheduler import TOKEN_PERIOD
 
 
 def create_subscription(db: Session, user: User, plan: Plan):
@@ -10,13 +11,15 @@ def create_subscription(db: Session, user: User, plan: Plan):
     ).first()
 
     if not existing_sub:
+        now = datetime.utcnow()
         new_subscription = Subscription(
             user_id=user.id,
             plan_id=plan.id,
             status="active",
-            start_date=datetime.utcnow(),
-            end_date=datetime.utcnow() + timedelta(days=365),
+            start_date=now,
+            end_date=None if plan.price == 0 else now + timedelta(days=365),
             used_tokens=0,
+            tokens_reset_at=now + TOKEN_PERIOD,
         )
         db.add(new_subscription)
         db.commit()
@@ -1,26 +1,26 @@
+from typing import AsyncIterator
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
+from database import AsyncSessionLocal
 from auth_utils import decode_access_token
-import models
+from auth_context import AuthContext, auth_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> models.User:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> AuthContext:
+    """
+    Resolve the JWT to an AuthContext (user + active subscription + plan).
+    Served from auth_cache, so a warm request does no DB query at all.
+    """
     payload = decode_access_token(token)
     if payload is None:
         raise HTTPException(
@@ -34,7 +34,9 @@ def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload",
         )
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+    user = auth_cache.get(int(user_id))
+    if user is None:
+        user = await auth_cache.aload(int(user_id))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -44,8 +46,8 @@ def get_current_user(
 
 
 def get_current_admin(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
+    current_user: AuthContext = Depends(get_current_user),
+) -> AuthContext:
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
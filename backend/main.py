@@ -1,33 +1,87 @@
-import uvicorn
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
-from database import Base, engine, SessionLocal
 from routers import (
     auth,
     chat,
+    conversations,
     plans,
     payments,
     subscriptions,
     admin_plans,
     admin_billing,
+    admin_metrics,
 )
-from dbseeders.PlanSeeder import run as seed_plans
-from dbseeders.UserSeeder import run as seed_admin
-from dbseeders.SubscriptionSeeder import run as seed_admin_subscription
+from auth_utils import password_pool
+from database import async_engine
+from utils.ai_client import close_clients
+from utils.mailer import mailer
+from utils.quota import reconcile_quotas, run_quota_flusher
+from utils.db_metrics import ServerTimingMiddleware
+from utils.rate_limit import RateLimitMiddleware
+from utils.archive import run_archive_worker
+from utils.rollups import run_rollup_worker
+from utils.scheduler import run_scheduler
+from utils.write_buffer import write_buffer
+from utils.jobs import JOBS_IN_PROCESS, run_job_worker
+import utils.billing_jobs  # noqa: F401  (registers the invoice job handlers)
+
+load_dotenv()
+
+# Importing this module has no side effects: migrate + seed with
+# `python manage.py setup`, or set AUTO_INIT_DB=true (development).
+AUTO_INIT_DB = os.getenv("AUTO_INIT_DB", "false").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_INIT_DB:
+        from manage import init_db, seed_db
 
-# Create DB Tables if not exist
-Base.metadata.create_all(bind=engine)
+        await run_in_threadpool(init_db)
+        await run_in_threadpool(seed_db)
+
+    # Token counters live in memory / Redis and are flushed to the DB in batches
+    reconcile_quotas()
+    quota_flusher = asyncio.create_task(run_quota_flusher())
+    # usage_logs -> usage_daily for the admin dashboard
+    rollup_worker = asyncio.create_task(run_rollup_worker())
+    # old chat_messages -> chat_messages_archive
+    archive_worker = asyncio.create_task(run_archive_worker())
+    # group commit of usage logs / chat replies (WRITE_BUFFER_MODE)
+    write_flusher = asyncio.create_task(write_buffer.run())
+    # subscription expiry / monthly token reset (one API process at a time)
+    scheduler = asyncio.create_task(run_scheduler())
+    tasks = [quota_flusher, rollup_worker, archive_worker, write_flusher, scheduler]
+    # Invoice / email jobs, unless a separate `python worker.py` runs them
+    if JOBS_IN_PROCESS:
+        tasks.append(asyncio.create_task(run_job_worker()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Close pooled AI provider connections
+    await close_clients()
+    await mailer.close()
+    password_pool.shutdown()
+    await async_engine.dispose()
 
-# Insert seed data
-db = SessionLocal()
-seed_plans(db)
-seed_admin(db)
-seed_admin_subscription(db)
-db.close()
 
 # FastAPI App
-app = FastAPI(title="UKSChat - AI SaaS Backend")
+app = FastAPI(title="UKSChat - AI SaaS Backend", lifespan=lifespan)
+
+# Per-user, per-plan rate limit on chat requests (added first so CORS
+# headers are still set on 429 responses)
+app.add_middleware(RateLimitMiddleware, paths=("/chat",))
+
+# DB query / pool checkout time of each request, as a Server-Timing header
+app.add_middleware(ServerTimingMiddleware)
 
 # CORS (Cross-Origin Resource Sharing)
 app.add_middleware(
@@ -42,6 +96,7 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(plans.router)
 app.include_router(chat.router)
+app.include_router(conversations.router)
 
 # User Billing API
 app.include_router(payments.router)
@@ -50,6 +105,7 @@ app.include_router(subscriptions.router)
 # Admin API
 app.include_router(admin_plans.router)
 app.include_router(admin_billing.router)
+app.include_router(admin_metrics.router)
 
 
 @app.get("/")
@@ -58,4 +114,6 @@ def root():
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,125 @@
+"""
+Management commands, run from the backend directory:
+
+    python manage.py init-db        apply Alembic migrations (alembic upgrade head)
+    python manage.py seed           insert default plans, admin/user and admin subscription
+    python manage.py setup          both of the above
+    python manage.py import-time    check `import main` against an import-time budget
+    python manage.py archive-chat   move old chat messages to the archive once
+    python manage.py run-schedule   expire subscriptions / reset monthly tokens once (cron)
+
+The API no longer does any of this when it is imported (set AUTO_INIT_DB=true
+to run init-db + seed on startup in development).
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def init_db():
+    from database import run_migrations
+
+    run_migrations()
+
+
+def seed_db():
+    from database import SessionLocal
+    from dbseeders.PlanSeeder import run as seed_plans
+    from dbseeders.UserSeeder import run as seed_admin
+    from dbseeders.SubscriptionSeeder import run as seed_admin_subscription
+
+    db = SessionLocal()
+    try:
+        seed_plans(db)
+        seed_admin(db)
+        seed_admin_subscription(db)
+    finally:
+        db.close()
+
+
+def import_time(module: str = "main") -> tuple:
+    """
+    Import `module` in a fresh interpreter with -X importtime. Returns
+    (total seconds incl. interpreter startup, [(seconds, name)] of the
+    slowest imports made directly by `module`).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        # the traceback is interleaved with the -X importtime report
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(errors[-1] if errors else f"import {module} failed")
+
+    total = 0
+    top = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2   # 2 spaces per level
+        if level == 0:
+            total += int(cumulative)
+        elif level == 1:
+            top.append((int(cumulative) / 1e6, name.strip()))
+    return total / 1e6, sorted(top, reverse=True)[:10]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UKSChat backend management")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("init-db", help="apply database migrations")
+    commands.add_parser("seed", help="insert default data")
+    commands.add_parser("setup", help="init-db + seed")
+    check = commands.add_parser("import-time", help="fail if `import main` is over budget")
+    check.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET", "1.0")),
+                       help="seconds (default: IMPORT_TIME_BUDGET or 1.0)")
+    check.add_argument("--module", default="main")
+    commands.add_parser("archive-chat", help="move old chat messages to chat_messages_archive")
+    commands.add_parser("run-schedule", help="expire due subscriptions and reset monthly tokens")
+    args = parser.parse_args(argv)
+
+    if args.command in ("init-db", "setup"):
+        init_db()
+        print("Database migrated.")
+    if args.command in ("seed", "setup"):
+        seed_db()
+    if args.command == "import-time":
+        total, top = import_time(args.module)
+        for seconds, name in top:
+            print(f"{seconds * 1000:8.1f} ms  {name}")
+        print(f"import {args.module}: {total:.3f}s (budget {args.budget:.3f}s)")
+        if total > args.budget:
+            return 1
+    if args.command == "archive-chat":
+        from utils.archive import archive_messages, archive_metrics
+
+        archive_messages()
+        stats = archive_metrics.stats()
+        print(f"Archived {stats['rows_moved']} messages, {stats['bytes_reclaimed']} bytes reclaimed.")
+    if args.command == "run-schedule":
+        from utils.scheduler import run_schedule_as_leader
+
+        if os.getenv("QUOTA_BACKEND", "local").lower() != "redis":
+            print(
+                "Warning: QUOTA_BACKEND=local; running API processes keep their token "
+                "counters until restarted. Use SCHEDULER_IN_PROCESS=true instead.",
+                file=sys.stderr,
+            )
+
+        counts = run_schedule_as_leader()
+        if counts is None:
+            print("Another process holds the scheduler lease, nothing done.")
+        else:
+            print(f"{counts['expired']} subscriptions expired, {counts['reset']} token resets.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
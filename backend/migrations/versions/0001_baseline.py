@@ -0,0 +1,102 @@
+"""baseline schema
+
+Creates the original tables. Databases that were created earlier with
+Base.metadata.create_all already have them, so existing tables are skipped
+and this revision only gets recorded.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(150), nullable=False, unique=True),
+            sa.Column("hashed_password", sa.String(200), nullable=False),
+            sa.Column("role", sa.String(20)),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+
+    if "plans" not in existing:
+        op.create_table(
+            "plans",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("description", sa.Text()),
+            sa.Column("price", sa.Float(), nullable=False),
+            sa.Column("currency", sa.String(5)),
+            sa.Column("tokens_per_month", sa.Integer(), nullable=False),
+            sa.Column("is_active", sa.Boolean()),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+
+    if "chat_messages" not in existing:
+        op.create_table(
+            "chat_messages",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("role", sa.String(20), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+
+    if "subscriptions" not in existing:
+        op.create_table(
+            "subscriptions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("plan_id", sa.Integer(), sa.ForeignKey("plans.id"), nullable=False),
+            sa.Column("status", sa.String(20)),
+            sa.Column("start_date", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+            sa.Column("end_date", sa.DateTime()),
+            sa.Column("used_tokens", sa.Integer()),
+        )
+
+    if "payments" not in existing:
+        op.create_table(
+            "payments",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("plan_id", sa.Integer(), sa.ForeignKey("plans.id"), nullable=False),
+            sa.Column("gateway", sa.String(20), nullable=False),
+            sa.Column("amount", sa.Float(), nullable=False),
+            sa.Column("currency", sa.String(5), nullable=False),
+            sa.Column("status", sa.String(20)),
+            sa.Column("transaction_id", sa.String(100), unique=True),
+            sa.Column("invoice_filename", sa.String(100)),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+
+    if "usage_logs" not in existing:
+        op.create_table(
+            "usage_logs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("tokens_used", sa.Integer()),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ("usage_logs", "payments", "subscriptions", "chat_messages", "plans", "users"):
+        op.drop_table(table)
@@ -0,0 +1,40 @@
+"""composite indexes for hot query shapes
+
+- chat_messages: per-user history / context, newest first  -> (user_id, id)
+- subscriptions: active subscription of a user, latest first -> (user_id, status, start_date)
+- usage_logs:    tokens per user (covering index for SUM)   -> (user_id, tokens_used)
+- payments:      admin listing, newest first                -> (created_at)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_chat_messages_user_id_id", "chat_messages", ["user_id", "id"])
+    op.create_index(
+        "ix_subscriptions_user_status_start", "subscriptions", ["user_id", "status", "start_date"]
+    )
+    op.create_index("ix_usage_logs_user_tokens", "usage_logs", ["user_id", "tokens_used"])
+    op.create_index("ix_payments_created_at", "payments", ["created_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_payments_created_at", table_name="payments")
+    op.drop_index("ix_usage_logs_user_tokens", table_name="usage_logs")
+    op.drop_index("ix_subscriptions_user_status_start", table_name="subscriptions")
+    op.drop_index("ix_chat_messages_user_id_id", table_name="chat_messages")
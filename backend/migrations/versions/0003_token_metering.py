@@ -0,0 +1,95 @@
+"""real token metering
+
+Adds prompt/completion token columns to usage_logs. Plans are now metered
+in provider tokens instead of requests, so the three seeded plans still on
+their request-based defaults get token-sized limits, and their seeded
+descriptions say so. Plans (and descriptions) that admins have edited are
+left alone.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (plan name, old requests/month, new tokens/month)
+SEEDED_PLANS = [
+    ("Free Tier", 50, 50_000),
+    ("Pro Monthly", 1000, 1_000_000),
+    ("Pro Plus", 3000, 3_000_000),
+]
+
+# (plan name, old description, new description), as in dbseeders.PlanSeeder
+SEEDED_DESCRIPTIONS = [
+    (
+        "Free Tier",
+        "Features: Limited response speed\nTokens/Month: 50 requests",
+        "Features: Limited response speed\nTokens/Month: 50K tokens",
+    ),
+    (
+        "Pro Monthly",
+        "Features: Fast responses\nTokens/Month: 1000 requests",
+        "Features: Fast responses\nTokens/Month: 1M tokens",
+    ),
+    (
+        "Pro Plus",
+        "Features: Priority support\nTokens/Month: 3000 requests",
+        "Features: Priority support\nTokens/Month: 3M tokens",
+    ),
+]
+
+plans = sa.table(
+    "plans",
+    sa.column("name", sa.String),
+    sa.column("description", sa.Text),
+    sa.column("tokens_per_month", sa.Integer),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("usage_logs", sa.Column("prompt_tokens", sa.Integer(), server_default="0"))
+    op.add_column("usage_logs", sa.Column("completion_tokens", sa.Integer(), server_default="0"))
+
+    for name, old, new in SEEDED_PLANS:
+        op.execute(
+            plans.update()
+            .where(plans.c.name == name, plans.c.tokens_per_month == old)
+            .values(tokens_per_month=new)
+        )
+    for name, old, new in SEEDED_DESCRIPTIONS:
+        op.execute(
+            plans.update()
+            .where(plans.c.name == name, plans.c.description == old)
+            .values(description=new)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, old, new in SEEDED_DESCRIPTIONS:
+        op.execute(
+            plans.update()
+            .where(plans.c.name == name, plans.c.description == new)
+            .values(description=old)
+        )
+    for name, old, new in SEEDED_PLANS:
+        op.execute(
+            plans.update()
+            .where(plans.c.name == name, plans.c.tokens_per_month == new)
+            .values(tokens_per_month=old)
+        )
+
+    op.drop_column("usage_logs", "completion_tokens")
+    op.drop_column("usage_logs", "prompt_tokens")
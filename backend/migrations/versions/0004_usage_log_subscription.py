@@ -0,0 +1,42 @@
+"""link usage logs to their subscription
+
+Token usage is now counted in memory and written to subscriptions in
+batches; usage_logs.subscription_id lets startup reconcile the counter
+from the logs if a process died before flushing.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("usage_logs") as batch:
+        batch.add_column(sa.Column("subscription_id", sa.Integer(), nullable=True))
+        batch.create_foreign_key(
+            "fk_usage_logs_subscription_id", "subscriptions", ["subscription_id"], ["id"]
+        )
+    op.create_index(
+        "ix_usage_logs_subscription_tokens", "usage_logs", ["subscription_id", "tokens_used"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_usage_logs_subscription_tokens", table_name="usage_logs")
+    with op.batch_alter_table("usage_logs") as batch:
+        batch.drop_constraint("fk_usage_logs_subscription_id", type_="foreignkey")
+        batch.drop_column("subscription_id")
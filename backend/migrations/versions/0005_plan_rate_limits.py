@@ -0,0 +1,52 @@
+"""per-plan chat rate limits
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (plan name, requests per minute, burst) for the seeded plans
+SEEDED_PLANS = [
+    ("Free Tier", 6, 3),
+    ("Pro Monthly", 30, 10),
+    ("Pro Plus", 60, 20),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "plans", sa.Column("requests_per_minute", sa.Integer(), nullable=False, server_default="10")
+    )
+    op.add_column("plans", sa.Column("burst", sa.Integer(), nullable=False, server_default="5"))
+
+    plans = sa.table(
+        "plans",
+        sa.column("name", sa.String),
+        sa.column("requests_per_minute", sa.Integer),
+        sa.column("burst", sa.Integer),
+    )
+    for name, per_minute, burst in SEEDED_PLANS:
+        op.execute(
+            plans.update()
+            .where(plans.c.name == name)
+            .values(requests_per_minute=per_minute, burst=burst)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("plans", "burst")
+    op.drop_column("plans", "requests_per_minute")
@@ -0,0 +1,87 @@
+"""usage and revenue rollups
+
+Adds per-user-per-day usage and per-plan-per-day revenue tables for the
+admin billing dashboard, plus the high-water mark of the usage catch-up
+job. Both rollups are backfilled from the existing rows.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "usage_daily",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("prompt_tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("completion_tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("requests", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_usage_daily_user_day", "usage_daily", ["user_id", "day"])
+
+    op.create_table(
+        "revenue_daily",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("plan_id", sa.Integer(), sa.ForeignKey("plans.id"), primary_key=True),
+        sa.Column("currency", sa.String(5), primary_key=True),
+        sa.Column("amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("payments", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    op.create_table(
+        "rollup_state",
+        sa.Column("name", sa.String(50), primary_key=True),
+        sa.Column("last_id", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+
+    # Backfill from what is already there
+    op.execute(
+        """
+        INSERT INTO usage_daily (day, user_id, tokens, prompt_tokens, completion_tokens, requests)
+        SELECT DATE(created_at), user_id,
+               COALESCE(SUM(tokens_used), 0), COALESCE(SUM(prompt_tokens), 0),
+               COALESCE(SUM(completion_tokens), 0), COUNT(*)
+        FROM usage_logs
+        GROUP BY DATE(created_at), user_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO rollup_state (name, last_id)
+        SELECT 'usage_daily', COALESCE(MAX(id), 0) FROM usage_logs
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO revenue_daily (day, plan_id, currency, amount, payments)
+        SELECT DATE(created_at), plan_id, currency, SUM(amount), COUNT(*)
+        FROM payments
+        WHERE status = 'success'
+        GROUP BY DATE(created_at), plan_id, currency
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("rollup_state")
+    op.drop_table("revenue_daily")
+    op.drop_index("ix_usage_daily_user_day", table_name="usage_daily")
+    op.drop_table("usage_daily")
@@ -0,0 +1,38 @@
+"""indexes for filtered admin payment listing
+
+The admin listing pages newest first on (created_at, id); each filter gets
+an index that starts with the filtered column and then follows that order:
+
+- payments: by user    -> (user_id, created_at, id)
+- payments: by status  -> (status, created_at, id)
+- payments: by gateway -> (gateway, created_at, id)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_payments_user_created", "payments", ["user_id", "created_at", "id"])
+    op.create_index("ix_payments_status_created", "payments", ["status", "created_at", "id"])
+    op.create_index("ix_payments_gateway_created", "payments", ["gateway", "created_at", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_payments_gateway_created", table_name="payments")
+    op.drop_index("ix_payments_status_created", table_name="payments")
+    op.drop_index("ix_payments_user_created", table_name="payments")
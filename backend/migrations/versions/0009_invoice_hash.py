@@ -0,0 +1,33 @@
+"""invoice content hash
+
+Invoices go through utils.invoice_storage (local dir or object store);
+payments.invoice_sha256 is the hash of the stored PDF and its download
+ETag. Invoices rendered before this get theirs on first download.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("payments", sa.Column("invoice_sha256", sa.String(64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("payments") as batch:
+        batch.drop_column("invoice_sha256")
@@ -0,0 +1,36 @@
+"""cache version counters
+
+The public plan catalog is cached per worker; admin plan writes bump
+cache_versions['plans'] so the other workers notice and reload.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, Sequence[str], None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    versions = op.create_table(
+        "cache_versions",
+        sa.Column("name", sa.String(50), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="1"),
+    )
+    op.bulk_insert(versions, [{"name": "plans", "version": 1}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("cache_versions")
@@ -0,0 +1,96 @@
+"""conversations
+
+Chat messages belong to a conversation (thread); history and prompt
+context are read per conversation through (conversation_id, id). Existing
+messages move into one "Chat history" conversation per user. Rolling
+summaries are now per conversation; the old per-user ones are dropped and
+rebuilt by the summary job on the next turns.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, Sequence[str], None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_summaries(key: str, target: str) -> None:
+    op.create_table(
+        "chat_summaries",
+        sa.Column(key, sa.Integer(), sa.ForeignKey(target), primary_key=True),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("last_message_id", sa.Integer(), nullable=False),
+        sa.Column("tokens", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "conversations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("title", sa.String(200), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_conversations_user_updated", "conversations", ["user_id", "updated_at"])
+
+    with op.batch_alter_table("chat_messages") as batch:
+        batch.add_column(sa.Column("conversation_id", sa.Integer(), nullable=True))
+
+    # One conversation per user with the existing messages
+    op.execute(
+        """
+        INSERT INTO conversations (user_id, title, created_at, updated_at)
+        SELECT user_id, 'Chat history', MIN(created_at), MAX(created_at)
+        FROM chat_messages
+        GROUP BY user_id
+        """
+    )
+    op.execute(
+        """
+        UPDATE chat_messages
+        SET conversation_id = (
+            SELECT c.id FROM conversations c WHERE c.user_id = chat_messages.user_id
+        )
+        """
+    )
+
+    with op.batch_alter_table("chat_messages") as batch:
+        batch.alter_column("conversation_id", existing_type=sa.Integer(), nullable=False)
+        batch.create_foreign_key(
+            "fk_chat_messages_conversation_id", "conversations", ["conversation_id"], ["id"]
+        )
+    op.create_index(
+        "ix_chat_messages_conversation_id", "chat_messages", ["conversation_id", "id"]
+    )
+
+    op.drop_table("chat_summaries")
+    _create_summaries("conversation_id", "conversations.id")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("chat_summaries")
+    _create_summaries("user_id", "users.id")
+
+    # the foreign key first: MySQL needs the index as long as it exists
+    with op.batch_alter_table("chat_messages") as batch:
+        batch.drop_constraint("fk_chat_messages_conversation_id", type_="foreignkey")
+    op.drop_index("ix_chat_messages_conversation_id", table_name="chat_messages")
+    with op.batch_alter_table("chat_messages") as batch:
+        batch.drop_column("conversation_id")
+    op.drop_index("ix_conversations_user_updated", table_name="conversations")
+    op.drop_table("conversations")
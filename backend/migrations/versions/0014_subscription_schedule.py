@@ -0,0 +1,87 @@
+"""subscription schedule
+
+Subscriptions get a monthly token reset time (tokens_reset_at) and the
+(status, end_date) / (status, tokens_reset_at) indexes the scheduler
+(utils.scheduler) expires and resets them through; scheduler_leases
+elects the process that runs it. Free-tier subscriptions no longer expire
+(end_date NULL), their tokens reset every period instead.
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-18 00:00:00
+
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0014"
+down_revision: Union[str, Sequence[str], None] = "0013"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# same setting as utils.quota.TOKEN_PERIOD (not imported: that module
+# connects the quota store)
+TOKEN_PERIOD = timedelta(days=int(os.getenv("TOKEN_PERIOD_DAYS", "30")))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("subscriptions") as batch:
+        batch.add_column(sa.Column("tokens_reset_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_subscriptions_status_end_date", "subscriptions", ["status", "end_date"])
+    op.create_index("ix_subscriptions_status_tokens_reset", "subscriptions", ["status", "tokens_reset_at"])
+
+    op.create_table(
+        "scheduler_leases",
+        sa.Column("name", sa.String(50), primary_key=True),
+        sa.Column("owner", sa.String(100), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+    )
+
+    # Next reset of the active subscriptions: a whole number of periods after
+    # their start (date arithmetic differs per database, so done here)
+    subscriptions = sa.table(
+        "subscriptions",
+        sa.column("id", sa.Integer()),
+        sa.column("status", sa.String()),
+        sa.column("start_date", sa.DateTime()),
+        sa.column("tokens_reset_at", sa.DateTime()),
+    )
+    bind = op.get_bind()
+    now = datetime.utcnow()
+    active = bind.execute(
+        sa.select(subscriptions.c.id, subscriptions.c.start_date)
+        .where(subscriptions.c.status == "active")
+    ).all()
+    for sub_id, start_date in active:
+        reset_at = (start_date or now) + TOKEN_PERIOD
+        while reset_at <= now:
+            reset_at += TOKEN_PERIOD
+        bind.execute(
+            subscriptions.update()
+            .where(subscriptions.c.id == sub_id)
+            .values(tokens_reset_at=reset_at)
+        )
+
+    op.execute(
+        """
+        UPDATE subscriptions SET end_date = NULL
+        WHERE status = 'active' AND plan_id IN (SELECT id FROM plans WHERE price = 0)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # free-tier end dates stay NULL
+    op.drop_table("scheduler_leases")
+    op.drop_index("ix_subscriptions_status_tokens_reset", table_name="subscriptions")
+    op.drop_index("ix_subscriptions_status_end_date", table_name="subscriptions")
+    with op.batch_alter_table("subscriptions") as batch:
+        batch.drop_column("tokens_reset_at")
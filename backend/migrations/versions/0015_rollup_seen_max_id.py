@@ -0,0 +1,36 @@
+"""rollup seen max id
+
+The usage rollup's "max id seen by the previous run" moves from a
+per-process global to rollup_state (seen_max_id, seen_at), so every
+worker and a restarted process share it.
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0015"
+down_revision: Union[str, Sequence[str], None] = "0014"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("rollup_state") as batch:
+        batch.add_column(sa.Column("seen_max_id", sa.BigInteger(), nullable=True))
+        batch.add_column(sa.Column("seen_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("rollup_state") as batch:
+        batch.drop_column("seen_at")
+        batch.drop_column("seen_max_id")
@@ -0,0 +1,33 @@
+"""conversation list keyset index
+
+/conversations pages on (updated_at, id) instead of an offset; the index
+on (user_id, updated_at) gets id as its last column so a page resumes
+straight from the cursor, ties included.
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0016"
+down_revision: Union[str, Sequence[str], None] = "0015"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index("ix_conversations_user_updated", table_name="conversations")
+    op.create_index("ix_conversations_user_updated", "conversations", ["user_id", "updated_at", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_conversations_user_updated", table_name="conversations")
+    op.create_index("ix_conversations_user_updated", "conversations", ["user_id", "updated_at"])
@@ -1,8 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Float, func
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, ForeignKey, Text, Boolean, Float, Index, LargeBinary, func
 from sqlalchemy.orm import relationship
+import zlib
 from datetime import datetime
 from database import Base
 
+# Many-to-one relationships are lazy="raise_on_sql": the routers use
+# AsyncSession, which can't lazy-load, so load them explicitly
+# (joinedload / selectinload) where they are needed.
+
 
 class User(Base):
     __tablename__ = "users"
@@ -18,16 +23,74 @@ class User(Base):
     payments = relationship("Payment", back_populates="user", cascade="all, delete")
 
 
+class Conversation(Base):
+    """A chat thread; history and prompt context are per conversation."""
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    title = Column(String(200), nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())   # last message
+
+    __table_args__ = (
+        Index("ix_conversations_user_updated", "user_id", "updated_at", "id"),
+    )
+
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
     role = Column(String(20), nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
 
-    user = relationship("User", back_populates="messages")
+    user = relationship("User", back_populates="messages", lazy="raise_on_sql")
+
+    __table_args__ = (
+        Index("ix_chat_messages_user_id_id", "user_id", "id"),
+        Index("ix_chat_messages_conversation_id", "conversation_id", "id"),
+    )
+
+
+class ChatMessageArchive(Base):
+    """
+    Cold tier of chat_messages (utils.archive): same ids, content stored
+    zlib-compressed. Within a conversation, archived messages are always
+    older than the ones still in chat_messages.
+    """
+    __tablename__ = "chat_messages_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    role = Column(String(20), nullable=False)
+    content_z = Column(LargeBinary(16_777_215), nullable=False)    # MEDIUMBLOB on MySQL
+    content_bytes = Column(Integer, nullable=False)     # uncompressed UTF-8 size
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_chat_messages_archive_conversation_id", "conversation_id", "id"),
+    )
+
+    @property
+    def content(self) -> str:
+        return zlib.decompress(self.content_z).decode("utf-8")
+
+
+class ChatSummary(Base):
+    """Rolling summary of a conversation's older messages, see utils.chat_context."""
+    __tablename__ = "chat_summaries"
+
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), primary_key=True)
+    content = Column(Text, nullable=False)
+    last_message_id = Column(Integer, nullable=False)    # covers messages up to this id
+    tokens = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
 
 class Plan(Base):
@@ -39,6 +102,8 @@ class Plan(Base):
     price = Column(Float, nullable=False)
     currency = Column(String(5), default="INR")
     tokens_per_month = Column(Integer, nullable=False)
+    requests_per_minute = Column(Integer, nullable=False, default=10)   # chat rate limit
+    burst = Column(Integer, nullable=False, default=5)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
 
@@ -54,11 +119,19 @@ class Subscription(Base):
     plan_id = Column(Integer, ForeignKey("plans.id"), nullable=False)
     status = Column(String(20), default="active")
     start_date = Column(DateTime, nullable=False, server_default=func.now())
-    end_date = Column(DateTime)
+    end_date = Column(DateTime)     # None: doesn't expire (free tier)
     used_tokens = Column(Integer, default=0)
+    tokens_reset_at = Column(DateTime)      # used_tokens starts over at this time
+
+    user = relationship("User", back_populates="subscriptions", lazy="raise_on_sql")
+    plan = relationship("Plan", back_populates="subscriptions", lazy="raise_on_sql")
 
-    user = relationship("User", back_populates="subscriptions")
-    plan = relationship("Plan", back_populates="subscriptions")
+    __table_args__ = (
+        Index("ix_subscriptions_user_status_start", "user_id", "status", "start_date"),
+        # due expiries / token resets, see utils.scheduler
+        Index("ix_subscriptions_status_end_date", "status", "end_date"),
+        Index("ix_subscriptions_status_tokens_reset", "status", "tokens_reset_at"),
+    )
 
 
 class Payment(Base):
@@ -73,10 +146,18 @@ class Payment(Base):
     status = Column(String(20), default="pending")
     transaction_id = Column(String(100), unique=True)
     invoice_filename = Column(String(100))
+    invoice_sha256 = Column(String(64))               # content hash, strong ETag
     created_at = Column(DateTime, nullable=False, server_default=func.now())
 
-    user = relationship("User", back_populates="payments")
-    plan = relationship("Plan", back_populates="payments")
+    user = relationship("User", back_populates="payments", lazy="raise_on_sql")
+    plan = relationship("Plan", back_populates="payments", lazy="raise_on_sql")
+
+    __table_args__ = (
+        Index("ix_payments_created_at", "created_at"),
+        Index("ix_payments_user_created", "user_id", "created_at", "id"),
+        Index("ix_payments_status_created", "status", "created_at", "id"),
+        Index("ix_payments_gateway_created", "gateway", "created_at", "id"),
+    )
 
 
 class UsageLog(Base):
@@ -84,5 +165,94 @@ class UsageLog(Base):
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    tokens_used = Column(Integer, default=0)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"))
+    tokens_used = Column(Integer, default=0)          # prompt + completion
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_usage_logs_user_tokens", "user_id", "tokens_used"),
+        Index("ix_usage_logs_subscription_tokens", "subscription_id", "tokens_used"),
+    )
+
+
+# ---------- Rollups (admin dashboard) ----------
+
+class UsageDaily(Base):
+    """usage_logs summed per user per day, maintained by utils.rollups."""
+    __tablename__ = "usage_daily"
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    tokens = Column(BigInteger, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    requests = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_usage_daily_user_day", "user_id", "day"),
+    )
+
+
+class RevenueDaily(Base):
+    """Successful payments summed per plan per day and currency."""
+    __tablename__ = "revenue_daily"
+
+    day = Column(Date, primary_key=True)
+    plan_id = Column(Integer, ForeignKey("plans.id"), primary_key=True)
+    currency = Column(String(5), primary_key=True)
+    amount = Column(Float, nullable=False, default=0)
+    payments = Column(Integer, nullable=False, default=0)
+
+
+class RollupState(Base):
+    """High-water mark (last processed source id) of each rollup."""
+    __tablename__ = "rollup_state"
+
+    name = Column(String(50), primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)
+    # max source id at `seen_at`: the next horizon, once those rows committed
+    seen_max_id = Column(BigInteger)
+    seen_at = Column(DateTime)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+# ---------- Background jobs ----------
+
+class Job(Base):
+    """Durable job queue, see utils.jobs."""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False, default="{}")     # JSON
+    status = Column(String(20), nullable=False, default="queued")  # queued / running / done / dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=8)
+    run_at = Column(DateTime, nullable=False)               # not before (UTC)
+    locked_at = Column(DateTime)
+    locked_by = Column(String(100))
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+
+class CacheVersion(Base):
+    """Version counters of in-process caches: a bump invalidates them in every worker."""
+    __tablename__ = "cache_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=1)
+
+
+class SchedulerLease(Base):
+    """Which process runs a periodic task (utils.scheduler), until expires_at."""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(50), primary_key=True)
+    owner = Column(String(100), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
@@ -1,80 +1,295 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
+from database import AsyncSessionLocal
 from deps import get_db, get_current_admin
+from utils.cursors import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/admin/billing", tags=["Admin - Billing"])
 
 
+PAYMENT_COLUMNS = (
+    models.Payment.id,
+    models.Payment.gateway,
+    models.Payment.amount,
+    models.Payment.currency,
+    models.Payment.status,
+    models.Payment.created_at,
+    models.Payment.transaction_id,
+    models.User.email.label("user_email"),
+    models.Plan.name.label("plan_name"),
+)
+EXPORT_FIELDS = [
+    "id", "gateway", "amount", "currency", "status",
+    "created_at", "transaction_id", "user_email", "plan_name",
+]
+EXPORT_BATCH_SIZE = 1000
+
+
+def _payments_query(
+    gateway: Optional[str],
+    status: Optional[str],
+    currency: Optional[str],
+    from_: Optional[date],
+    to: Optional[date],
+    user_email: Optional[str],
+):
+    """Payments + user email + plan name, filtered, newest first."""
+    query = (
+        select(*PAYMENT_COLUMNS)
+        .join(models.User, models.Payment.user_id == models.User.id)
+        .join(models.Plan, models.Payment.plan_id == models.Plan.id)
+    )
+    if from_ and to and from_ > to:
+        raise HTTPException(status_code=400, detail="`from` must not be after `to`")
+    if gateway:
+        query = query.where(models.Payment.gateway == gateway)
+    if status:
+        query = query.where(models.Payment.status == status)
+    if currency:
+        query = query.where(models.Payment.currency == currency)
+    if from_:
+        query = query.where(models.Payment.created_at >= datetime.combine(from_, time.min))
+    if to:
+        query = query.where(models.Payment.created_at < datetime.combine(to + timedelta(days=1), time.min))
+    if user_email:
+        # users.email is unique: one user, then ix_payments_user_created
+        query = query.where(models.User.email == user_email)
+    return query.order_by(models.Payment.created_at.desc(), models.Payment.id.desc())
+
+
+def _payment_row(r) -> dict:
+    return {field: getattr(r, field) for field in EXPORT_FIELDS}
+
+
 @router.get("/payments")
-def list_payments(
-    db: Session = Depends(get_db),
+async def list_payments(
+    gateway: Optional[str] = None,
+    status: Optional[str] = None,
+    currency: Optional[str] = None,
+    from_: Optional[date] = Query(None, alias="from", description="First day (inclusive)"),
+    to: Optional[date] = Query(None, description="Last day (inclusive)"),
+    user_email: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(get_current_admin),
 ):
-    rows = (
-        db.query(
-            models.Payment.id,
-            models.Payment.gateway,
-            models.Payment.amount,
-            models.Payment.currency,
-            models.Payment.status,
-            models.Payment.created_at,
-            models.Payment.transaction_id,
-            models.User.email,
-            models.Plan.name.label("plan_name"),
+    """
+    Payments newest first, keyset-paginated on (created_at, id).
+    Pass `next_cursor` back as `cursor` for the next page; it is None on
+    the last page.
+    """
+    query = _payments_query(gateway, status, currency, from_, to, user_email)
+    if cursor:
+        created_at, payment_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                models.Payment.created_at < created_at,
+                and_(models.Payment.created_at == created_at, models.Payment.id < payment_id),
+            )
         )
-        .join(models.User, models.Payment.user_id == models.User.id)
-        .join(models.Plan, models.Payment.plan_id == models.Plan.id)
-        .order_by(models.Payment.created_at.desc())
-        .all()
+
+    # one extra row tells us whether there is a next page
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return {
+        "items": [_payment_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+async def _export_rows(query, fmt: str) -> AsyncIterator[str]:
+    """
+    Stream the query result with a server-side cursor, EXPORT_BATCH_SIZE
+    rows at a time, so memory stays flat however many payments match.
+    Uses its own session (the request's is closed by then).
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            async for batch in result.partitions():
+                for r in batch:
+                    writer.writerow([getattr(r, field) for field in EXPORT_FIELDS])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()     # header only: nothing matched
+        else:
+            async for batch in result.partitions():
+                yield "".join(
+                    json.dumps(_payment_row(r), default=datetime.isoformat) + "\n" for r in batch
+                )
+
+
+@router.get("/payments/export")
+async def export_payments(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gateway: Optional[str] = None,
+    status: Optional[str] = None,
+    currency: Optional[str] = None,
+    from_: Optional[date] = Query(None, alias="from", description="First day (inclusive)"),
+    to: Optional[date] = Query(None, description="Last day (inclusive)"),
+    user_email: Optional[str] = None,
+    admin=Depends(get_current_admin),
+):
+    """All payments matching the filters as a streamed CSV or NDJSON file."""
+    query = _payments_query(gateway, status, currency, from_, to, user_email)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"payments-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        _export_rows(query, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
-    return [
-        {
-            "id": r.id,
-            "gateway": r.gateway,
-            "amount": r.amount,
-            "currency": r.currency,
-            "status": r.status,
-            "created_at": r.created_at,
-            "transaction_id": r.transaction_id,
-            "user_email": r.email,
-            "plan_name": r.plan_name,
-        }
-        for r in rows
-    ]
+
+def _date_range(query, column, from_: Optional[date], to: Optional[date]):
+    if from_ and to and from_ > to:
+        raise HTTPException(status_code=400, detail="`from` must not be after `to`")
+    if from_:
+        query = query.filter(column >= from_)
+    if to:
+        query = query.filter(column <= to)
+    return query
+
+
+async def _revenue_by_currency(db: AsyncSession, from_: Optional[date], to: Optional[date]) -> dict:
+    rows = await db.execute(
+        _date_range(
+            select(
+                models.RevenueDaily.currency,
+                func.sum(models.RevenueDaily.amount).label("amount"),
+            ),
+            models.RevenueDaily.day, from_, to,
+        ).group_by(models.RevenueDaily.currency)
+    )
+    return {r.currency: float(r.amount or 0) for r in rows}
 
 
 @router.get("/usage-summary")
-def usage_summary(
-    db: Session = Depends(get_db),
+async def usage_summary(
+    from_: Optional[date] = Query(None, alias="from", description="First day (inclusive)"),
+    to: Optional[date] = Query(None, description="Last day (inclusive)"),
+    limit: int = Query(100, ge=1, le=1000, description="Number of top users"),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(get_current_admin),
 ):
-    # usage per user (total tokens)
-    per_user = (
-        db.query(
-            models.User.email,
-            func.sum(models.UsageLog.tokens_used).label("tokens"),
+    """
+    Revenue and top users by tokens, from the daily rollups (utils.rollups).
+    Usage lags the logs by up to two ROLLUP_INTERVALs.
+    """
+    tokens = func.sum(models.UsageDaily.tokens)
+    top = (
+        _date_range(
+            select(
+                models.UsageDaily.user_id,
+                tokens.label("tokens"),
+                func.sum(models.UsageDaily.requests).label("requests"),
+            ),
+            models.UsageDaily.day, from_, to,
         )
-        .join(models.User, models.User.id == models.UsageLog.user_id)
-        .group_by(models.User.email)
-        .order_by(func.sum(models.UsageLog.tokens_used).desc())
-        .all()
+        .group_by(models.UsageDaily.user_id)
+        .order_by(tokens.desc())
+        .limit(limit)
+        .subquery()
     )
-
-    # total revenue
-    total_revenue = (
-        db.query(func.sum(models.Payment.amount))
-        .filter(models.Payment.status == "success")
-        .scalar()
-        or 0
+    per_user = await db.execute(
+        select(models.User.email, top.c.tokens, top.c.requests)
+        .join(top, top.c.user_id == models.User.id)
+        .order_by(top.c.tokens.desc())
     )
 
+    revenue = await _revenue_by_currency(db, from_, to)
+
     return {
-        "total_revenue": float(total_revenue),
+        # amounts of all currencies added up, as before; see revenue_by_currency
+        "total_revenue": float(sum(revenue.values())),
+        "revenue_by_currency": revenue,
         "top_users": [
-            {"email": row.email, "tokens": int(row.tokens or 0)} for row in per_user
+            {"email": row.email, "tokens": int(row.tokens or 0), "requests": int(row.requests or 0)}
+            for row in per_user
         ],
     }
+
+
+@router.get("/timeseries")
+async def usage_timeseries(
+    from_: Optional[date] = Query(None, alias="from", description="First day (inclusive), default 30 days ago"),
+    to: Optional[date] = Query(None, description="Last day (inclusive), default today"),
+    db: AsyncSession = Depends(get_db),
+    admin=Depends(get_current_admin),
+):
+    """Per-day tokens, requests, active users and revenue, from the rollups."""
+    to = to or datetime.utcnow().date()
+    from_ = from_ or to - timedelta(days=29)
+    if (to - from_).days > 366:
+        raise HTTPException(status_code=400, detail="Date range is limited to one year")
+
+    usage = await db.execute(_date_range(
+        select(
+            models.UsageDaily.day,
+            func.sum(models.UsageDaily.tokens).label("tokens"),
+            func.sum(models.UsageDaily.prompt_tokens).label("prompt_tokens"),
+            func.sum(models.UsageDaily.completion_tokens).label("completion_tokens"),
+            func.sum(models.UsageDaily.requests).label("requests"),
+            func.count(models.UsageDaily.user_id).label("active_users"),
+        ),
+        models.UsageDaily.day, from_, to,
+    ).group_by(models.UsageDaily.day))
+
+    revenue = await db.execute(_date_range(
+        select(
+            models.RevenueDaily.day,
+            models.RevenueDaily.currency,
+            func.sum(models.RevenueDaily.amount).label("amount"),
+            func.sum(models.RevenueDaily.payments).label("payments"),
+        ),
+        models.RevenueDaily.day, from_, to,
+    ).group_by(models.RevenueDaily.day, models.RevenueDaily.currency))
+
+    days = {}
+    day = from_
+    while day <= to:
+        days[day] = {
+            "day": day,
+            "tokens": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "requests": 0,
+            "active_users": 0,
+            "revenue": {},
+            "payments": 0,
+        }
+        day += timedelta(days=1)
+
+    for r in usage:
+        days[r.day].update(
+            tokens=int(r.tokens or 0),
+            prompt_tokens=int(r.prompt_tokens or 0),
+            completion_tokens=int(r.completion_tokens or 0),
+            requests=int(r.requests or 0),
+            active_users=int(r.active_users),
+        )
+    for r in revenue:
+        days[r.day]["revenue"][r.currency] = float(r.amount or 0)
+        days[r.day]["payments"] += int(r.payments or 0)
+
+    return {"from": from_, "to": to, "series": list(days.values())}
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import POOL_CONFIG
+from deps import get_db, get_current_admin
+from utils.archive import archive_metrics, archive_totals
+from utils.completion_cache import completion_cache
+from utils.db_metrics import db_metrics
+from utils.jobs import job_counts
+from utils.write_buffer import write_buffer
+
+router = APIRouter(prefix="/admin/metrics", tags=["Admin - Metrics"])
+
+
+@router.get("/ai-cache")
+async def ai_cache_stats(admin=Depends(get_current_admin)):
+    """Hit / miss counters and size of the AI completion cache."""
+    return completion_cache.stats()
+
+
+@router.get("/jobs")
+async def jobs_stats(
+    db: AsyncSession = Depends(get_db),
+    admin=Depends(get_current_admin),
+):
+    """Background jobs per status (queued / running / done / dead)."""
+    return await job_counts(db)
+
+
+@router.get("/db")
+async def db_stats(admin=Depends(get_current_admin)):
+    """
+    Pool configuration and usage of this worker: connections in use,
+    checkout wait (histogram, max), pool timeouts, query count and time,
+    and the commits of the write buffer.
+    """
+    return {"config": POOL_CONFIG, **db_metrics.stats(), "write_buffer": write_buffer.stats()}
+
+
+@router.get("/chat-archive")
+async def chat_archive_stats(
+    db: AsyncSession = Depends(get_db),
+    admin=Depends(get_current_admin),
+):
+    """
+    Archive runs of this worker (rows moved, bytes moved out of
+    chat_messages and stored compressed) and the size of the archive table.
+    """
+    return {**archive_metrics.stats(), "archive": await archive_totals(db)}
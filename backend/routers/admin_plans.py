@@ -1,28 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models, schemas
+from auth_context import auth_cache
 from deps import get_db, get_current_admin
+from utils.plan_catalog import bump_plans_version, plan_catalog
 
 router = APIRouter(prefix="/admin/plans", tags=["Admin - Plans"])
 
 
 @router.get("", response_model=list[schemas.PlanOut])
-def admin_list_plans(
-    db: Session = Depends(get_db),
+async def admin_list_plans(
+    db: AsyncSession = Depends(get_db),
     admin=Depends(get_current_admin),
 ):
     """
     List ALL plans (including inactive).
     """
-    plans = db.query(models.Plan).order_by(models.Plan.created_at.desc()).all()
-    return plans
+    plans = await db.scalars(select(models.Plan).order_by(models.Plan.created_at.desc()))
+    return plans.all()
 
 
 @router.post("", response_model=schemas.PlanOut)
-def admin_create_plan(
+async def admin_create_plan(
     plan_in: schemas.PlanCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(get_current_admin),
 ):
     plan = models.Plan(
@@ -31,22 +34,27 @@ def admin_create_plan(
         price=plan_in.price,
         currency=plan_in.currency,
         tokens_per_month=plan_in.tokens_per_month,
+        requests_per_minute=plan_in.requests_per_minute,
+        burst=plan_in.burst,
         is_active=plan_in.is_active,
     )
     db.add(plan)
-    db.commit()
-    db.refresh(plan)
+    await bump_plans_version(db)
+    await db.commit()
+    await db.refresh(plan)
+    auth_cache.clear()      # cached contexts embed plan data
+    plan_catalog.invalidate()
     return plan
 
 
 @router.put("/{plan_id}", response_model=schemas.PlanOut)
-def admin_update_plan(
+async def admin_update_plan(
     plan_id: int,
     plan_in: schemas.PlanUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(get_current_admin),
 ):
-    plan = db.query(models.Plan).filter(models.Plan.id == plan_id).first()
+    plan = await db.get(models.Plan, plan_id)
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
 
@@ -54,22 +62,28 @@ def admin_update_plan(
     for field, value in update_data.items():
         setattr(plan, field, value)
 
-    db.commit()
-    db.refresh(plan)
+    await bump_plans_version(db)
+    await db.commit()
+    await db.refresh(plan)
+    auth_cache.clear()      # cached contexts embed plan data
+    plan_catalog.invalidate()
     return plan
 
 
 @router.patch("/{plan_id}/toggle", response_model=schemas.PlanOut)
-def admin_toggle_plan_active(
+async def admin_toggle_plan_active(
     plan_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(get_current_admin),
 ):
-    plan = db.query(models.Plan).filter(models.Plan.id == plan_id).first()
+    plan = await db.get(models.Plan, plan_id)
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
 
     plan.is_active = not plan.is_active
-    db.commit()
-    db.refresh(plan)
+    await bump_plans_version(db)
+    await db.commit()
+    await db.refresh(plan)
+    auth_cache.clear()      # cached contexts embed plan data
+    plan_catalog.invalidate()
     return plan
@@ -1,70 +1,128 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Optional
 
 import models, schemas
-from auth_utils import get_password_hash, verify_password, create_access_token
+from auth_context import AuthContext, auth_cache
+from auth_utils import (
+    PasswordPoolBusy,
+    create_access_token,
+    get_password_hash_async,
+    verify_password_async,
+)
 from deps import get_db, get_current_user
+from utils.scheduler import TOKEN_PERIOD
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 
-def activate_free_plan(db: Session, user_id: int):
+async def activate_free_plan(db: AsyncSession, user_id: int):
     """Automatically assign Free plan to new users"""
-    free_plan = db.query(models.Plan).filter(
-        models.Plan.price == 0,
-        models.Plan.is_active == True
+    free_plan = (
+        await db.scalars(
+            select(models.Plan)
+            .where(models.Plan.price == 0, models.Plan.is_active == True)
+            .limit(1)
+        )
     ).first()
 
     if free_plan:
         now = datetime.utcnow()
-        end_date = now + timedelta(days=30)
 
+        # the free tier doesn't expire, its tokens reset every period (utils.scheduler)
         subscription = models.Subscription(
             user_id=user_id,
             plan_id=free_plan.id,
             status="active",
             start_date=now,
-            end_date=end_date,
+            end_date=None,
             used_tokens=0,
+            tokens_reset_at=now + TOKEN_PERIOD,
         )
         db.add(subscription)
-        db.commit()
-        db.refresh(subscription)
+        await db.commit()
+        auth_cache.invalidate(user_id)
 
 
-@router.post("/register", response_model=schemas.UserOut)
-def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.User).filter(models.User.email == user_in.email).first()
-    if existing:
+def _busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins right now, please retry in a moment.",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _create_user(db: AsyncSession, email: str, hashed: str) -> models.User:
+    if await _find_user(db, email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
 
-    hashed = get_password_hash(user_in.password)
-    user = models.User(email=user_in.email, hashed_password=hashed, role="user")
+    user = models.User(email=email, hashed_password=hashed, role="user")
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     # Auto activate Free Tier
-    activate_free_plan(db, user.id)
-
+    await activate_free_plan(db, user.id)
     return user
 
 
+async def _find_user(db: AsyncSession, email: str) -> Optional[models.User]:
+    return (
+        await db.scalars(select(models.User).where(models.User.email == email).limit(1))
+    ).first()
+
+
+async def _update_password_hash(db: AsyncSession, user: models.User, new_hash: str):
+    user.hashed_password = new_hash
+    await db.commit()
+
+
+@router.post("/register", response_model=schemas.UserOut)
+async def register(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    # cheap duplicate check before spending a bcrypt hash on it
+    if await _find_user(db, user_in.email):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered",
+        )
+
+    # bcrypt runs in the password process pool, not in this worker
+    try:
+        hashed = await get_password_hash_async(user_in.password)
+    except PasswordPoolBusy:
+        raise _busy()
+
+    return await _create_user(db, user_in.email, hashed)
+
+
 @router.post("/login", response_model=schemas.Token)
-def login(user_in: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == user_in.email).first()
-    if not user or not verify_password(user_in.password, user.hashed_password):
+async def login(user_in: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await _find_user(db, user_in.email)
+
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await verify_password_async(user_in.password, user.hashed_password)
+        except PasswordPoolBusy:
+            raise _busy()
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
         )
-    
+
+    # BCRYPT_ROUNDS changed since this hash was made: store the new one
+    if new_hash:
+        await _update_password_hash(db, user, new_hash)
+
     token = create_access_token({"sub": str(user.id)})
-    
+
     return {
         "access_token": token,
         "token_type": "bearer",
@@ -74,5 +132,5 @@ def login(user_in: schemas.UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=schemas.UserOut)
-def get_me(current_user: models.User = Depends(get_current_user)):
+async def get_me(current_user: AuthContext = Depends(get_current_user)):
     return current_user
@@ -1,69 +1,118 @@
-import os
-from typing import List
+import json
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
 
-import requests
-from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import anyio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models, schemas
+from auth_context import AuthContext, SubscriptionInfo
+from database import AsyncSessionLocal
 from deps import get_db, get_current_user
-
-load_dotenv()
+from routers.conversations import latest_conversation, get_conversation, resolve_conversation
+from utils.ai_client import AIProviderError
+from utils.chat_context import build_context, should_request_summary
+from utils.completion_cache import CACHED_USAGE, completion_cache
+from utils.provider_router import get_router
+from utils.jobs import enqueue
+from utils.quota import quota_store
+from utils.write_buffer import write_buffer
+from utils.tokens import count_message_tokens, usage_from_response
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+logger = logging.getLogger(__name__)
 
 
-def call_ai_api(messages: List[dict]) -> str:
-    """Try OpenAI first → fallback to Groq if failed."""
+def _cache_key(messages: List[dict]) -> str:
+    providers = [p for p in get_router().providers if p.enabled]
+    model = "|".join(p.model for p in providers)
+    temperature = providers[0].temperature if providers else 0.7
+    return completion_cache.make_key(model, temperature, messages)
 
-    OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
-    GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 
-    if OPENAI_API_KEY:
-        try:
-            response = requests.post(
-                OPENAI_API_URL,
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": "gpt-4o-mini",
-                    "messages": messages,
-                    "temperature": 0.7,
-                },
-                timeout=60,
+async def _complete(messages: List[dict]) -> dict:
+    _, data = await get_router().complete(messages)
+    return data
+
+
+async def call_ai_api(messages: List[dict]) -> Tuple[str, dict]:
+    """
+    Try OpenAI first → fallback to Groq if failed (see utils.provider_router).
+    Returns the reply text and its token usage (zero for a cached reply).
+    """
+
+    try:
+        if completion_cache.enabled:
+            data, shared = await completion_cache.get_or_fetch(
+                _cache_key(messages), lambda: _complete(messages)
             )
-            if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"]
-            print("OpenAI Error:", response.text)
-        except Exception as e:
-            print("OpenAI Exception:", e)
+        else:
+            data, shared = await _complete(messages), False
+        reply_text = data["choices"][0]["message"]["content"]
+        usage = CACHED_USAGE if shared else data.get("usage")
+        return reply_text, usage_from_response(usage, messages, reply_text)
+    except Exception as e:
+        logger.warning("AI API call failed: %r", e)
+
+    raise HTTPException(
+        status_code=500,
+        detail="AI API error - no valid API response received."
+    )
+
+
+async def stream_ai_api(
+    messages: List[dict], usage: Optional[dict] = None
+) -> AsyncIterator[Optional[str]]:
+    """
+    Streaming version of call_ai_api.
+
+    Yields text deltas. If a provider breaks after it already sent some
+    text, `None` is yielded before switching to the fallback so the caller
+    can throw the partial reply away. `usage` receives the provider's raw
+    token usage when it reports one, or CACHED_USAGE for a cached reply.
+    Identical concurrent streams share one upstream call; the followers get
+    the whole reply as a single delta.
+    """
+
+    key = _cache_key(messages) if completion_cache.enabled else None
+    if usage is None:
+        usage = {}
+
+    try:
+        cached = await completion_cache.get_or_join(key) if key is not None else None
+        if cached is not None:
+            usage.update(CACHED_USAGE)
+            yield cached["choices"][0]["message"]["content"]
+            return
 
-    if GROQ_API_KEY:
+        parts: List[str] = []
         try:
-            response = requests.post(
-                GROQ_API_URL,
-                headers={
-                    "Authorization": f"Bearer {GROQ_API_KEY}",
-                    "Content-Type": "application/json",
+            async for delta in get_router().stream(messages, usage):
+                if delta is None:
+                    parts.clear()
+                else:
+                    parts.append(delta)
+                yield delta
+        except BaseException as e:
+            if key is not None:
+                completion_cache.fail(key, e)
+            raise
+        if key is not None:
+            completion_cache.finish(
+                key,
+                {
+                    "choices": [{"message": {"role": "assistant", "content": "".join(parts)}}],
+                    "usage": dict(usage),
                 },
-                json={
-                    "model": "llama-3.3-70b-versatile",
-                    "messages": messages,
-                    "temperature": 0.7,
-                },
-                timeout=60,
+                store=bool(parts),
             )
-            if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"]
-            print("Groq Error:", response.text)
-        except Exception as e:
-            print("Groq Exception:", e)
+        return
+    except AIProviderError as e:
+        logger.warning("AI API stream failed: %r", e)
 
     raise HTTPException(
         status_code=500,
@@ -71,24 +120,12 @@ def call_ai_api(messages: List[dict]) -> str:
     )
 
 
-@router.post("", response_model=schemas.ChatResponse)
-def send_message(
-    chat_in: schemas.ChatRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
-):
-    """Handle user chat and AI response with subscription validation."""
-
-    # Find active subscription
-    sub = (
-        db.query(models.Subscription)
-        .filter(
-            models.Subscription.user_id == current_user.id,
-            models.Subscription.status == "active",
-        )
-        .order_by(models.Subscription.start_date.desc())
-        .first()
-    )
+def get_active_subscription(current_user: AuthContext) -> SubscriptionInfo:
+    """
+    Return the user's active subscription or raise 402 if none / over limit.
+    Comes from the cached auth context; token usage from the quota store.
+    """
+    sub = current_user.subscription
 
     if not sub:
         raise HTTPException(
@@ -96,71 +133,340 @@ def send_message(
             detail="No active subscription! Please upgrade your plan."
         )
 
-    plan = sub.plan
+    plan = current_user.plan
+    quota_store.ensure(sub.id, sub.used_tokens, plan.tokens_per_month)
 
     # Check usage limits
-    if sub.used_tokens >= plan.tokens_per_month:
+    if quota_store.used(sub.id) >= plan.tokens_per_month:
         raise HTTPException(
             status_code=402,
             detail="Your plan token limit is exceeded! Please upgrade."
         )
 
-    # Save user message
+    return sub
+
+
+async def save_user_message(
+    db: AsyncSession, sub: SubscriptionInfo, user_id: int, content: str,
+    conversation_id: Optional[int] = None,
+) -> Tuple[models.ChatMessage, List[dict], int]:
+    """
+    Store the user message in its conversation (see resolve_conversation)
+    and return it with the prompt (history) for the AI and the number of
+    tokens reserved for it in the quota store.
+
+    Raises 402 without storing anything when the estimated prompt size does
+    not fit in the remaining plan tokens, so no provider call is wasted.
+    """
+    conversation = await resolve_conversation(db, user_id, conversation_id, content)
     user_msg = models.ChatMessage(
-        user_id=current_user.id,
+        user_id=user_id,
+        conversation_id=conversation.id,
         role="user",
-        content=chat_in.message,
+        content=content,
     )
     db.add(user_msg)
-    db.commit()
-
-    # Fetch last chat history for AI context
-    last_msgs = (
-        db.query(models.ChatMessage)
-        .filter(models.ChatMessage.user_id == current_user.id)
-        .order_by(models.ChatMessage.created_at.desc())
-        .limit(10)
-        .all()
+    await db.execute(
+        update(models.Conversation)
+        .where(models.Conversation.id == conversation.id)
+        .values(updated_at=func.now())
+        .execution_options(synchronize_session=False)
     )
+    await db.flush()
+    # load created_at now: a refresh after the commit would hold a pooled
+    # connection through the whole AI call
+    await db.refresh(user_msg)
 
-    messages_for_ai = [
-        {"role": "system", "content": "You are a helpful AI assistant."}
-    ]
+    # History of this conversation that fits in the token budget, plus its
+    # rolling summary
+    messages_for_ai, needs_summary = await build_context(db, conversation.id, user_msg)
 
-    for m in reversed(last_msgs):
-        messages_for_ai.append({"role": m.role, "content": m.content})
+    # Atomic check-and-reserve: concurrent requests can't all pass the check
+    reserved = count_message_tokens(messages_for_ai)
+    if not quota_store.reserve(sub.id, reserved):
+        await db.rollback()
+        raise HTTPException(
+            status_code=402,
+            detail="This message needs more tokens than your plan has left! Please upgrade."
+        )
 
-    messages_for_ai.append({"role": "user", "content": chat_in.message})
+    # older turns were left out: refresh the summary in the background
+    if needs_summary and should_request_summary(conversation.id):
+        enqueue(db, "chat.summarize", {"conversation_id": conversation.id}, max_attempts=3)
+
+    try:
+        await db.commit()
+    except BaseException:
+        quota_store.release(sub.id, reserved)
+        raise
+    return user_msg, messages_for_ai, reserved
 
-    # Call AI API for assistant response
-    reply_text = call_ai_api(messages_for_ai)
 
+async def save_assistant_reply(
+    db: AsyncSession, user_id: int, conversation_id: int, sub_id: int,
+    reply_text: str, usage: dict, reserved: int,
+) -> models.ChatMessage:
+    """
+    Store the assistant reply and its usage log, then charge the tokens in
+    the quota store (written to subscriptions in batches by utils.quota).
+    With WRITE_BUFFER_MODE set, the rows go through the group commit of
+    utils.write_buffer instead of a commit of their own. A reply that isn't
+    buffered (WRITE_BUFFER_CHAT_MESSAGES=false) commits together with its
+    usage log, unless "async" mode writes the log behind.
+    """
     ai_msg = models.ChatMessage(
-        user_id=current_user.id,
+        user_id=user_id,
+        conversation_id=conversation_id,
         role="assistant",
         content=reply_text,
     )
-    db.add(ai_msg)
 
-    # Update usage log & subscription usage
-    sub.used_tokens += 1
-    usage = models.UsageLog(
-        user_id=current_user.id,
-        tokens_used=1,
+    # Update usage log
+    usage_log = {
+        "user_id": user_id,
+        "subscription_id": sub_id,
+        "tokens_used": usage["total_tokens"],
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+    }
+
+    try:
+        if write_buffer.enabled and write_buffer.chat_messages:
+            await write_buffer.write([usage_log], [ai_msg])
+        else:
+            db.add(ai_msg)
+            if write_buffer.enabled and write_buffer.mode == "async":
+                await write_buffer.write([usage_log])       # written behind, no wait
+            else:
+                # the reply commits here anyway: one commit for the whole turn
+                db.add(models.UsageLog(**usage_log))
+            await db.commit()
+            await db.refresh(ai_msg)
+    except BaseException:
+        quota_store.release(sub_id, reserved)
+        raise
+
+    quota_store.settle(sub_id, reserved, usage["total_tokens"])
+    return ai_msg
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def _save_reply_standalone(
+    user_id: int, conversation_id: int, sub_id: int, reply_text: str, usage: dict, reserved: int
+) -> models.ChatMessage:
+    async with AsyncSessionLocal() as db:
+        return await save_assistant_reply(
+            db, user_id, conversation_id, sub_id, reply_text, usage, reserved
+        )
+
+
+@router.post("", response_model=schemas.ChatResponse)
+async def send_message(
+    chat_in: schemas.ChatRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthContext = Depends(get_current_user),
+):
+    """Handle user chat and AI response with subscription validation."""
+
+    # Find active subscription
+    sub = get_active_subscription(current_user)
+
+    # Save user message
+    user_msg, messages_for_ai, reserved = await save_user_message(
+        db, sub, current_user.id, chat_in.message, chat_in.conversation_id
     )
 
-    db.add(usage)
-    db.commit()
+    # Call AI API for assistant response
+    try:
+        reply_text, usage = await call_ai_api(messages_for_ai)
+    except BaseException:
+        quota_store.release(sub.id, reserved)
+        raise
 
-    # Return full chat history back to frontend
-    all_msgs = (
-        db.query(models.ChatMessage)
-        .filter(models.ChatMessage.user_id == current_user.id)
-        .order_by(models.ChatMessage.created_at.asc())
-        .all()
+    ai_msg = await save_assistant_reply(
+        db, current_user.id, user_msg.conversation_id, sub.id, reply_text, usage, reserved
     )
 
+    # Only the new turn goes back; older messages come from GET /chat/history
     return schemas.ChatResponse(
         reply=reply_text,
-        history=all_msgs,
+        conversation_id=user_msg.conversation_id,
+        messages=[user_msg, ai_msg],
+        cursor=ai_msg.id,
+        usage=usage,
+    )
+
+
+@router.post("/stream")
+async def stream_message(
+    chat_in: schemas.ChatRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthContext = Depends(get_current_user),
+):
+    """
+    Same as POST /chat, but the reply is sent as Server-Sent Events while the
+    provider is generating it.
+
+    Events: `data: {"delta": ...}` chunks, `reset` when the fallback provider
+    takes over mid-reply, then `done` with the saved turn + cursor (or `error`).
+
+    The reply is saved and charged when the stream completes, and (as far
+    as it got) when the client disconnects. On `error` nothing is saved and
+    the reserved tokens are released.
+    """
+
+    sub = get_active_subscription(current_user)
+    user_msg, messages_for_ai, reserved = await save_user_message(
+        db, sub, current_user.id, chat_in.message, chat_in.conversation_id
+    )
+
+    user_id = current_user.id
+    conversation_id = user_msg.conversation_id
+    sub_id = sub.id
+
+    async def event_stream():
+        parts: List[str] = []
+        provider_usage: dict = {}
+        ai_msg = None
+        completed = disconnected = False
+        try:
+            try:
+                async for delta in stream_ai_api(messages_for_ai, provider_usage):
+                    if delta is None:
+                        parts.clear()
+                        yield _sse({}, event="reset")
+                        continue
+                    parts.append(delta)
+                    yield _sse({"delta": delta})
+                completed = True
+            except HTTPException as e:
+                # every provider failed: a partial reply is neither saved nor charged
+                yield _sse({"detail": e.detail}, event="error")
+            except (anyio.get_cancelled_exc_class(), GeneratorExit):
+                # the client disconnected: the provider already produced (and
+                # bills) what was streamed so far
+                disconnected = True
+                raise
+        finally:
+            reply_text = "".join(parts)
+            if reply_text and (completed or disconnected):
+                # A disconnect means the provider never sent its usage: estimate.
+                usage = usage_from_response(
+                    provider_usage if completed else None, messages_for_ai, reply_text
+                )
+                with anyio.CancelScope(shield=True):
+                    ai_msg = await _save_reply_standalone(
+                        user_id, conversation_id, sub_id, reply_text, usage, reserved
+                    )
+            else:
+                quota_store.release(sub_id, reserved)
+
+        if completed and ai_msg is not None:
+            yield _sse(
+                {
+                    "conversation_id": conversation_id,
+                    "messages": [
+                        schemas.ChatMessageOut.model_validate(m).model_dump(mode="json")
+                        for m in (user_msg, ai_msg)
+                    ],
+                    "cursor": ai_msg.id,
+                    "usage": usage,
+                },
+                event="done",
+            )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/history", response_model=schemas.ChatHistoryPage)
+async def chat_history(
+    response: Response,
+    conversation_id: Optional[int] = Query(None, description="Thread, default the latest one"),
+    before_id: Optional[int] = Query(None, description="Page of messages older than this id"),
+    since_id: Optional[int] = Query(None, description="Only messages newer than this id"),
+    limit: int = Query(50, ge=1, le=200),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthContext = Depends(get_current_user),
+):
+    """
+    Keyset-paginated history of one conversation, on (conversation_id, id).
+
+    - no cursor: latest `limit` messages
+    - `before_id`: the page before that message (scrolling back)
+    - `since_id`: everything after that message (catching up), oldest first
+
+    Messages are append-only, so the newest message id of the conversation
+    is enough to build an ETag; on a match we answer 304 without loading any rows.
+    Archived messages (utils.archive) are older than every hot one of the
+    conversation, so pages that reach past the oldest hot message continue
+    in chat_messages_archive; archiving doesn't change a page or its ETag.
+    """
+
+    if conversation_id is not None:
+        conversation = await get_conversation(db, current_user.id, conversation_id)
+    else:
+        conversation = await latest_conversation(db, current_user.id)
+        if conversation is None:
+            return schemas.ChatHistoryPage(messages=[], cursor=since_id)
+
+    Hot, Cold = models.ChatMessage, models.ChatMessageArchive
+    oldest_hot_id, latest_id = (
+        await db.execute(
+            select(func.min(Hot.id), func.max(Hot.id))
+            .where(Hot.conversation_id == conversation.id)
+        )
+    ).one()
+    if latest_id is None:
+        latest_id = await db.scalar(
+            select(func.max(Cold.id)).where(Cold.conversation_id == conversation.id)
+        ) or 0
+    etag = f'W/"chat-{conversation.id}-{latest_id}-{before_id}-{since_id}-{limit}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    hot = select(Hot).where(Hot.conversation_id == conversation.id)
+    cold = select(Cold).where(Cold.conversation_id == conversation.id)
+
+    if since_id is not None:
+        rows = []
+        if oldest_hot_id is None or since_id < oldest_hot_id:
+            rows = list(
+                await db.scalars(cold.where(Cold.id > since_id).order_by(Cold.id.asc()).limit(limit))
+            )
+        if len(rows) < limit:
+            rows += await db.scalars(
+                hot.where(Hot.id > since_id).order_by(Hot.id.asc()).limit(limit - len(rows))
+            )
+    else:
+        if before_id is not None:
+            hot = hot.where(Hot.id < before_id)
+        rows = list(await db.scalars(hot.order_by(Hot.id.desc()).limit(limit)))
+        if len(rows) < limit:
+            bound = rows[-1].id if rows else before_id
+            if bound is not None:
+                cold = cold.where(Cold.id < bound)
+            rows += await db.scalars(cold.order_by(Cold.id.desc()).limit(limit - len(rows)))
+        rows.reverse()
+
+    next_before_id = None
+    if rows and since_id is None and len(rows) == limit:
+        next_before_id = rows[0].id
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    return schemas.ChatHistoryPage(
+        conversation_id=conversation.id,
+        messages=rows,
+        next_before_id=next_before_id,
+        cursor=rows[-1].id if rows else since_id,
     )
@@ -0,0 +1,147 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models, schemas
+from auth_context import AuthContext
+from deps import get_db, get_current_user
+from utils.cursors import decode_cursor, encode_cursor
+
+router = APIRouter(prefix="/conversations", tags=["Conversations"])
+
+DEFAULT_TITLE = "New chat"
+
+
+async def get_conversation(db: AsyncSession, user_id: int, conversation_id: int) -> models.Conversation:
+    """The user's conversation, or 404 (also for other users' ids)."""
+    conversation = await db.get(models.Conversation, conversation_id)
+    if conversation is None or conversation.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+
+async def latest_conversation(db: AsyncSession, user_id: int) -> Optional[models.Conversation]:
+    return (
+        await db.scalars(
+            select(models.Conversation)
+            .where(models.Conversation.user_id == user_id)
+            .order_by(models.Conversation.updated_at.desc(), models.Conversation.id.desc())
+            .limit(1)
+        )
+    ).first()
+
+
+async def resolve_conversation(
+    db: AsyncSession, user_id: int, conversation_id: Optional[int], first_message: str
+) -> models.Conversation:
+    """
+    Conversation a chat message goes to: the given one, else the latest one
+    (clients that don't know about threads), else a new one titled after
+    the message. A new conversation is only flushed, the caller commits.
+    """
+    if conversation_id is not None:
+        return await get_conversation(db, user_id, conversation_id)
+
+    conversation = await latest_conversation(db, user_id)
+    if conversation is None:
+        conversation = models.Conversation(
+            user_id=user_id, title=first_message.strip()[:60] or DEFAULT_TITLE
+        )
+        db.add(conversation)
+        await db.flush()
+    return conversation
+
+
+@router.post("", response_model=schemas.ConversationOut)
+async def create_conversation(
+    conversation_in: schemas.ConversationCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthContext = Depends(get_current_user),
+):
+    conversation = models.Conversation(
+        user_id=current_user.id,
+        title=(conversation_in.title or "").strip() or DEFAULT_TITLE,
+    )
+    db.add(conversation)
+    await db.commit()
+    await db.refresh(conversation)
+    return conversation
+
+
+@router.get("", response_model=schemas.ConversationPage)
+async def list_conversations(
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthContext = Depends(get_current_user),
+):
+    """
+    The user's conversations, most recently active first, keyset-paginated
+    on (updated_at, id). Pass `next_cursor` back as `cursor` for the next
+    page; it is None on the last page. A thread that gets a message while
+    paging moves to the top: later pages don't repeat it.
+    """
+    query = (
+        select(models.Conversation)
+        .where(models.Conversation.user_id == current_user.id)
+        .order_by(models.Conversation.updated_at.desc(), models.Conversation.id.desc())
+    )
+    if cursor:
+        updated_at, conversation_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                models.Conversation.updated_at < updated_at,
+                and_(
+                    models.Conversation.updated_at == updated_at,
+                    models.Conversation.id < conversation_id,
+                ),
+            )
+        )
+
+    # one extra row tells us whether there is a next page
+    conversations = (await db.scalars(query.limit(limit + 1))).all()
+    next_cursor = None
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        next_cursor = encode_cursor(conversations[-1].updated_at, conversations[-1].id)
+
+    return {"items": conversations, "next_cursor": next_cursor}
+
+
+@router.patch("/{conversation_id}", response_model=schemas.ConversationOut)
+async def rename_conversation(
+    conversation_id: int,
+    conversation_in: schemas.ConversationUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthContext = Depends(get_current_user),
+):
+    conversation = await get_conversation(db, current_user.id, conversation_id)
+    conversation.title = conversation_in.title.strip() or DEFAULT_TITLE
+    await db.commit()
+    return conversation
+
+
+@router.delete("/{conversation_id}", status_code=204)
+async def delete_conversation(
+    conversation_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthContext = Depends(get_current_user),
+):
+    """Delete a conversation with its messages (hot and archived) and summary."""
+    conversation = await get_conversation(db, current_user.id, conversation_id)
+    await db.execute(
+        delete(models.ChatSummary)
+        .where(models.ChatSummary.conversation_id == conversation.id)
+        .execution_options(synchronize_session=False)
+    )
+    for model in (models.ChatMessage, models.ChatMessageArchive):
+        await db.execute(
+            delete(model)
+            .where(model.conversation_id == conversation.id)
+            .execution_options(synchronize_session=False)
+        )
+    await db.delete(conversation)
+    await db.commit()
+    return Response(status_code=204)
@@ -1,18 +1,23 @@
+import hashlib
 import os
 from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
 
-import razorpay
-import stripe
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
+from auth_context import auth_cache
 from deps import get_db, get_current_user
 
-from utils.invoice import generate_invoice
-from utils.mailer import send_invoice_email
+from utils.invoice_storage import invoice_storage
+from utils.jobs import enqueue
+from utils.rollups import record_payment
+from utils.scheduler import TOKEN_PERIOD
 
 load_dotenv()
 
@@ -21,50 +26,80 @@ router = APIRouter(prefix="/payments", tags=["Payments"])
 # ---------- Razorpay (INR) ----------
 RAZORPAY_KEY = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY, RAZORPAY_SECRET))
 
 # ---------- Stripe (USD) ----------
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 
 
-def activate_subscription(db: Session, user_id: int, plan: models.Plan) -> models.Subscription:
+# Gateway SDKs are imported on first use, not when the app starts.
+@lru_cache(maxsize=None)
+def get_razorpay_client():
+    import razorpay
+
+    return razorpay.Client(auth=(RAZORPAY_KEY, RAZORPAY_SECRET))
+
+
+@lru_cache(maxsize=None)
+def get_stripe():
+    import stripe
+
+    stripe.api_key = STRIPE_SECRET_KEY
+    return stripe
+
+
+async def activate_subscription(db: AsyncSession, user_id: int, plan_id: int) -> models.Subscription:
     now = datetime.utcnow()
     end_date = now + timedelta(days=30)
 
     # expire old active subscriptions
-    db.query(models.Subscription).filter(
-        models.Subscription.user_id == user_id,
-        models.Subscription.status == "active"
-    ).update({"status": "expired"})
+    await db.execute(
+        update(models.Subscription)
+        .where(
+            models.Subscription.user_id == user_id,
+            models.Subscription.status == "active",
+        )
+        .values(status="expired")
+        .execution_options(synchronize_session=False)
+    )
 
     subscription = models.Subscription(
         user_id=user_id,
-        plan_id=plan.id,
+        plan_id=plan_id,
         status="active",
         start_date=now,
         end_date=end_date,
         used_tokens=0,
+        tokens_reset_at=now + TOKEN_PERIOD,
     )
 
     db.add(subscription)
-    db.commit()
-    db.refresh(subscription)
+    await db.commit()
+    auth_cache.invalidate(user_id)
     return subscription
 
 
+async def _active_plan(db: AsyncSession, plan_id: int) -> Optional[models.Plan]:
+    return (
+        await db.scalars(
+            select(models.Plan).where(models.Plan.id == plan_id, models.Plan.is_active == True)
+        )
+    ).first()
+
+
 @router.post("/razorpay/create-order/{plan_id}")
-def razorpay_create_order(
+async def razorpay_create_order(
     plan_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    plan = db.query(models.Plan).filter(models.Plan.id == plan_id, models.Plan.is_active == True).first()
+    plan = await _active_plan(db, plan_id)
     if not plan or plan.currency != "INR":
         raise HTTPException(status_code=400, detail="Invalid INR plan")
 
     amount_paise = max(int(plan.price * 100), 100)  # Razorpay minimum = ₹1
 
-    order = razorpay_client.order.create({
+    # the gateway SDKs are blocking HTTP clients
+    order = await run_in_threadpool(get_razorpay_client().order.create, {
         "amount": amount_paise,
         "currency": "INR",
         "payment_capture": 1,
@@ -80,8 +115,7 @@ def razorpay_create_order(
         transaction_id=order["id"],
     )
     db.add(payment)
-    db.commit()
-    db.refresh(payment)
+    await db.commit()
 
     return {
         "order_id": order["id"],
@@ -95,7 +129,7 @@ def razorpay_create_order(
 @router.post("/razorpay/verify")
 async def razorpay_verify(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
     data = await request.json()
@@ -107,7 +141,7 @@ async def razorpay_verify(
         raise HTTPException(status_code=400, detail="Missing fields")
 
     try:
-        razorpay_client.utility.verify_payment_signature({
+        get_razorpay_client().utility.verify_payment_signature({
             "razorpay_order_id": order_id,
             "razorpay_payment_id": payment_id,
             "razorpay_signature": signature,
@@ -115,44 +149,39 @@ async def razorpay_verify(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid signature")
 
-    payment = db.query(models.Payment).filter_by(
-        transaction_id=order_id,
-        gateway="razorpay"
+    payment = (
+        await db.scalars(
+            select(models.Payment).filter_by(transaction_id=order_id, gateway="razorpay")
+        )
     ).first()
 
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
 
-    payment.status = "success"
-    db.commit()
-    db.refresh(payment)
-
-    plan = payment.plan
-    activate_subscription(db, current_user.id, plan)
-
-    user = current_user
-
-    # generate invoice
-    invoice_name, invoice_path = generate_invoice(payment, user, plan)
-    payment.invoice_filename = invoice_name
-    db.commit()
+    # Payment, subscription and the invoice job commit together; the PDF
+    # and the email are handled by the job worker (utils.billing_jobs).
+    if payment.status != "success":
+        payment.status = "success"
+        await record_payment(db, payment)
+        enqueue(db, "invoice.render", {"payment_id": payment.id})
 
-    await send_invoice_email(user.email, invoice_path)
+    await activate_subscription(db, current_user.id, payment.plan_id)
 
-    return {"message": "Payment verified, subscription activated & invoice emailed"}
+    return {"message": "Payment verified & subscription activated. Your invoice will be emailed shortly."}
 
 
 @router.post("/stripe/checkout/{plan_id}")
-def stripe_checkout(
+async def stripe_checkout(
     plan_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    plan = db.query(models.Plan).filter(models.Plan.id == plan_id, models.Plan.is_active == True).first()
+    plan = await _active_plan(db, plan_id)
     if not plan or plan.currency != "USD":
         raise HTTPException(status_code=400, detail="Invalid USD plan")
 
-    checkout = stripe.checkout.Session.create(
+    checkout = await run_in_threadpool(
+        get_stripe().checkout.Session.create,
         payment_method_types=["card"],
         line_items=[{
             "price_data": {
@@ -178,29 +207,61 @@ def stripe_checkout(
         transaction_id=checkout.id,
     )
     db.add(payment)
-    db.commit()
-    db.refresh(payment)
+    await db.commit()
 
     return {"checkout_url": checkout.url}
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison, as If-None-Match requires
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return etag in tags
+
+
+def _hash_stored_invoice(name: str) -> Optional[str]:
+    if not invoice_storage.exists(name):
+        return None
+    return hashlib.sha256(invoice_storage.read(name)).hexdigest()
+
+
 @router.get("/invoice/{payment_id}")
-def download_invoice(
+async def download_invoice(
     payment_id: int,
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    payment = db.query(models.Payment).filter(
-        models.Payment.id == payment_id,
-        models.Payment.user_id == current_user.id,
+    """
+    The invoice PDF, with the content hash as strong ETag: a repeat download
+    with If-None-Match is a 304, Range requests are honoured by the storage.
+    """
+    payment = (
+        await db.scalars(
+            select(models.Payment).where(
+                models.Payment.id == payment_id,
+                models.Payment.user_id == current_user.id,
+            )
+        )
     ).first()
 
     if not payment or not payment.invoice_filename:
         raise HTTPException(status_code=404, detail="Invoice not ready yet")
 
-    path = os.path.join("invoices", payment.invoice_filename)
+    if not payment.invoice_sha256:
+        # rendered before invoices were hashed: hash it once
+        sha256 = await run_in_threadpool(_hash_stored_invoice, payment.invoice_filename)
+        if sha256 is None:
+            raise HTTPException(status_code=404, detail="Invoice file missing")
+        payment.invoice_sha256 = sha256
+        await db.commit()
 
-    if not os.path.exists(path):
-        raise HTTPException(status_code=404, detail="Invoice file missing")
+    etag = f'"{payment.invoice_sha256}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
 
-    return FileResponse(path, filename=payment.invoice_filename)
+    return invoice_storage.response(payment.invoice_filename, headers)
@@ -1,22 +1,31 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from typing import Optional
 
-import models, schemas
-from deps import get_db
+from fastapi import APIRouter, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+
+import schemas
+from utils.plan_catalog import plan_catalog
 
 router = APIRouter(prefix="/plans", tags=["Plans"])
 
 
 @router.get("", response_model=list[schemas.PlanOut])
-def list_active_plans(db: Session = Depends(get_db)):
+async def list_active_plans(if_none_match: Optional[str] = Header(None)):
     """
     Public endpoint: show only active plans.
     Frontend pricing page yahan se data lega.
+
+    Served from the per-worker catalog cache (utils.plan_catalog): already
+    encoded JSON, and a 304 when the client's ETag is still current.
     """
-    plans = (
-        db.query(models.Plan)
-        .filter(models.Plan.is_active == True)
-        .order_by(models.Plan.price.asc())
-        .all()
-    )
-    return plans
+    if plan_catalog.is_fresh():
+        # no DB access: skip the threadpool hop
+        etag, body = plan_catalog.get()
+    else:
+        etag, body = await run_in_threadpool(plan_catalog.get)
+
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
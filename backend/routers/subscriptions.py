@@ -1,32 +1,30 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
 import models
+from auth_context import AuthContext, auth_cache
 from deps import get_db, get_current_user
+from utils.quota import quota_store
 
 router = APIRouter(prefix="/subscription", tags=["Subscription"])
 
 @router.get("/me")
-def my_subscription(
-    db: Session = Depends(get_db),
-    current_user=Depends(get_current_user),
+async def my_subscription(
+    current_user: AuthContext = Depends(get_current_user),
 ):
-    sub = (
-        db.query(models.Subscription)
-        .filter(
-            models.Subscription.user_id == current_user.id,
-            models.Subscription.status == "active",
-        )
-        .order_by(models.Subscription.start_date.desc())
-        .first()
-    )
+    sub = current_user.subscription
 
     if not sub:
         return {"active": False}
 
-    plan = sub.plan
-    remaining = max(plan.tokens_per_month - sub.used_tokens, 0)
+    plan = current_user.plan
+    # The quota store is ahead of the DB row until its next flush
+    used_tokens = quota_store.used(sub.id)
+    if used_tokens is None:
+        used_tokens = sub.used_tokens
+    remaining = max(plan.tokens_per_month - used_tokens, 0)
 
     return {
         "active": True,
@@ -35,27 +33,35 @@ def my_subscription(
         "price": plan.price,
         "currency": plan.currency,
         "tokens_per_month": plan.tokens_per_month,
-        "used_tokens": sub.used_tokens,
+        "used_tokens": used_tokens,
         "remaining_tokens": remaining,
         "end_date": sub.end_date.isoformat() if sub.end_date else None,
         "is_expired": sub.end_date < datetime.utcnow() if sub.end_date else False,
+        "tokens_reset_at": sub.tokens_reset_at.isoformat() if sub.tokens_reset_at else None,
     }
 
 
 @router.delete("/cancel")
-def cancel_subscription(
-    db: Session = Depends(get_db),
-    current_user=Depends(get_current_user),
+async def cancel_subscription(
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthContext = Depends(get_current_user),
 ):
-    sub = db.query(models.Subscription).filter(
-        models.Subscription.user_id == current_user.id,
-        models.Subscription.status == "active",
+    sub = (
+        await db.scalars(
+            select(models.Subscription)
+            .where(
+                models.Subscription.user_id == current_user.id,
+                models.Subscription.status == "active",
+            )
+            .limit(1)
+        )
     ).first()
 
     if not sub:
         raise HTTPException(status_code=404, detail="No active subscription found")
 
     sub.status = "cancelled"
-    db.commit()
+    await db.commit()
+    auth_cache.invalidate(current_user.id)
 
     return {"message": "Subscription cancelled successfully"}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from typing import List, Optional
 
@@ -35,8 +35,33 @@ class Token(BaseModel):
 
 # ---------- CHAT ----------
 
+class ConversationCreate(BaseModel):
+    title: Optional[str] = Field(None, max_length=200)
+
+
+class ConversationUpdate(BaseModel):
+    title: str = Field(..., min_length=1, max_length=200)
+
+
+class ConversationOut(BaseModel):
+    id: int
+    title: str
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class ConversationPage(BaseModel):
+    items: List[ConversationOut]        # most recently active first
+    next_cursor: Optional[str] = None   # pass back as `cursor`, None on the last page
+
+
 class ChatRequest(BaseModel):
     message: str
+    conversation_id: Optional[int] = None   # default: the latest conversation
 
 
 class ChatMessageOut(BaseModel):
@@ -50,15 +75,31 @@ class ChatMessageOut(BaseModel):
     }
 
 
+class TokenUsage(BaseModel):
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+
+
 class ChatResponse(BaseModel):
     reply: str
-    history: List[ChatMessageOut]
+    conversation_id: int
+    messages: List[ChatMessageOut]      # only this turn (user + assistant)
+    cursor: int                         # pass as since_id to GET /chat/history
+    usage: Optional[TokenUsage] = None
 
     model_config = {
         "from_attributes": True
     }
 
 
+class ChatHistoryPage(BaseModel):
+    conversation_id: Optional[int] = None
+    messages: List[ChatMessageOut]      # oldest → newest
+    next_before_id: Optional[int] = None  # older page, None when exhausted
+    cursor: Optional[int] = None        # newest id seen, use as since_id
+
+
 # ---------- PLANS / SAAS ----------
 
 class PlanBase(BaseModel):
@@ -67,6 +108,8 @@ class PlanBase(BaseModel):
     price: float
     currency: str = "INR"            # "INR" or "USD"
     tokens_per_month: int
+    requests_per_minute: int = 10    # chat rate limit (token bucket)
+    burst: int = 5
     is_active: bool = True
 
 
@@ -80,6 +123,8 @@ class PlanUpdate(BaseModel):
     price: Optional[float] = None
     currency: Optional[str] = None
     tokens_per_month: Optional[int] = None
+    requests_per_minute: Optional[int] = None
+    burst: Optional[int] = None
     is_active: Optional[bool] = None
 
 
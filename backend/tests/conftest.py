@@ -0,0 +1,43 @@
+"""
+Test setup: the backend runs against a throwaway SQLite database, migrated
+with Alembic exactly like `python manage.py init-db`. Run from backend/:
+
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Before any backend module reads its settings (.env doesn't override these)
+_tmp = tempfile.mkdtemp(prefix="ukschat-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["QUOTA_BACKEND"] = "local"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GROQ_API_KEY", "test")
+# cheap hashes; set BCRYPT_ROUNDS=12 for realistic password benchmark numbers
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+
+@pytest.fixture(scope="session")
+def migrated_db():
+    """The test database at the latest migration."""
+    from database import run_migrations
+
+    run_migrations()
+    yield os.environ["DATABASE_URL"]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_async_pool():
+    """Pooled async connections belong to the event loop of the test that opened them."""
+    yield
+    from database import async_engine
+
+    async_engine.sync_engine.dispose(close=False)
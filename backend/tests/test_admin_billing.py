@@ -0,0 +1,183 @@
+"""
+/admin/billing/payments: keyset pages stay stable when created_at ties,
+filters, and the streamed CSV / NDJSON exports return every matching row.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import models
+from auth_utils import create_access_token
+from database import SessionLocal
+from routers import admin_billing
+
+app = FastAPI()
+app.include_router(admin_billing.router)
+
+# 12 payments of billing-a, 7 of them in the same second; 3 of billing-b
+SAME_SECOND = datetime(2026, 3, 10, 12, 0, 0)
+PAYMENTS_A = (
+    [dict(created_at=SAME_SECOND, gateway="stripe", status="success", currency="INR")] * 7
+    + [
+        dict(created_at=datetime(2026, 3, 9, 8), gateway="razorpay", status="success", currency="INR"),
+        dict(created_at=datetime(2026, 3, 9, 9), gateway="stripe", status="failed", currency="USD"),
+        dict(created_at=datetime(2026, 3, 11, 0), gateway="razorpay", status="pending", currency="INR"),
+        dict(created_at=datetime(2026, 3, 12, 23, 59), gateway="stripe", status="success", currency="USD"),
+        dict(created_at=datetime(2026, 3, 1), gateway="stripe", status="success", currency="INR"),
+    ]
+)
+PAYMENTS_B = [dict(created_at=SAME_SECOND, gateway="stripe", status="success", currency="INR")] * 3
+
+
+@pytest.fixture(scope="module")
+def admin_headers(migrated_db):
+    with SessionLocal() as db:
+        plan = models.Plan(name="Billing test", price=99, tokens_per_month=1000)
+        admin = models.User(email="billing-admin@example.com", hashed_password="x", role="admin")
+        user_a = models.User(email="billing-a@example.com", hashed_password="x")
+        user_b = models.User(email="billing-b@example.com", hashed_password="x")
+        db.add_all([plan, admin, user_a, user_b])
+        db.flush()
+        for user, payments in ((user_a, PAYMENTS_A), (user_b, PAYMENTS_B)):
+            db.add_all(
+                models.Payment(user_id=user.id, plan_id=plan.id, amount=99, **payment)
+                for payment in payments
+            )
+        db.commit()
+        token = create_access_token({"sub": str(admin.id)})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def all_pages(client, headers, limit: int, **params) -> list:
+    """Every page of /payments, following next_cursor."""
+    items, cursor = [], None
+    while True:
+        response = client.get(
+            "/admin/billing/payments",
+            params={**params, "limit": limit, **({"cursor": cursor} if cursor else {})},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= limit
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_pages_split_inside_a_created_at_tie(client, admin_headers):
+    for limit in (1, 2, 3, 5, 12):
+        items = all_pages(client, admin_headers, limit, user_email="billing-a@example.com")
+        ids = [item["id"] for item in items]
+        assert len(ids) == len(set(ids)) == len(PAYMENTS_A), limit   # none skipped or repeated
+        assert [(item["created_at"], item["id"]) for item in items] == sorted(
+            ((item["created_at"], item["id"]) for item in items), reverse=True
+        )
+
+
+def test_cursor_survives_new_payments(client, admin_headers):
+    """A payment made while paging, in the same second, doesn't shift later pages."""
+    params = {"user_email": "billing-b@example.com", "limit": 2}
+    first = client.get("/admin/billing/payments", params=params, headers=admin_headers).json()
+
+    with SessionLocal() as db:
+        user = db.query(models.User).filter_by(email="billing-b@example.com").one()
+        plan = db.query(models.Plan).filter_by(name="Billing test").one()
+        db.add(models.Payment(
+            user_id=user.id, plan_id=plan.id, amount=99, gateway="stripe", created_at=SAME_SECOND,
+        ))
+        db.commit()
+
+    second = client.get(
+        "/admin/billing/payments", params={**params, "cursor": first["next_cursor"]},
+        headers=admin_headers,
+    ).json()
+    assert second["next_cursor"] is None
+    assert len(second["items"]) == 1
+    assert second["items"][0]["id"] < min(item["id"] for item in first["items"])
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"gateway": "razorpay"}, 2),
+    ({"status": "success"}, 10),
+    ({"currency": "USD"}, 2),
+    ({"gateway": "stripe", "status": "success", "currency": "INR"}, 8),
+    ({"from": "2026-03-10", "to": "2026-03-10"}, 7),
+    ({"from": "2026-03-11"}, 2),                # the whole last day is included
+    ({"to": "2026-03-09"}, 3),
+])
+def test_filters(client, admin_headers, filters, expected):
+    items = all_pages(client, admin_headers, 5, user_email="billing-a@example.com", **filters)
+    assert len(items) == expected
+    for key in ("gateway", "status", "currency"):
+        if key in filters:
+            assert {item[key] for item in items} == {filters[key]}
+
+
+def test_invalid_cursor_and_range_are_400(client, admin_headers):
+    for params in ({"cursor": "not-a-cursor"}, {"from": "2026-03-11", "to": "2026-03-10"}):
+        response = client.get("/admin/billing/payments", params=params, headers=admin_headers)
+        assert response.status_code == 400, params
+
+
+def test_non_admin_is_403(client, admin_headers):
+    with SessionLocal() as db:
+        user_id = db.query(models.User.id).filter_by(email="billing-a@example.com").scalar()
+    token = create_access_token({"sub": str(user_id)})
+    response = client.get("/admin/billing/payments", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(admin_billing, "EXPORT_BATCH_SIZE", 5)   # several batches per export
+
+
+def export(client, headers, fmt: str, **params):
+    response = client.get(
+        "/admin/billing/payments/export", params={"format": fmt, **params}, headers=headers
+    )
+    assert response.status_code == 200
+    return response
+
+
+def test_csv_export_has_every_row(client, admin_headers, small_batches):
+    response = export(client, admin_headers, "csv", user_email="billing-a@example.com")
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"].endswith('.csv"')
+
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == admin_billing.EXPORT_FIELDS
+    assert len(rows) == 1 + len(PAYMENTS_A)
+    assert len({row[0] for row in rows[1:]}) == len(PAYMENTS_A)
+
+    filtered = export(client, admin_headers, "csv", user_email="billing-a@example.com", currency="USD")
+    assert len(list(csv.reader(io.StringIO(filtered.text)))) == 1 + 2
+
+
+def test_csv_export_of_nothing_is_the_header(client, admin_headers):
+    response = export(client, admin_headers, "csv", user_email="nobody@example.com")
+    assert list(csv.reader(io.StringIO(response.text))) == [admin_billing.EXPORT_FIELDS]
+
+
+def test_ndjson_export_matches_the_pages(client, admin_headers, small_batches):
+    response = export(client, admin_headers, "ndjson", user_email="billing-a@example.com")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == len(PAYMENTS_A)
+    assert rows == all_pages(client, admin_headers, 4, user_email="billing-a@example.com")
+
+    assert export(client, admin_headers, "ndjson", user_email="nobody@example.com").text == ""
@@ -0,0 +1,100 @@
+"""AIProvider against a fake OpenAI-compatible API (httpx.MockTransport)."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from utils.ai_client import AIProvider, AIProviderError
+
+URL = "https://ai.test/v1/chat/completions"
+MESSAGES = [{"role": "user", "content": "hi"}]
+COMPLETION = {
+    "choices": [{"message": {"role": "assistant", "content": "Hello!"}}],
+    "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+}
+
+
+def make_provider(handler, monkeypatch) -> AIProvider:
+    monkeypatch.setenv("FAKE_API_KEY", "sk-test")
+    return AIProvider("Fake", "FAKE", URL, "fake-model", transport=httpx.MockTransport(handler))
+
+
+def sse(*chunks) -> bytes:
+    lines = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks]
+    return ("".join(lines) + "data: [DONE]\n\n").encode()
+
+
+def test_pooled_client_is_reused(monkeypatch):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(200, json=COMPLETION)
+
+    provider = make_provider(handler, monkeypatch)
+
+    async def scenario():
+        client = provider.client
+        results = await asyncio.gather(*(provider.complete(MESSAGES) for _ in range(5)))
+        assert provider.client is client        # one client for every call
+        await provider.aclose()
+        assert provider._client is None
+        return results
+
+    assert asyncio.run(scenario()) == [COMPLETION] * 5
+    assert len(seen) == 5
+    assert seen[0].headers["Authorization"] == "Bearer sk-test"
+    assert json.loads(seen[0].content)["model"] == "fake-model"
+
+
+def test_stream_collects_deltas_and_usage(monkeypatch):
+    body = sse(
+        {"choices": [{"delta": {"content": "Hel"}}]},
+        {"choices": [{"delta": {"content": "lo"}}]},
+        {"choices": [], "usage": COMPLETION["usage"]},
+    )
+    provider = make_provider(lambda request: httpx.Response(200, content=body), monkeypatch)
+    usage = {}
+
+    async def scenario():
+        return [delta async for delta in provider.stream(MESSAGES, usage)]
+
+    assert asyncio.run(scenario()) == ["Hel", "lo"]
+    assert usage == COMPLETION["usage"]
+
+
+def test_timeout_is_a_provider_error(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    provider = make_provider(handler, monkeypatch)
+
+    async def stream():
+        return [delta async for delta in provider.stream(MESSAGES)]
+
+    with pytest.raises(AIProviderError):
+        asyncio.run(provider.complete(MESSAGES))
+    with pytest.raises(AIProviderError):
+        asyncio.run(stream())
+
+
+@pytest.mark.parametrize("status", [400, 429, 500, 503])
+def test_error_status_is_a_provider_error(status, monkeypatch):
+    provider = make_provider(
+        lambda request: httpx.Response(status, json={"error": {"message": "nope"}}), monkeypatch
+    )
+
+    async def stream():
+        return [delta async for delta in provider.stream(MESSAGES)]
+
+    with pytest.raises(AIProviderError, match="nope"):
+        asyncio.run(provider.complete(MESSAGES))
+    with pytest.raises(AIProviderError, match="nope"):
+        asyncio.run(stream())
+
+
+def test_unreadable_body_is_a_provider_error(monkeypatch):
+    provider = make_provider(lambda request: httpx.Response(200, content=b"<html>"), monkeypatch)
+    with pytest.raises(AIProviderError):
+        asyncio.run(provider.complete(MESSAGES))
@@ -0,0 +1,148 @@
+"""
+utils.archive round trip: messages moved to chat_messages_archive still come
+back from GET /chat/history, in order, on the same pages and with the same ETag.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+import models
+from auth_context import auth_cache
+from auth_utils import create_access_token
+from database import SessionLocal
+from routers import chat
+from utils import archive
+
+app = FastAPI()
+app.include_router(chat.router)
+
+MESSAGES = 30
+KEEP = 10
+PAGE = 7
+
+
+@pytest.fixture(scope="module")
+def thread(migrated_db):
+    """(auth headers, conversation id, message ids) of a 30-message conversation."""
+    with SessionLocal() as db:
+        user = models.User(email="archive@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        conversation = models.Conversation(user_id=user.id, title="archive")
+        db.add(conversation)
+        db.flush()
+        messages = [
+            models.ChatMessage(
+                user_id=user.id,
+                conversation_id=conversation.id,
+                role="user" if n % 2 == 0 else "assistant",
+                content=f"message {n} नमस्ते " + "lorem ipsum " * n,
+            )
+            for n in range(MESSAGES)
+        ]
+        db.add_all(messages)
+        db.commit()
+        auth_cache.invalidate(user.id)
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+        return headers, conversation.id, [m.id for m in messages]
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def archive_rules(monkeypatch):
+    """Only the newest KEEP messages per user stay hot; small batches, no pauses."""
+    monkeypatch.setattr(archive, "CHAT_ARCHIVE_AFTER_DAYS", 0)
+    monkeypatch.setattr(archive, "CHAT_ARCHIVE_KEEP_NEWEST", KEEP)
+    monkeypatch.setattr(archive, "CHAT_ARCHIVE_BATCH_SIZE", 4)
+    monkeypatch.setattr(archive, "CHAT_ARCHIVE_BATCH_PAUSE", 0)
+
+
+def scroll_back(client, headers, conversation_id: int) -> list:
+    """Every page from the newest back, as (ETag, page body) pairs."""
+    pages, before_id = [], None
+    while True:
+        params = {"conversation_id": conversation_id, "limit": PAGE}
+        if before_id:
+            params["before_id"] = before_id
+        response = client.get("/chat/history", params=params, headers=headers)
+        assert response.status_code == 200
+        pages.append((response.headers["ETag"], response.json()))
+        before_id = response.json()["next_before_id"]
+        if before_id is None:
+            return pages
+
+
+def hot_and_archived(conversation_id: int):
+    with SessionLocal() as db:
+        return tuple(
+            db.scalar(select(func.count()).where(model.conversation_id == conversation_id))
+            for model in (models.ChatMessage, models.ChatMessageArchive)
+        )
+
+
+def test_archived_history_reads_the_same(client, thread, archive_rules):
+    headers, conversation_id, ids = thread
+    before = scroll_back(client, headers, conversation_id)
+
+    assert archive.archive_messages() >= MESSAGES - KEEP
+    assert hot_and_archived(conversation_id) == (KEEP, MESSAGES - KEEP)
+
+    after = scroll_back(client, headers, conversation_id)
+    assert after == before                      # same pages, same ETags
+    messages = [m for _, page in reversed(after) for m in page["messages"]]
+    assert [m["id"] for m in messages] == ids   # oldest -> newest, none lost
+    assert messages[0]["content"] == "message 0 नमस्ते "
+
+    # a client's cached pages are still valid
+    etag = before[0][0]
+    response = client.get(
+        "/chat/history", params={"conversation_id": conversation_id, "limit": PAGE},
+        headers={**headers, "If-None-Match": etag},
+    )
+    assert response.status_code == 304
+
+
+def test_catching_up_crosses_from_archive_to_hot(client, thread, archive_rules):
+    headers, conversation_id, ids = thread
+    archive.archive_messages()
+
+    since_id, seen = ids[2], []
+    while True:
+        page = client.get(
+            "/chat/history",
+            params={"conversation_id": conversation_id, "since_id": since_id, "limit": PAGE},
+            headers=headers,
+        ).json()
+        if not page["messages"]:
+            break
+        seen += [m["id"] for m in page["messages"]]
+        since_id = page["cursor"]
+    assert seen == ids[3:]
+
+
+def test_fully_archived_thread_keeps_its_etag(client, thread, archive_rules):
+    headers, conversation_id, ids = thread
+    before = scroll_back(client, headers, conversation_id)
+
+    with SessionLocal() as db:
+        archive._move_batch(db, ids)            # e.g. a thread untouched for CHAT_ARCHIVE_AFTER_DAYS
+    assert hot_and_archived(conversation_id) == (0, MESSAGES)
+    assert scroll_back(client, headers, conversation_id) == before
+
+    # a new message changes the ETag again
+    with SessionLocal() as db:
+        conversation = db.get(models.Conversation, conversation_id)
+        db.add(models.ChatMessage(
+            user_id=conversation.user_id, conversation_id=conversation_id,
+            role="user", content="back again",
+        ))
+        db.commit()
+    latest = scroll_back(client, headers, conversation_id)
+    assert latest[0][0] != before[0][0]
+    assert latest[0][1]["messages"][-1]["content"] == "back again"
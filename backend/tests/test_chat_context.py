@@ -0,0 +1,87 @@
+"""Rolling history summaries (utils.chat_context): a long backlog is folded completely, oldest first."""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+import models
+from database import AsyncSessionLocal, SessionLocal
+from utils import chat_context
+
+WORDS = "lorem ipsum dolor sit amet " * 4       # ~20 tokens per message
+
+
+class FakeRouter:
+    """Answers every summary request with the numbers (#i) of the messages it was given."""
+
+    def __init__(self):
+        self.providers = []
+        self.requests = []
+
+    async def complete(self, messages):
+        new = messages[-1]["content"].split("New messages:\n", 1)[1]
+        numbers = [int(line.split("#", 1)[1].split(" ", 1)[0]) for line in new.splitlines()]
+        self.requests.append(numbers)
+        return None, {"choices": [{"message": {"content": f"summary up to #{numbers[-1]}"}}]}
+
+
+@pytest.fixture
+def router(monkeypatch):
+    fake = FakeRouter()
+    monkeypatch.setattr(chat_context, "get_router", lambda: fake)
+    monkeypatch.setattr(chat_context, "context_budget", lambda: 300)
+    return fake
+
+
+@pytest.fixture
+def conversation(migrated_db):
+    """A conversation of 60 messages, far more than one budget."""
+    db = SessionLocal()
+    try:
+        user = models.User(email="summary@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        conv = models.Conversation(user_id=user.id, title="Long")
+        db.add(conv)
+        db.flush()
+        messages = [
+            models.ChatMessage(
+                user_id=user.id,
+                conversation_id=conv.id,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"#{i} {WORDS}",
+            )
+            for i in range(60)
+        ]
+        db.add_all(messages)
+        db.commit()
+        return conv.id, [m.id for m in messages]
+    finally:
+        db.close()
+
+
+async def stored_summary(conversation_id: int) -> models.ChatSummary:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(
+            select(models.ChatSummary).where(models.ChatSummary.conversation_id == conversation_id)
+        )
+
+
+def test_backlog_is_folded_oldest_first(router, conversation):
+    conversation_id, ids = conversation
+    asyncio.run(chat_context.summarize_history({"conversation_id": conversation_id}))
+
+    folded = [number for request in router.requests for number in request]
+    assert len(router.requests) > 1                 # more than one budget worth
+    assert folded == list(range(len(folded)))       # oldest first, none skipped
+    summary = asyncio.run(stored_summary(conversation_id))
+    assert summary.last_message_id == ids[len(folded) - 1]
+
+    # what is left is the recent window, kept verbatim
+    recent = sum(chat_context._message_tokens(f"#{i} {WORDS}") for i in range(len(folded), 60))
+    assert recent <= int(300 * chat_context.CONTEXT_RECENT_SHARE)
+
+    # caught up: another run has nothing to do
+    router.requests.clear()
+    asyncio.run(chat_context.summarize_history({"conversation_id": conversation_id}))
+    assert router.requests == []
@@ -0,0 +1,207 @@
+"""
+POST /chat/stream: the SSE events, and what is saved and charged when the
+stream completes, when every provider fails and when the client disconnects.
+"""
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+import models
+from auth_context import auth_cache
+from auth_utils import create_access_token
+from database import SessionLocal
+from routers import chat
+from utils.ai_client import AIProviderError
+from utils.quota import quota_store
+
+app = FastAPI()
+app.include_router(chat.router)
+
+USAGE = {"prompt_tokens": 7, "completion_tokens": 5, "total_tokens": 12}
+
+
+class ScriptedRouter:
+    """
+    Streams `script` like ProviderRouter.stream: text deltas, None when the
+    fallback takes over, an exception to raise. Sleeps `delay` before each.
+    """
+
+    def __init__(self, *script, delay: float = 0.0):
+        self.script = script
+        self.delay = delay
+
+    async def stream(self, messages, usage):
+        for item in self.script:
+            await asyncio.sleep(self.delay)
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        usage.update(USAGE)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    def use(*script, delay: float = 0.0):
+        monkeypatch.setattr(chat, "get_router", lambda: ScriptedRouter(*script, delay=delay))
+    return use
+
+
+@pytest.fixture
+def user(migrated_db, request):
+    """(user id, subscription id, auth headers) of a fresh subscriber."""
+    with SessionLocal() as db:
+        plan = models.Plan(name="Stream test", price=0, tokens_per_month=100_000)
+        user = models.User(email=f"stream-{request.node.name}@example.com", hashed_password="x")
+        db.add_all([plan, user])
+        db.flush()
+        sub = models.Subscription(
+            user_id=user.id, plan_id=plan.id, status="active",
+            start_date=datetime.utcnow(), used_tokens=0,
+        )
+        db.add(sub)
+        db.commit()
+        auth_cache.invalidate(user.id)
+        token = create_access_token({"sub": str(user.id)})
+        return user.id, sub.id, {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def parse_sse(text: str) -> list:
+    """[(event, data)], event None for plain `data:` messages."""
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = None, None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+def assistant_replies(user_id: int) -> list:
+    with SessionLocal() as db:
+        return db.scalars(
+            select(models.ChatMessage.content)
+            .where(models.ChatMessage.user_id == user_id, models.ChatMessage.role == "assistant")
+        ).all()
+
+
+def usage_logs(user_id: int) -> list:
+    with SessionLocal() as db:
+        return db.scalars(
+            select(models.UsageLog.tokens_used).where(models.UsageLog.user_id == user_id)
+        ).all()
+
+
+def quota(sub_id: int) -> tuple:
+    """(used, reserved) tokens in the quota store."""
+    entry = quota_store._quotas[sub_id]
+    return entry["used"], entry["reserved"]
+
+
+def test_completed_stream_is_saved_and_charged(client, user, provider):
+    user_id, sub_id, headers = user
+    provider("Hel", "lo", "!")
+
+    response = client.post("/chat/stream", json={"message": "hi"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    assert events[:3] == [(None, {"delta": "Hel"}), (None, {"delta": "lo"}), (None, {"delta": "!"})]
+    event, done = events[-1]
+    assert event == "done" and len(events) == 4
+    assert [m["content"] for m in done["messages"]] == ["hi", "Hello!"]
+    assert done["cursor"] == done["messages"][1]["id"]
+    assert done["usage"] == USAGE
+
+    assert assistant_replies(user_id) == ["Hello!"]
+    assert usage_logs(user_id) == [USAGE["total_tokens"]]
+    assert quota(sub_id) == (USAGE["total_tokens"], 0)
+
+
+def test_fallback_replaces_the_partial_reply(client, user, provider):
+    user_id, _, headers = user
+    provider("Hel", None, "Hi there")       # first provider broke after "Hel"
+
+    events = parse_sse(client.post("/chat/stream", json={"message": "hi"}, headers=headers).text)
+    assert [event for event, _ in events] == [None, "reset", None, "done"]
+    assert assistant_replies(user_id) == ["Hi there"]
+
+
+def test_provider_error_saves_and_charges_nothing(client, user, provider):
+    user_id, sub_id, headers = user
+    provider("partial ", "reply", AIProviderError("both providers down"))
+
+    events = parse_sse(client.post("/chat/stream", json={"message": "hi"}, headers=headers).text)
+    assert events[:2] == [(None, {"delta": "partial "}), (None, {"delta": "reply"})]
+    assert events[-1][0] == "error" and "done" not in [event for event, _ in events]
+
+    assert assistant_replies(user_id) == []
+    assert usage_logs(user_id) == []
+    assert quota(sub_id) == (0, 0)          # reservation released
+
+
+async def disconnect_after(headers: dict, body_chunks: int):
+    """Run POST /chat/stream over raw ASGI; the client goes away after `body_chunks` events."""
+    sent = 0
+    gone = asyncio.Event()
+    request = {"type": "http.request", "body": json.dumps({"message": "hi"}).encode()}
+
+    async def receive():
+        nonlocal request
+        if request is not None:
+            message, request = request, None
+            return message
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body" and message.get("body"):
+            sent += 1
+            if sent == body_chunks:
+                gone.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/chat/stream",
+        "raw_path": b"/chat/stream",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json")]
+        + [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    await app(scope, receive, send)
+    return sent
+
+
+def test_disconnect_saves_and_charges_what_was_streamed(user, provider):
+    user_id, sub_id, headers = user
+    provider("Hel", "lo", " world", "!", delay=0.05)
+
+    assert asyncio.run(disconnect_after(headers, body_chunks=2)) == 2
+
+    # the provider produced "Hello" (and bills it); its usage never came: estimated
+    assert assistant_replies(user_id) == ["Hello"]
+    (charged,) = usage_logs(user_id)
+    assert charged > 0
+    assert quota(sub_id) == (charged, 0)
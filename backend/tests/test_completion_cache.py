@@ -0,0 +1,202 @@
+"""
+utils.completion_cache: TTL expiry, LRU eviction by size, single-flight
+coalescing of identical requests, and cache hits charging no tokens in
+routers.chat.
+"""
+import asyncio
+import json
+
+import pytest
+
+from routers import chat
+from utils import completion_cache as cache_module
+from utils.ai_client import AIProviderError
+from utils.completion_cache import CACHED_USAGE, CompletionCache
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+USAGE = {"prompt_tokens": 7, "completion_tokens": 5, "total_tokens": 12}
+
+
+def completion(text: str) -> dict:
+    return {"choices": [{"message": {"role": "assistant", "content": text}}], "usage": USAGE}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = CompletionCache(enabled=True, ttl=10)
+    cache.put("k", completion("cached"))
+
+    clock.now += 9.9
+    assert cache.lookup("k") == completion("cached")
+    clock.now += 0.1
+    assert cache.lookup("k") is None
+    assert cache.total_bytes == 0
+    assert cache.hits == 1
+
+
+def test_least_recently_used_is_evicted_by_size():
+    value = completion("x" * 100)
+    size = len(json.dumps(value, separators=(",", ":")).encode())
+    cache = CompletionCache(enabled=True, max_bytes=2 * size)
+
+    cache.put("a", value)
+    cache.put("b", value)
+    assert cache.get("a") is not None      # a is now more recent than b
+    cache.put("c", value)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.total_bytes == 2 * size
+    assert cache.evictions == 1
+
+    cache.put("huge", completion("x" * 10 * size))    # bigger than the cache: not kept
+    assert cache.get("huge") is None
+    assert cache.get("a") is not None
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = CompletionCache(enabled=True)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return completion("shared")
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [value for value, _ in results] == [completion("shared")] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert (cache.misses, cache.coalesced, cache.hits) == (1, 4, 0)
+
+    assert asyncio.run(cache.get_or_fetch("k", fetch)) == (completion("shared"), True)
+    assert cache.hits == 1 and len(calls) == 1
+
+
+def test_failed_fetch_is_raised_to_every_waiter():
+    cache = CompletionCache(enabled=True)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise AIProviderError("upstream down")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(cache.get_or_fetch("k", fetch) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(r, AIProviderError) for r in results)
+    assert cache.get("k") is None and not cache._inflight   # nothing cached, next call retries
+
+
+def test_cancelled_leader_lets_a_waiter_fetch():
+    cache = CompletionCache(enabled=True)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return completion("second try")
+
+    async def scenario():
+        leader = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario()) == (completion("second try"), False)
+    assert len(calls) == 2
+
+
+@pytest.fixture
+def enabled_cache(monkeypatch):
+    cache = CompletionCache(enabled=True)
+    monkeypatch.setattr(chat, "completion_cache", cache)
+    monkeypatch.setattr(chat, "_cache_key", lambda messages: "k")
+    return cache
+
+
+def test_cache_hit_charges_nothing(enabled_cache, monkeypatch):
+    calls = []
+
+    async def complete(messages):
+        calls.append(1)
+        return completion("Hello!")
+
+    monkeypatch.setattr(chat, "_complete", complete)
+
+    assert asyncio.run(chat.call_ai_api(MESSAGES)) == ("Hello!", USAGE)
+    assert asyncio.run(chat.call_ai_api(MESSAGES)) == ("Hello!", CACHED_USAGE)
+    assert len(calls) == 1
+
+
+class StreamingRouter:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = 0
+
+    async def stream(self, messages, usage):
+        self.calls += 1
+        for chunk in ("Hel", "lo"):
+            await asyncio.sleep(0.02)
+            yield chunk
+        if self.fail:
+            raise AIProviderError("stream broke")
+        usage.update(USAGE)
+
+
+async def stream_reply():
+    usage = {}
+    deltas = [delta async for delta in chat.stream_ai_api(MESSAGES, usage)]
+    return "".join(deltas), usage
+
+
+def test_identical_streams_share_one_upstream_call(enabled_cache, monkeypatch):
+    router = StreamingRouter()
+    monkeypatch.setattr(chat, "get_router", lambda: router)
+
+    async def scenario():
+        return await asyncio.gather(*(stream_reply() for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    assert router.calls == 1
+    assert results == [("Hello", USAGE), ("Hello", CACHED_USAGE), ("Hello", CACHED_USAGE)]
+    assert asyncio.run(stream_reply()) == ("Hello", CACHED_USAGE)
+    assert enabled_cache.stats()["hits"] == 1
+    assert (enabled_cache.misses, enabled_cache.coalesced) == (1, 2)
+
+
+def test_failed_stream_fails_its_followers(enabled_cache, monkeypatch):
+    router = StreamingRouter(fail=True)
+    monkeypatch.setattr(chat, "get_router", lambda: router)
+
+    async def scenario():
+        return await asyncio.gather(*(stream_reply() for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert router.calls == 1
+    assert all(getattr(r, "status_code", None) == 500 for r in results)
+    assert enabled_cache.get("k") is None
@@ -0,0 +1,204 @@
+"""
+/conversations: keyset pages on (updated_at, id), other users' threads are
+404 everywhere, and each thread gets its own history and prompt context.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+import models
+from auth_context import auth_cache
+from auth_utils import create_access_token
+from database import SessionLocal
+from routers import chat, conversations
+
+app = FastAPI()
+app.include_router(conversations.router)
+app.include_router(chat.router)
+
+USAGE = {"prompt_tokens": 7, "completion_tokens": 5, "total_tokens": 12}
+SAME_SECOND = datetime(2026, 5, 1, 9, 30)
+
+
+def create_user(email: str) -> dict:
+    """Auth headers of a new user with an active subscription."""
+    with SessionLocal() as db:
+        plan = models.Plan(name=f"Plan of {email}", price=0, tokens_per_month=100_000)
+        user = models.User(email=email, hashed_password="x")
+        db.add_all([plan, user])
+        db.flush()
+        db.add(models.Subscription(
+            user_id=user.id, plan_id=plan.id, status="active",
+            start_date=datetime.utcnow(), used_tokens=0,
+        ))
+        db.commit()
+        auth_cache.invalidate(user.id)
+        return {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+
+
+@pytest.fixture(scope="module")
+def owner(migrated_db):
+    return create_user("threads-owner@example.com")
+
+
+@pytest.fixture(scope="module")
+def stranger(migrated_db):
+    return create_user("threads-stranger@example.com")
+
+
+@pytest.fixture
+def client(migrated_db):
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    """Prompts sent to the (fake) provider, one list of messages per call."""
+    sent = []
+
+    async def call_ai_api(messages):
+        sent.append(messages)
+        return f"reply {len(sent)}", dict(USAGE)
+
+    monkeypatch.setattr(chat, "call_ai_api", call_ai_api)
+    return sent
+
+
+def new_thread(client, headers, title: str) -> int:
+    response = client.post("/conversations", json={"title": title}, headers=headers)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def set_updated_at(conversation_ids, updated_at: datetime):
+    with SessionLocal() as db:
+        db.execute(
+            update(models.Conversation)
+            .where(models.Conversation.id.in_(conversation_ids))
+            .values(updated_at=updated_at)
+        )
+        db.commit()
+
+
+def all_pages(client, headers, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/conversations", params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        pages.append([c["id"] for c in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pages_are_keyset_on_updated_at_and_id(client):
+    headers = create_user("threads-pages@example.com")
+    ids = [new_thread(client, headers, f"thread {n}") for n in range(7)]
+    set_updated_at(ids[:4], SAME_SECOND)                        # a tie across page boundaries
+    set_updated_at(ids[4:], SAME_SECOND + timedelta(minutes=1))
+    expected = ids[4:][::-1] + ids[:4][::-1]                    # newest first, then id desc
+
+    for limit in (1, 2, 3, 7, 50):
+        pages = all_pages(client, headers, limit)
+        assert [c for page in pages for c in page] == expected, limit
+        assert all(len(page) <= limit for page in pages)
+
+
+def test_thread_activated_while_paging_is_not_repeated(client, prompts):
+    headers = create_user("threads-active@example.com")
+    ids = [new_thread(client, headers, f"thread {n}") for n in range(6)]
+    for n, conversation_id in enumerate(ids):
+        set_updated_at([conversation_id], SAME_SECOND + timedelta(minutes=n))
+
+    first = client.get("/conversations", params={"limit": 2}, headers=headers).json()
+    assert [c["id"] for c in first["items"]] == [ids[5], ids[4]]
+
+    # a message in the oldest thread moves it to the top; with an offset the
+    # next page would repeat ids[4]
+    assert client.post(
+        "/chat", json={"message": "hi", "conversation_id": ids[0]}, headers=headers
+    ).status_code == 200
+
+    rest = client.get(
+        "/conversations", params={"limit": 10, "cursor": first["next_cursor"]}, headers=headers
+    ).json()
+    assert [c["id"] for c in rest["items"]] == [ids[3], ids[2], ids[1]]
+    assert rest["next_cursor"] is None
+
+    top = client.get("/conversations", params={"limit": 1}, headers=headers).json()
+    assert top["items"][0]["id"] == ids[0]
+
+
+def test_invalid_cursor_is_400(client, owner):
+    response = client.get("/conversations", params={"cursor": "%%%"}, headers=owner)
+    assert response.status_code == 400
+
+
+def test_other_users_threads_are_404(client, owner, stranger, prompts):
+    private = new_thread(client, owner, "private")
+    client.post("/chat", json={"message": "secret", "conversation_id": private}, headers=owner)
+
+    listed = client.get("/conversations", params={"limit": 200}, headers=stranger).json()
+    assert private not in [c["id"] for c in listed["items"]]
+
+    url = f"/conversations/{private}"
+    assert client.patch(url, json={"title": "mine now"}, headers=stranger).status_code == 404
+    assert client.delete(url, headers=stranger).status_code == 404
+    assert client.get(
+        "/chat/history", params={"conversation_id": private}, headers=stranger
+    ).status_code == 404
+
+    sent = len(prompts)
+    response = client.post(
+        "/chat", json={"message": "let me in", "conversation_id": private}, headers=stranger
+    )
+    assert response.status_code == 404
+    assert len(prompts) == sent                  # no provider call
+
+    history = client.get("/chat/history", params={"conversation_id": private}, headers=owner).json()
+    assert [m["content"] for m in history["messages"]] == ["secret", "reply 1"]
+    listed = client.get("/conversations", params={"limit": 200}, headers=owner).json()
+    assert listed["items"][0]["title"] == "private"
+
+
+def test_each_thread_has_its_own_context(client, prompts):
+    headers = create_user("threads-context@example.com")
+    apples = new_thread(client, headers, "apples")
+    pears = new_thread(client, headers, "pears")
+
+    def say(message: str, conversation_id=None) -> dict:
+        response = client.post(
+            "/chat", json={"message": message, "conversation_id": conversation_id}, headers=headers
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    say("I like apples", apples)
+    say("I like pears", pears)
+    say("what do I like?", apples)
+
+    contents = [m["content"] for m in prompts[-1]]
+    assert "I like apples" in contents and "what do I like?" in contents
+    assert "I like pears" not in contents
+
+    # no conversation_id: the most recently active thread (now() has
+    # one-second resolution in SQLite, so make the order explicit)
+    set_updated_at([pears], SAME_SECOND)
+    assert say("and now?")["conversation_id"] == apples
+
+    def history(conversation_id: int) -> list:
+        page = client.get(
+            "/chat/history", params={"conversation_id": conversation_id}, headers=headers
+        ).json()
+        return [(m["role"], m["content"]) for m in page["messages"]]
+
+    assert [c for role, c in history(pears) if role == "user"] == ["I like pears"]
+    assert [c for role, c in history(apples) if role == "user"] == [
+        "I like apples", "what do I like?", "and now?",
+    ]
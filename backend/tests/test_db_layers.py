@@ -0,0 +1,105 @@
+"""
+Requests/sec of the same chat history read through the sync database layer
+(a `def` route on SessionLocal, run in the threadpool, as the routers were
+before AsyncSession) and the async one (an `async def` route on deps.get_db).
+SQLite only, so the numbers are for comparing the two layers, not for
+capacity planning; run with -s to see them.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from database import SessionLocal
+from deps import get_db
+
+CONCURRENCY = 8
+REQUESTS = 400
+PAGE = 50
+
+
+def history_query(conversation_id: int):
+    return (
+        select(models.ChatMessage.id, models.ChatMessage.role, models.ChatMessage.content)
+        .where(models.ChatMessage.conversation_id == conversation_id)
+        .order_by(models.ChatMessage.id.desc())
+        .limit(PAGE)
+    )
+
+
+def get_sync_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app = FastAPI()
+
+
+@app.get("/sync/history/{conversation_id}")
+def sync_history(conversation_id: int, db=Depends(get_sync_db)):
+    return [dict(row._mapping) for row in db.execute(history_query(conversation_id))]
+
+
+@app.get("/async/history/{conversation_id}")
+async def async_history(conversation_id: int, db: AsyncSession = Depends(get_db)):
+    return [dict(row._mapping) for row in await db.execute(history_query(conversation_id))]
+
+
+@pytest.fixture(scope="module")
+def conversation_id(migrated_db):
+    with SessionLocal() as db:
+        user = models.User(email="layers@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        conversation = models.Conversation(user_id=user.id, title="bench")
+        db.add(conversation)
+        db.flush()
+        db.add_all(
+            models.ChatMessage(
+                user_id=user.id,
+                conversation_id=conversation.id,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"message {i} " * 20,
+            )
+            for i in range(200)
+        )
+        db.commit()
+        return conversation.id
+
+
+def requests_per_second(client: TestClient, url: str) -> float:
+    def fetch(_):
+        response = client.get(url)
+        assert response.status_code == 200
+        return response
+
+    with ThreadPoolExecutor(CONCURRENCY) as executor:
+        list(executor.map(fetch, range(CONCURRENCY)))     # warm both pools
+        start = time.perf_counter()
+        list(executor.map(fetch, range(REQUESTS)))
+    return REQUESTS / (time.perf_counter() - start)
+
+
+def test_sync_and_async_layers_return_the_same_page(conversation_id):
+    with TestClient(app) as client:
+        sync_page = client.get(f"/sync/history/{conversation_id}").json()
+        async_page = client.get(f"/async/history/{conversation_id}").json()
+    assert len(sync_page) == PAGE
+    assert sync_page == async_page
+
+
+def test_requests_per_second(conversation_id):
+    with TestClient(app) as client:
+        sync_rate = requests_per_second(client, f"/sync/history/{conversation_id}")
+        async_rate = requests_per_second(client, f"/async/history/{conversation_id}")
+    print(f"\nchat history, sync layer: {sync_rate:.0f} req/s")
+    print(f"chat history, async layer: {async_rate:.0f} req/s")
+    assert sync_rate > 0 and async_rate > 0
@@ -0,0 +1,57 @@
+"""Connection pool setup of database.py and the idle pre-ping of utils.db_metrics."""
+import pytest
+from sqlalchemy import create_engine, text
+
+import database
+from database import POOL_CONFIG, _engine_options, async_engine, engine
+from utils.db_metrics import TimedPoolMixin, db_metrics, instrument
+
+
+@pytest.mark.parametrize("name, sync_engine", [("sync", engine), ("async", async_engine.sync_engine)])
+def test_pool_settings_on_both_engines(name, sync_engine):
+    pool = sync_engine.pool
+    assert isinstance(pool, TimedPoolMixin)
+    assert pool.size() == POOL_CONFIG["pool_size"]
+    assert pool._max_overflow == POOL_CONFIG["max_overflow"]
+    assert pool._timeout == POOL_CONFIG["pool_timeout"]
+    assert pool._recycle == POOL_CONFIG["pool_recycle"]
+    assert pool._pre_ping is (POOL_CONFIG["pre_ping"] not in ("idle", "never"))
+    assert db_metrics.engines[name].pool is pool
+
+
+def test_pre_ping_always(monkeypatch):
+    monkeypatch.setitem(POOL_CONFIG, "pre_ping", "always")
+    assert _engine_options(database.DATABASE_URL)["pool_pre_ping"] is True
+
+
+@pytest.fixture
+def idle_engine(migrated_db):
+    """An engine like database.engine whose idle ping runs on every checkout."""
+    test_engine = create_engine(migrated_db, **_engine_options(migrated_db))
+    instrument("test", test_engine, pre_ping="idle", ping_idle=0)
+    yield test_engine
+    db_metrics.engines.pop("test")
+    test_engine.dispose()
+
+
+def test_connection_dropped_while_idle_is_replaced(idle_engine):
+    with idle_engine.connect() as conn:
+        dropped = conn.connection.dbapi_connection
+    dropped.close()         # e.g. the server closed it while it sat in the pool
+    stale = db_metrics.stale_connections
+
+    with idle_engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert conn.connection.dbapi_connection is not dropped
+    assert db_metrics.stale_connections == stale + 1
+    assert idle_engine.pool.checkedin() == 1
+
+
+def test_live_idle_connection_is_kept(idle_engine):
+    with idle_engine.connect() as conn:
+        kept = conn.connection.dbapi_connection
+    pings = db_metrics.pings
+
+    with idle_engine.connect() as conn:
+        assert conn.connection.dbapi_connection is kept
+    assert db_metrics.pings == pings + 1
@@ -0,0 +1,24 @@
+"""`import main` stays within IMPORT_TIME_BUDGET (python manage.py import-time)."""
+import os
+
+import pytest
+
+import manage
+
+BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "1.0"))
+
+
+def test_import_main_within_budget():
+    total, top = manage.import_time("main")
+    slowest = ", ".join(f"{name} {seconds * 1000:.0f} ms" for seconds, name in top[:5])
+    assert total <= BUDGET, f"import main took {total:.3f}s (budget {BUDGET:.3f}s): {slowest}"
+
+
+def test_command_fails_over_budget(capsys):
+    assert manage.main(["import-time", "--budget", "0"]) == 1
+    assert "budget 0.000s" in capsys.readouterr().out
+
+
+def test_import_error_is_reported():
+    with pytest.raises(RuntimeError, match="No module named 'no_such_module'"):
+        manage.import_time("no_such_module")
@@ -0,0 +1,128 @@
+"""GET /payments/invoice/{id}: content-hash ETag and 304, Range requests, missing files."""
+import hashlib
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import models
+from auth_utils import create_access_token
+from database import SessionLocal
+from routers import payments
+from utils.invoice_storage import LocalInvoiceStorage
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 8 + b"\n%%EOF\n"
+
+app = FastAPI()
+app.include_router(payments.router)
+
+
+@pytest.fixture(scope="module")
+def owner(migrated_db):
+    with SessionLocal() as db:
+        plan = models.Plan(name="Invoice test", price=99, tokens_per_month=1000)
+        users = [
+            models.User(email="invoice-owner@example.com", hashed_password="x"),
+            models.User(email="invoice-other@example.com", hashed_password="x"),
+        ]
+        db.add_all([plan, *users])
+        db.commit()
+        return plan.id, users[0].id, users[1].id
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = LocalInvoiceStorage(str(tmp_path))
+    monkeypatch.setattr(payments, "invoice_storage", storage)
+    return storage
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def make_invoice(storage, owner, name: str, hashed: bool = True) -> int:
+    plan_id, user_id, _ = owner
+    storage.save(name, PDF)
+    with SessionLocal() as db:
+        payment = models.Payment(
+            user_id=user_id,
+            plan_id=plan_id,
+            gateway="stripe",
+            amount=99,
+            status="success",
+            invoice_filename=name,
+            invoice_sha256=hashlib.sha256(PDF).hexdigest() if hashed else None,
+        )
+        db.add(payment)
+        db.commit()
+        return payment.id
+
+
+def auth(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+def test_download_has_content_hash_etag(storage, owner, client):
+    payment_id = make_invoice(storage, owner, "invoice_etag.pdf")
+    response = client.get(f"/payments/invoice/{payment_id}", headers=auth(owner[1]))
+
+    assert response.status_code == 200
+    assert response.content == PDF
+    assert response.headers["ETag"] == f'"{hashlib.sha256(PDF).hexdigest()}"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+
+
+def test_matching_if_none_match_is_304(storage, owner, client):
+    payment_id = make_invoice(storage, owner, "invoice_304.pdf")
+    etag = f'"{hashlib.sha256(PDF).hexdigest()}"'
+    url = f"/payments/invoice/{payment_id}"
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = client.get(url, headers={**auth(owner[1]), "If-None-Match": if_none_match})
+        assert response.status_code == 304, if_none_match
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+    response = client.get(url, headers={**auth(owner[1]), "If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == PDF
+
+
+def test_range_request_is_partial_content(storage, owner, client):
+    payment_id = make_invoice(storage, owner, "invoice_range.pdf")
+    response = client.get(
+        f"/payments/invoice/{payment_id}", headers={**auth(owner[1]), "Range": "bytes=100-199"}
+    )
+
+    assert response.status_code == 206
+    assert response.content == PDF[100:200]
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(PDF)}"
+
+
+def test_invoice_hashed_on_first_download(storage, owner, client):
+    payment_id = make_invoice(storage, owner, "invoice_legacy.pdf", hashed=False)
+    response = client.get(f"/payments/invoice/{payment_id}", headers=auth(owner[1]))
+
+    assert response.status_code == 200
+    with SessionLocal() as db:
+        assert db.get(models.Payment, payment_id).invoice_sha256 == hashlib.sha256(PDF).hexdigest()
+
+
+def test_missing_file_is_404(storage, owner, client):
+    payment_id = make_invoice(storage, owner, "invoice_gone.pdf")
+    os.unlink(storage._path("invoice_gone.pdf"))     # e.g. lost with a node's local disk
+    response = client.get(f"/payments/invoice/{payment_id}", headers=auth(owner[1]))
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Invoice file missing"
+
+
+def test_other_users_invoice_is_404(storage, owner, client):
+    payment_id = make_invoice(storage, owner, "invoice_private.pdf")
+    response = client.get(f"/payments/invoice/{payment_id}", headers=auth(owner[2]))
+
+    assert response.status_code == 404
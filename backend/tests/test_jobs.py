@@ -0,0 +1,149 @@
+"""utils.jobs: retries with exponential backoff, dead jobs, and one claimer per job."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, update
+
+import models
+from database import SessionLocal
+from utils import jobs
+
+KIND = "test.job"
+
+
+@pytest.fixture(autouse=True)
+def queue(migrated_db, monkeypatch):
+    """An empty queue, a handler that fails while `failures` is non-zero, no jitter."""
+    with SessionLocal() as db:
+        db.execute(delete(models.Job))
+        db.commit()
+
+    state = {"failures": 0, "runs": []}
+
+    async def handler(payload):
+        state["runs"].append(payload)
+        if state["failures"]:
+            state["failures"] -= 1
+            raise RuntimeError("mail server down")
+
+    monkeypatch.setitem(jobs.HANDLERS, KIND, handler)
+    monkeypatch.setattr(jobs.random, "uniform", lambda low, high: 1.0)
+    monkeypatch.setattr(jobs, "JOB_BACKOFF_BASE", 10)
+    monkeypatch.setattr(jobs, "JOB_BACKOFF_MAX", 30)
+    return state
+
+
+def add_jobs(count: int = 1, max_attempts: int = 8) -> list:
+    with SessionLocal() as db:
+        added = [jobs.enqueue(db, KIND, {"n": n}, max_attempts=max_attempts) for n in range(count)]
+        db.commit()
+        return [job.id for job in added]
+
+
+def get_job(job_id: int) -> models.Job:
+    with SessionLocal() as db:
+        return db.get(models.Job, job_id)
+
+
+def make_due(job_id: int):
+    with SessionLocal() as db:
+        db.execute(update(models.Job).where(models.Job.id == job_id).values(run_at=datetime.utcnow()))
+        db.commit()
+
+
+def claim_and_run() -> int:
+    claimed = jobs.claim_jobs(10)
+    for job in claimed:
+        asyncio.run(jobs.run_job(job))
+    return len(claimed)
+
+
+def test_failed_job_is_retried_with_backoff(queue):
+    queue["failures"] = 3
+    (job_id,) = add_jobs()
+
+    delays = []
+    for attempt in (1, 2, 3):
+        before = datetime.utcnow()
+        assert claim_and_run() == 1
+        job = get_job(job_id)
+        assert (job.status, job.attempts, job.locked_by) == ("queued", attempt, None)
+        assert job.last_error == "RuntimeError: mail server down"
+        delays.append(round((job.run_at - before).total_seconds()))
+        assert claim_and_run() == 0         # not due yet
+        make_due(job_id)
+
+    assert delays == [10, 20, 30]           # doubles, capped at JOB_BACKOFF_MAX
+
+    assert claim_and_run() == 1
+    job = get_job(job_id)
+    assert (job.status, job.attempts, job.last_error) == ("done", 4, None)
+    assert len(queue["runs"]) == 4
+
+
+def test_job_is_dead_after_max_attempts(queue):
+    queue["failures"] = 10
+    (job_id,) = add_jobs(max_attempts=3)
+
+    for _ in range(3):
+        assert claim_and_run() == 1
+        make_due(job_id)
+
+    job = get_job(job_id)
+    assert (job.status, job.attempts) == ("dead", 3)
+    assert claim_and_run() == 0
+    assert len(queue["runs"]) == 3
+
+
+def test_unknown_kind_fails_like_any_error():
+    with SessionLocal() as db:
+        job = jobs.enqueue(db, "test.nobody", {}, max_attempts=1)
+        db.commit()
+        job_id = job.id
+
+    assert claim_and_run() == 1
+    job = get_job(job_id)
+    assert job.status == "dead"
+    assert "no handler" in job.last_error
+
+
+def test_concurrent_claimers_never_share_a_job():
+    job_ids = add_jobs(40)
+    claimers = 4
+    start = threading.Barrier(claimers)
+
+    def claim(_):
+        start.wait()
+        claimed = []
+        while batch := jobs.claim_jobs(3):
+            claimed += [job.id for job in batch]
+        return claimed
+
+    with ThreadPoolExecutor(claimers) as executor:
+        results = list(executor.map(claim, range(claimers)))
+
+    claimed = [job_id for result in results for job_id in result]
+    assert len(claimed) == len(set(claimed))
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_stale_running_job_is_requeued():
+    running, exhausted = add_jobs(2, max_attempts=1)
+    jobs.claim_jobs(10)
+    with SessionLocal() as db:
+        db.execute(
+            update(models.Job)
+            .where(models.Job.id == running)
+            .values(max_attempts=8)
+        )
+        db.execute(
+            update(models.Job).values(locked_at=datetime.utcnow() - timedelta(seconds=jobs.JOB_LOCK_TIMEOUT + 1))
+        )
+        db.commit()
+
+    assert jobs.requeue_stale_jobs() == 2
+    assert get_job(running).status == "queued"
+    assert (get_job(exhausted).status, get_job(exhausted).last_error) == ("dead", "worker lock timed out")
@@ -0,0 +1,183 @@
+"""
+SMTPPool (utils.mailer) against a local aiosmtpd server, plus its
+throughput against a new connection per message (the mailer before the
+pool). Run with -s to see the numbers.
+"""
+import asyncio
+import socket
+import time
+
+import aiosmtplib
+import pytest
+from aiosmtpd.controller import Controller
+
+from utils import mailer
+from utils.mailer import SMTPPool, build_message
+
+
+class Inbox:
+    """aiosmtpd handler: keeps the delivered envelopes, refuses reject@ recipients."""
+
+    def __init__(self):
+        self.envelopes = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("reject@"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        self.sessions.add(id(session))
+        return "250 Message accepted"
+
+
+class SMTPServer:
+    def __init__(self, port: int):
+        self.port = port
+        self.inbox = Inbox()
+        self.controller = self._start()
+
+    def _start(self) -> Controller:
+        controller = Controller(self.inbox, hostname="127.0.0.1", port=self.port)
+        controller.start()
+        return controller
+
+    def restart(self):
+        """Drop every client connection, then accept new ones again."""
+        self.controller.stop()
+        self.controller = self._start()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    port = free_port()
+    monkeypatch.setattr(mailer, "MAIL_SERVER", "127.0.0.1")
+    monkeypatch.setattr(mailer, "MAIL_PORT", port)
+    monkeypatch.setattr(mailer, "MAIL_STARTTLS", False)
+    monkeypatch.setattr(mailer, "MAIL_SSL_TLS", False)
+    monkeypatch.setattr(mailer, "MAIL_USERNAME", None)
+    monkeypatch.setattr(mailer, "MAIL_FROM", "billing@example.com")
+
+    server = SMTPServer(port)
+    yield server
+    server.controller.stop()
+
+
+def messages(*recipients):
+    return [build_message(to, "Invoice", "Thanks!") for to in recipients]
+
+
+def test_connection_is_reused(smtp_server):
+    pool = SMTPPool(size=1)
+
+    async def scenario():
+        for message in messages(*(f"user{i}@example.com" for i in range(5))):
+            await pool.send(message)
+        await pool.close()
+
+    asyncio.run(scenario())
+    assert len(smtp_server.inbox.envelopes) == 5
+    assert pool.connects == 1
+    assert len(smtp_server.inbox.sessions) == 1
+
+
+def test_batch_uses_at_most_size_connections(smtp_server):
+    pool = SMTPPool(size=3)
+
+    async def scenario():
+        errors = await pool.send_many(messages(*(f"user{i}@example.com" for i in range(12))))
+        await pool.close()
+        return errors
+
+    assert asyncio.run(scenario()) == [None] * 12
+    assert len(smtp_server.inbox.envelopes) == 12
+    assert pool.connects <= 3
+
+
+def test_recycled_after_max_messages(smtp_server):
+    pool = SMTPPool(size=1, max_messages=2)
+
+    async def scenario():
+        for message in messages(*(f"user{i}@example.com" for i in range(5))):
+            await pool.send(message)
+        await pool.close()
+
+    asyncio.run(scenario())
+    assert len(smtp_server.inbox.envelopes) == 5
+    assert pool.connects == 3      # 2 + 2 + 1 messages
+
+
+def test_broken_connection_is_replaced(smtp_server):
+    pool = SMTPPool(size=1)
+
+    async def scenario():
+        await pool.send(messages("first@example.com")[0])
+        # the server goes away and comes back: the idle connection is dead
+        smtp_server.restart()
+        await pool.send(messages("second@example.com")[0])
+        await pool.close()
+
+    asyncio.run(scenario())
+    assert [e.rcpt_tos for e in smtp_server.inbox.envelopes] == [
+        ["first@example.com"], ["second@example.com"]
+    ]
+    assert pool.connects == 2
+
+
+def test_rejected_message_drops_the_connection(smtp_server):
+    pool = SMTPPool(size=1)
+
+    async def scenario():
+        errors = await pool.send_many(messages("reject@example.com"))
+        await pool.send(messages("next@example.com")[0])
+        await pool.close()
+        return errors
+
+    errors = asyncio.run(scenario())
+    assert errors[0] is not None
+    assert [e.rcpt_tos for e in smtp_server.inbox.envelopes] == [["next@example.com"]]
+    assert pool.connects == 2       # not reused after the failed transaction
+
+
+def test_pooled_vs_per_message_throughput(smtp_server):
+    count, size = 200, 3
+    pool = SMTPPool(size=size)
+
+    async def per_message(batch):
+        slots = asyncio.Semaphore(size)
+
+        async def send(message):
+            async with slots:
+                await aiosmtplib.send(message, hostname="127.0.0.1", port=smtp_server.port)
+
+        await asyncio.gather(*(send(message) for message in batch))
+
+    async def pooled(batch):
+        assert await pool.send_many(batch) == [None] * len(batch)
+
+    async def rate(label: str, send_batch) -> float:
+        batch = messages(*(f"{label}{i}@example.com" for i in range(count)))
+        start = time.perf_counter()
+        await send_batch(batch)
+        rate = count / (time.perf_counter() - start)
+        print(f"\n{label}: {rate:.0f} msg/s ({size} at a time)")
+        return rate
+
+    async def scenario():
+        rates = [await rate("per-message", per_message), await rate("pooled", pooled)]
+        await pool.close()
+        return rates
+
+    rates = asyncio.run(scenario())
+    assert len(smtp_server.inbox.envelopes) == 2 * count
+    assert pool.connects <= size
+    assert all(rate > 0 for rate in rates)
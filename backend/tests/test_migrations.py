@@ -0,0 +1,58 @@
+"""Data migrations, run step by step on a database of their own (like `alembic upgrade <rev>`)."""
+import os
+import sqlite3
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEEDED = [
+    ("Free Tier", "Features: Limited response speed\nTokens/Month: 50 requests", 50),
+    ("Pro Monthly", "Features: Fast responses\nTokens/Month: 1000 requests", 1000),
+    ("Pro Plus", "Features: Priority support\nTokens/Month: 3000 requests", 3000),
+]
+
+
+def migrate(path: str, revision: str, command: str = "upgrade"):
+    code = (
+        "from alembic import command; from alembic.config import Config; import database; "
+        "config = Config('alembic.ini'); config.attributes['configure_logger'] = False; "
+        f"command.{command}(config, {revision!r})"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{path}"},
+        check=True,
+        capture_output=True,
+    )
+
+
+def plans(path: str) -> dict:
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT name, description, tokens_per_month FROM plans").fetchall()
+    return {name: (description, tokens) for name, description, tokens in rows}
+
+
+def test_0003_moves_seeded_plans_to_tokens(tmp_path):
+    path = str(tmp_path / "migrate.db")
+    migrate(path, "0002")
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO plans (name, description, price, tokens_per_month) VALUES (?, ?, 0, ?)",
+            SEEDED + [("Custom", "Tokens/Month: 20 requests", 20)],
+        )
+        # edited by an admin: left alone
+        conn.execute("UPDATE plans SET description = 'Our best plan' WHERE name = 'Pro Plus'")
+
+    migrate(path, "0003")
+    assert plans(path) == {
+        "Free Tier": ("Features: Limited response speed\nTokens/Month: 50K tokens", 50_000),
+        "Pro Monthly": ("Features: Fast responses\nTokens/Month: 1M tokens", 1_000_000),
+        "Pro Plus": ("Our best plan", 3_000_000),
+        "Custom": ("Tokens/Month: 20 requests", 20),
+    }
+
+    migrate(path, "0002", command="downgrade")
+    assert plans(path)["Free Tier"] == (SEEDED[0][1], 50)
+    assert plans(path)["Pro Plus"] == ("Our best plan", 3000)
@@ -0,0 +1,119 @@
+"""
+Password hashing in the bcrypt process pool (auth_utils.password_pool):
+rehash on login when BCRYPT_ROUNDS changed, and login/register throughput
+through the pool against bcrypt in the threadpool (the handlers before the
+pool). Run with -s and BCRYPT_ROUNDS=12 for realistic numbers.
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+from sqlalchemy import select
+
+import auth_utils
+import models
+import schemas
+from database import AsyncSessionLocal
+from routers.auth import login, register
+
+CONCURRENCY = 16
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pool(migrated_db):
+    yield auth_utils.password_pool
+    auth_utils.password_pool.shutdown()
+
+
+def rounds(hashed: str) -> int:
+    return int(hashed.split("$")[2])
+
+
+async def stored_hash(email: str) -> str:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(models.User.hashed_password).where(models.User.email == email))
+
+
+def test_login_rehashes_after_rounds_change():
+    old_rounds = auth_utils.BCRYPT_ROUNDS + 1
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=old_rounds).hash("s3cret-pass")
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            db.add(models.User(email="rehash@example.com", hashed_password=old_hash))
+            await db.commit()
+        credentials = schemas.UserLogin(email="rehash@example.com", password="s3cret-pass")
+
+        async with AsyncSessionLocal() as db:
+            assert (await login(credentials, db))["access_token"]
+        new_hash = await stored_hash("rehash@example.com")
+        assert rounds(new_hash) == auth_utils.BCRYPT_ROUNDS
+        assert auth_utils.verify_password("s3cret-pass", new_hash)
+
+        # up to date now: the next login leaves it alone
+        async with AsyncSessionLocal() as db:
+            await login(credentials, db)
+        assert await stored_hash("rehash@example.com") == new_hash
+
+    asyncio.run(scenario())
+
+
+def test_pool_fails_fast_when_full():
+    busy = auth_utils.PasswordHasherPool(max_workers=1, max_queue=1)
+
+    async def scenario():
+        calls = [busy.run(time.sleep, 0.2) for _ in range(3)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        busy.shutdown()
+    assert sum(isinstance(r, auth_utils.PasswordPoolBusy) for r in results) == 1
+
+
+async def throughput(label: str, fn, *args) -> float:
+    """CONCURRENCY calls of fn at once; returns calls per second."""
+    start = time.perf_counter()
+    await asyncio.gather(*(fn(*args) for _ in range(CONCURRENCY)))
+    rate = CONCURRENCY / (time.perf_counter() - start)
+    print(f"\n{label}: {rate:.1f}/s (BCRYPT_ROUNDS={auth_utils.BCRYPT_ROUNDS})")
+    return rate
+
+
+def test_login_register_throughput():
+    hashed = auth_utils.get_password_hash("s3cret-pass")
+
+    async def scenario():
+        await auth_utils.verify_password_async("warm", hashed)     # start the workers
+        rates = [
+            await throughput("login, threadpool", run_in_threadpool,
+                             auth_utils.verify_and_update_password, "s3cret-pass", hashed),
+            await throughput("login, process pool", auth_utils.verify_password_async,
+                             "s3cret-pass", hashed),
+            await throughput("register hash, threadpool", run_in_threadpool,
+                             auth_utils.get_password_hash, "s3cret-pass"),
+            await throughput("register hash, process pool", auth_utils.get_password_hash_async,
+                             "s3cret-pass"),
+        ]
+
+        # end to end through the register and login handlers
+        start = time.perf_counter()
+        for i in range(CONCURRENCY):
+            user_in = schemas.UserCreate(email=f"bench{i}@example.com", password="s3cret-pass")
+            async with AsyncSessionLocal() as db:
+                await register(user_in, db)
+
+        async def sign_in(i: int):
+            async with AsyncSessionLocal() as db:
+                return await login(schemas.UserLogin(email=f"bench{i}@example.com", password="s3cret-pass"), db)
+
+        tokens = await asyncio.gather(*(sign_in(i) for i in range(CONCURRENCY)))
+        print(f"register + login handlers: {2 * CONCURRENCY / (time.perf_counter() - start):.1f}/s")
+        return rates, tokens
+
+    rates, tokens = asyncio.run(scenario())
+    assert all(rate > 0 for rate in rates)
+    assert all(token["access_token"] for token in tokens)
@@ -0,0 +1,124 @@
+"""
+GET /plans from utils.plan_catalog: an admin plan edit bumps the DB version,
+so the ETag changes and a client's stale If-None-Match gets the new body.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import models
+from auth_utils import create_access_token
+from database import SessionLocal
+from routers import admin_plans, plans
+from utils import plan_catalog as catalog_module
+from utils.plan_catalog import CATALOG, PlanCatalog
+
+app = FastAPI()
+app.include_router(plans.router)
+app.include_router(admin_plans.router)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(catalog_module.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    """A cold catalog for this worker (the routers' module global)."""
+    catalog = PlanCatalog(check_interval=5)
+    monkeypatch.setattr(plans, "plan_catalog", catalog)
+    monkeypatch.setattr(admin_plans, "plan_catalog", catalog)
+    return catalog
+
+
+@pytest.fixture(scope="module")
+def plan_and_admin(migrated_db):
+    with SessionLocal() as db:
+        plan = models.Plan(name="Catalog test", price=1, tokens_per_month=1000)
+        admin = models.User(email="catalog-admin@example.com", hashed_password="x", role="admin")
+        db.add_all([plan, admin])
+        db.commit()
+        token = create_access_token({"sub": str(admin.id)})
+        return plan.id, {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def db_version() -> int:
+    with SessionLocal() as db:
+        return (
+            db.query(models.CacheVersion.version)
+            .filter(models.CacheVersion.name == CATALOG)
+            .scalar()
+        ) or 1
+
+
+def edit_plan(client, plan_and_admin, **changes):
+    plan_id, headers = plan_and_admin
+    response = client.put(f"/admin/plans/{plan_id}", json=changes, headers=headers)
+    assert response.status_code == 200
+
+
+def catalog_plan(response) -> dict:
+    return next(plan for plan in response.json() if plan["name"] == "Catalog test")
+
+
+def test_admin_edit_changes_the_etag(client, catalog, clock, plan_and_admin):
+    first = client.get("/plans")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert client.get("/plans", headers={"If-None-Match": etag}).status_code == 304
+
+    version = db_version()
+    edit_plan(client, plan_and_admin, price=2)
+    assert db_version() == version + 1
+
+    # the same worker re-checks at once, no waiting for check_interval
+    response = client.get("/plans", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert catalog_plan(response)["price"] == 2
+    assert client.get(
+        "/plans", headers={"If-None-Match": response.headers["ETag"]}
+    ).status_code == 304
+
+
+def test_other_workers_reload_within_the_check_interval(client, catalog, clock, plan_and_admin):
+    other_worker = PlanCatalog(check_interval=5)
+    old_etag, _ = other_worker.get()
+
+    edit_plan(client, plan_and_admin, description="edited")
+    new_etag, _ = catalog.get()
+    assert new_etag != old_etag
+
+    clock.now += 4.9
+    assert other_worker.get()[0] == old_etag    # still within check_interval
+    clock.now += 0.1
+    assert other_worker.get() == catalog.get()
+
+
+def test_toggle_removes_the_plan_from_the_catalog(client, catalog, clock, plan_and_admin):
+    plan_id, headers = plan_and_admin
+    etag = client.get("/plans").headers["ETag"]
+
+    assert client.patch(f"/admin/plans/{plan_id}/toggle", headers=headers).json()["is_active"] is False
+    response = client.get("/plans", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert all(plan["name"] != "Catalog test" for plan in response.json())
+
+    client.patch(f"/admin/plans/{plan_id}/toggle", headers=headers)
@@ -0,0 +1,177 @@
+"""Fallback chain of utils.provider_router: deadlines, idle timeout, hedging and circuit breakers."""
+import asyncio
+import time
+
+import pytest
+
+from utils.ai_client import AIProviderError
+from utils.provider_router import CircuitBreaker, ProviderRouter
+
+
+class FakeProvider:
+    """Streams `chunks`, sleeping `delays[i]` seconds before chunk i."""
+
+    def __init__(self, name: str, chunks=("Hello", " world"), delays=(0.0, 0.0)):
+        self.name = name
+        self.model = name
+        self.enabled = True
+        self.temperature = 0.7
+        self.chunks = chunks
+        self.delays = delays
+        self.calls = 0
+        self.cancelled = False
+
+    async def complete(self, messages):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delays[0])
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {"choices": [{"message": {"content": "".join(self.chunks)}}]}
+
+    async def stream(self, messages, usage=None):
+        self.calls += 1
+        for chunk, delay in zip(self.chunks, self.delays):
+            await asyncio.sleep(delay)
+            yield chunk
+
+
+class FailingProvider(FakeProvider):
+    async def complete(self, messages):
+        self.calls += 1
+        raise AIProviderError(f"{self.name} is down")
+
+
+def make_router(*providers, deadline=0.2, idle_timeout=0.2) -> ProviderRouter:
+    router = ProviderRouter(list(providers))
+    router.deadline = deadline
+    router.idle_timeout = idle_timeout
+    return router
+
+
+async def collect(router: ProviderRouter):
+    return [delta async for delta in router.stream([{"role": "user", "content": "hi"}])]
+
+
+def test_deadline_spent_skips_the_rest_of_the_chain():
+    stalled = FakeProvider("primary", delays=(1.0, 0.0))
+    fallback = FakeProvider("fallback")
+    router = make_router(stalled, fallback)
+
+    with pytest.raises(AIProviderError):
+        asyncio.run(collect(router))
+    assert len(router.breakers["primary"].calls) == 1       # it was slow: counts
+    assert fallback.calls == 0
+    assert len(router.breakers["fallback"].calls) == 0      # never called: doesn't
+
+
+def test_deadline_only_bounds_the_first_token():
+    # 0.5 s in total, but never more than 0.1 s between chunks
+    steady = FakeProvider("primary", chunks=tuple("abcde"), delays=(0.1,) * 5)
+    router = make_router(steady, FakeProvider("fallback"), deadline=0.3, idle_timeout=0.3)
+
+    assert asyncio.run(collect(router)) == list("abcde")
+    ok, _ = router.breakers["primary"].calls[-1]
+    assert ok
+
+
+def test_idle_stream_falls_back():
+    stuck = FakeProvider("primary", chunks=("Hel", "lo"), delays=(0.0, 1.0))
+    router = make_router(stuck, FakeProvider("fallback"), idle_timeout=0.1)
+
+    assert asyncio.run(collect(router)) == ["Hel", None, "Hello", " world"]
+    ok, _ = router.breakers["primary"].calls[-1]
+    assert not ok
+
+
+def test_probe_slots_taken_only_when_called():
+    primary, fallback = FakeProvider("primary"), FakeProvider("fallback")
+    router = make_router(primary, fallback)
+    for breaker in router.breakers.values():
+        breaker.opened_at = time.monotonic() - breaker.cooldown      # half-open
+
+    provider, _ = asyncio.run(router.complete([{"role": "user", "content": "hi"}]))
+    assert provider is primary
+    assert router.breakers["primary"].state == "closed"
+    # the fallback's probe is still free for the next request
+    assert router.breakers["fallback"].probe_started is None
+    assert router.breakers["fallback"].allow()
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_hedge_wins_and_the_slow_call_is_cancelled():
+    slow = FakeProvider("primary", delays=(1.0,))
+    fast = FakeProvider("fallback", delays=(0.01,))
+    router = make_router(slow, fast, deadline=2.0)
+    router.hedge, router.hedge_delay = True, 0.05
+
+    started = time.monotonic()
+    provider, _ = asyncio.run(router.complete(MESSAGES))
+
+    assert provider is fast
+    assert time.monotonic() - started < 0.5
+    assert slow.calls == 1 and slow.cancelled
+    # the loser didn't fail, it was cut short: not held against it
+    assert len(router.breakers["primary"].calls) == 0
+    ok, _ = router.breakers["fallback"].calls[-1]
+    assert ok
+
+
+def test_no_hedge_when_the_first_answer_is_quick():
+    primary, fallback = FakeProvider("primary", delays=(0.01,)), FakeProvider("fallback")
+    router = make_router(primary, fallback)
+    router.hedge, router.hedge_delay = True, 0.2
+
+    provider, _ = asyncio.run(router.complete(MESSAGES))
+    assert provider is primary
+    assert fallback.calls == 0
+
+
+def test_breaker_opens_at_the_error_rate():
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, cooldown=60)
+    for ok in (False, True, False):
+        breaker.record(ok, 0.1)
+    assert breaker.state == "closed"        # under min_calls, however bad
+
+    breaker.record(True, 0.1)               # 2 of 4 failed: 50%
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_stays_closed_under_the_error_rate():
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5)
+    for ok in (False, True, True, True, False, True, True):
+        breaker.record(ok, 0.1)
+    assert breaker.state == "closed"
+
+
+def test_breaker_opens_on_slow_calls_and_a_good_probe_closes_it():
+    breaker = CircuitBreaker(window=10, min_calls=2, slow_call=1.0, slow_rate=0.5, cooldown=60)
+    breaker.record(True, 1.5)
+    breaker.record(True, 2.0)
+    assert breaker.state == "open"
+
+    breaker.opened_at -= 60                 # cooldown over
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()              # one probe at a time
+    breaker.record(True, 0.1)
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_skips_the_provider():
+    primary, fallback = FailingProvider("primary"), FakeProvider("fallback")
+    router = make_router(primary, fallback)
+    router.breakers["primary"] = CircuitBreaker(window=10, min_calls=3, error_rate=0.5)
+
+    for _ in range(3):
+        provider, _ = asyncio.run(router.complete(MESSAGES))
+        assert provider is fallback
+    assert router.breakers["primary"].state == "open"
+
+    asyncio.run(router.complete(MESSAGES))
+    assert primary.calls == 3               # no longer called while open
+    assert fallback.calls == 4
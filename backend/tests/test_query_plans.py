@@ -0,0 +1,104 @@
+"""The hot queries are answered through their indexes, not a table scan (SQLite query plans)."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import and_, func, or_, select, text
+
+import models
+from auth_context import _context_query
+from database import engine
+
+
+def query_plan(statement) -> str:
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+def assert_uses_index(statement, index: str, table: str):
+    plan = query_plan(statement)
+    assert f"USING INDEX {index}" in plan or f"USING COVERING INDEX {index}" in plan, plan
+    assert f"SCAN {table}\n" not in plan + "\n", plan
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _schema(migrated_db):
+    pass
+
+
+def test_chat_history_page():
+    statement = (
+        select(models.ChatMessage)
+        .where(models.ChatMessage.conversation_id == 1, models.ChatMessage.id < 500)
+        .order_by(models.ChatMessage.id.desc())
+        .limit(50)
+    )
+    assert_uses_index(statement, "ix_chat_messages_conversation_id", "chat_messages")
+    assert "TEMP B-TREE" not in query_plan(statement)     # no sort step
+
+
+def test_chat_history_etag():
+    statement = select(func.min(models.ChatMessage.id), func.max(models.ChatMessage.id)).where(
+        models.ChatMessage.conversation_id == 1
+    )
+    assert_uses_index(statement, "ix_chat_messages_conversation_id", "chat_messages")
+
+
+def test_user_messages():
+    statement = (
+        select(models.ChatMessage.id)
+        .where(models.ChatMessage.user_id == 1)
+        .order_by(models.ChatMessage.id.desc())
+        .limit(20)
+    )
+    assert_uses_index(statement, "ix_chat_messages_user_id_id", "chat_messages")
+
+
+def test_auth_context_subscription():
+    assert_uses_index(_context_query(1), "ix_subscriptions_user_status_start", "subscriptions")
+
+
+def test_usage_per_user():
+    statement = select(func.sum(models.UsageLog.tokens_used)).where(models.UsageLog.user_id == 1)
+    assert_uses_index(statement, "ix_usage_logs_user_tokens", "usage_logs")
+
+
+def test_usage_per_subscription():
+    statement = select(func.sum(models.UsageLog.tokens_used)).where(
+        models.UsageLog.subscription_id == 1
+    )
+    assert_uses_index(statement, "ix_usage_logs_subscription_tokens", "usage_logs")
+
+
+def test_payments_newest_first():
+    statement = select(models.Payment).order_by(models.Payment.created_at.desc()).limit(50)
+    assert_uses_index(statement, "ix_payments_created_at", "payments")
+
+
+def test_due_subscription_expiries():
+    statement = (
+        select(models.Subscription.id)
+        .where(models.Subscription.status == "active", models.Subscription.end_date <= datetime(2030, 1, 1))
+        .order_by(models.Subscription.end_date)
+        .limit(500)
+    )
+    assert_uses_index(statement, "ix_subscriptions_status_end_date", "subscriptions")
+
+
+def test_conversations_page():
+    updated_at = models.Conversation.updated_at
+    statement = (
+        select(models.Conversation)
+        .where(
+            models.Conversation.user_id == 1,
+            or_(
+                updated_at < datetime(2030, 1, 1),
+                and_(updated_at == datetime(2030, 1, 1), models.Conversation.id < 500),
+            ),
+        )
+        .order_by(updated_at.desc(), models.Conversation.id.desc())
+        .limit(51)
+    )
+    assert_uses_index(statement, "ix_conversations_user_updated", "conversations")
+    assert "TEMP B-TREE" not in query_plan(statement)     # no sort step
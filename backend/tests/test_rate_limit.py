@@ -0,0 +1,133 @@
+"""RateLimitMiddleware (utils.rate_limit): burst, refill, per-plan limits and the 429."""
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import models
+from auth_context import auth_cache
+from auth_utils import create_access_token
+from database import SessionLocal
+from utils import rate_limit
+from utils.rate_limit import NO_PLAN_LIMITS, RateLimitMiddleware
+
+inner = FastAPI()
+
+
+@inner.post("/chat")
+async def chat():
+    return {"ok": True}
+
+
+@inner.get("/chat/history")
+async def history():
+    return {"ok": True}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "true")
+    with TestClient(RateLimitMiddleware(inner, paths=("/chat",))) as client:
+        yield client
+
+
+def create_user(email: str, per_minute=None, burst=None) -> int:
+    """A user, on a plan with the given limits (no subscription if None)."""
+    with SessionLocal() as db:
+        user = models.User(email=email, hashed_password="x")
+        db.add(user)
+        db.flush()
+        if per_minute is not None:
+            plan = models.Plan(
+                name=f"{per_minute}/min", price=0, tokens_per_month=1000,
+                requests_per_minute=per_minute, burst=burst,
+            )
+            db.add(plan)
+            db.flush()
+            db.add(models.Subscription(
+                user_id=user.id, plan_id=plan.id, status="active",
+                start_date=datetime.utcnow(), used_tokens=0,
+            ))
+        db.commit()
+        auth_cache.invalidate(user.id)
+        return user.id
+
+
+@pytest.fixture(scope="module")
+def users(migrated_db):
+    return {
+        "slow": create_user("limit-slow@example.com", per_minute=6, burst=2),
+        "fast": create_user("limit-fast@example.com", per_minute=120, burst=5),
+        "no_plan": create_user("limit-none@example.com"),
+    }
+
+
+def auth(sub) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(sub)})}"}
+
+
+def statuses(client, headers, count: int, path="/chat"):
+    return [client.post(path, headers=headers).status_code for _ in range(count)]
+
+
+def test_burst_then_429_with_retry_after(client, users, clock):
+    headers = auth(users["slow"])
+    assert statuses(client, headers, 2) == [200, 200]
+
+    response = client.post("/chat", headers=headers)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"      # 6/min: a token every 10 s
+    assert response.json()["detail"]
+
+
+def test_bucket_refills_at_the_plan_rate(client, users, clock):
+    headers = auth(users["fast"])
+    assert statuses(client, headers, 6) == [200] * 5 + [429]
+
+    clock.now += 0.5            # 120/min: one token per 0.5 s
+    assert statuses(client, headers, 2) == [200, 429]
+
+    clock.now += 60             # never more than the burst
+    assert statuses(client, headers, 6) == [200] * 5 + [429]
+
+
+def test_limits_come_from_each_users_plan(client, users, clock):
+    assert statuses(client, auth(users["slow"]), 3) == [200, 200, 429]
+    assert statuses(client, auth(users["fast"]), 6) == [200] * 5 + [429]
+
+    _, no_plan_burst = NO_PLAN_LIMITS
+    assert statuses(client, auth(users["no_plan"]), no_plan_burst + 1) == [200] * no_plan_burst + [429]
+
+
+def test_only_post_under_the_paths_is_limited(client, users, clock):
+    headers = auth(users["slow"])
+    assert statuses(client, headers, 3) == [200, 200, 429]
+    assert [client.get("/chat/history", headers=headers).status_code for _ in range(5)] == [200] * 5
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"Authorization": "Basic abc"},
+    {"Authorization": "Bearer not-a-jwt"},
+    auth("not-a-number"),
+])
+def test_anonymous_requests_pass_through(client, headers, clock):
+    # the endpoint's own auth answers these (401); the limiter must not fail
+    assert statuses(client, headers, 10) == [200] * 10
+    assert len(client.app.buckets) == 0
@@ -0,0 +1,95 @@
+"""Usage rollup (utils.rollups): usage_daily matches usage_logs, however often it runs."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+
+import models
+from database import SessionLocal
+from utils import rollups
+
+
+@pytest.fixture(scope="module")
+def user_id(migrated_db):
+    with SessionLocal() as db:
+        user = models.User(email="rollup@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        return user.id
+
+
+def log_usage(user_id: int, *tokens: int, days_ago: int = 0):
+    with SessionLocal() as db:
+        db.add_all(
+            models.UsageLog(
+                user_id=user_id,
+                tokens_used=t,
+                prompt_tokens=t - 1,
+                completion_tokens=1,
+                created_at=datetime.utcnow() - timedelta(days=days_ago),
+            )
+            for t in tokens
+        )
+        db.commit()
+
+
+def totals():
+    """(usage_daily totals, usage_logs totals): tokens, prompt, completion, requests."""
+    with SessionLocal() as db:
+        daily = db.query(
+            func.coalesce(func.sum(models.UsageDaily.tokens), 0),
+            func.coalesce(func.sum(models.UsageDaily.prompt_tokens), 0),
+            func.coalesce(func.sum(models.UsageDaily.completion_tokens), 0),
+            func.coalesce(func.sum(models.UsageDaily.requests), 0),
+        ).one()
+        logs = db.query(
+            func.coalesce(func.sum(models.UsageLog.tokens_used), 0),
+            func.coalesce(func.sum(models.UsageLog.prompt_tokens), 0),
+            func.coalesce(func.sum(models.UsageLog.completion_tokens), 0),
+            func.count(models.UsageLog.id),
+        ).one()
+        return tuple(daily), tuple(logs)
+
+
+def settle(monkeypatch):
+    """Ids recorded by the previous run count as committed right away."""
+    monkeypatch.setattr(rollups, "ROLLUP_SETTLE", timedelta(0))
+
+
+def test_new_ids_wait_for_the_settle_time(user_id):
+    rollups.rollup_usage()
+    log_usage(user_id, 10, 20)
+    rollups.rollup_usage()      # records the new max id
+    assert rollups.rollup_usage() == 0      # seen just now: not folded yet
+
+
+def test_rollup_is_idempotent(user_id, monkeypatch):
+    settle(monkeypatch)
+    log_usage(user_id, 10, 20, 30)
+    log_usage(user_id, 5, days_ago=1)
+    rollups.rollup_usage()
+    rollups.rollup_usage()
+
+    daily, logs = totals()
+    assert daily == logs
+
+    for _ in range(3):
+        assert rollups.rollup_usage() == 0
+    assert totals() == (daily, logs)
+
+
+def test_horizon_survives_a_restart(user_id, monkeypatch):
+    settle(monkeypatch)
+    rollups.rollup_usage()
+    rollups.rollup_usage()
+    log_usage(user_id, 7)
+    rollups.rollup_usage()
+
+    # the high-water marks are in rollup_state, not in this process
+    with SessionLocal() as db:
+        state = db.get(models.RollupState, rollups.USAGE_ROLLUP)
+        assert state.seen_max_id == db.query(func.max(models.UsageLog.id)).scalar()
+
+    assert rollups.rollup_usage() == 1      # e.g. another worker, or after a restart
+    daily, logs = totals()
+    assert daily == logs
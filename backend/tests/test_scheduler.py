@@ -0,0 +1,98 @@
+"""Subscription schedule: token resets survive a restart, expiry mid-turn is harmless."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import models
+from database import SessionLocal
+from utils import scheduler
+from auth_context import auth_cache
+from utils.quota import LocalQuotaStore, quota_store, reconcile_quotas
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _schema(migrated_db):
+    pass
+
+
+def create_subscription(email: str, tokens_reset_at: datetime, end_date=None) -> int:
+    db = SessionLocal()
+    try:
+        user = models.User(email=email, hashed_password="x")
+        plan = models.Plan(name="Test", price=0, tokens_per_month=1000)
+        db.add_all([user, plan])
+        db.flush()
+        sub = models.Subscription(
+            user_id=user.id,
+            plan_id=plan.id,
+            start_date=tokens_reset_at - timedelta(days=60),
+            end_date=end_date,
+            used_tokens=0,
+            tokens_reset_at=tokens_reset_at,
+        )
+        db.add(sub)
+        db.flush()
+        # usage from the period that is about to end
+        db.add(models.UsageLog(
+            user_id=user.id,
+            subscription_id=sub.id,
+            tokens_used=700,
+            created_at=tokens_reset_at - timedelta(days=1),
+        ))
+        db.commit()
+        return sub.id
+    finally:
+        db.close()
+
+
+def used_tokens(sub_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.get(models.Subscription, sub_id).used_tokens
+    finally:
+        db.close()
+
+
+def test_reconcile_keeps_monthly_reset():
+    sub_id = create_subscription("reset@example.com", datetime.utcnow() - timedelta(minutes=1))
+    reconcile_quotas()
+    assert used_tokens(sub_id) == 700     # current period: rebuilt from the usage log
+
+    assert scheduler.run_schedule()["reset"] >= 1
+    assert used_tokens(sub_id) == 0
+
+    # a restart must not bring back last period's usage
+    reconcile_quotas()
+    assert used_tokens(sub_id) == 0
+
+
+def test_reset_reaches_the_caches_of_this_process():
+    # The documented deployment with the in-process quota store: the
+    # scheduler runs in the API process, so it resets the very counters and
+    # auth contexts the chat path reads.
+    sub_id = create_subscription("in-process@example.com", datetime.utcnow() - timedelta(minutes=1))
+    db = SessionLocal()
+    try:
+        user_id = db.get(models.Subscription, sub_id).user_id
+    finally:
+        db.close()
+    quota_store.ensure(sub_id, used=1000, limit=1000)
+    assert not quota_store.reserve(sub_id, 1)       # used up
+    assert auth_cache.load(user_id) is not None
+
+    assert scheduler.run_schedule()["reset"] >= 1
+    assert auth_cache.get(user_id) is None          # reloaded on the next request
+    assert quota_store.reserve(sub_id, 500)
+    quota_store.release(sub_id, 500)
+
+
+def test_expire_mid_turn():
+    store = LocalQuotaStore()
+    store.ensure(1, used=0, limit=100)
+    assert store.reserve(1, 40)
+
+    store.forget([1])       # the scheduler expired the subscription
+    store.settle(1, reserved=40, actual=35)
+    store.release(1, 40)
+    assert not store.reserve(1, 10)
+    assert store.drain() == {}
@@ -0,0 +1,157 @@
+"""
+Group commit of chat turns (utils.write_buffer): commits per turn and turn
+latency against one commit per turn, plus the failure paths. Run with -s
+to see the numbers.
+"""
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import event, func, select
+
+import models
+from database import AsyncSessionLocal, SessionLocal, async_engine
+from routers import chat
+from utils import write_buffer as write_buffer_module
+from utils.quota import LocalQuotaStore
+from utils.write_buffer import WriteBuffer
+
+TURNS = 40
+USAGE = {"total_tokens": 30, "prompt_tokens": 20, "completion_tokens": 10}
+
+
+@pytest.fixture(scope="module")
+def conversation(migrated_db):
+    db = SessionLocal()
+    try:
+        user = models.User(email="buffer@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        conv = models.Conversation(user_id=user.id, title="Buffer")
+        db.add(conv)
+        db.commit()
+        return user.id, conv.id
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def quota(monkeypatch):
+    store = LocalQuotaStore()
+    store.ensure(1, used=0, limit=10_000)
+    monkeypatch.setattr(chat, "quota_store", store)
+    return store
+
+
+async def run_turns(buffer: WriteBuffer, user_id: int, conversation_id: int, quota):
+    """TURNS concurrent save_assistant_reply calls; returns (commits, latencies)."""
+    commits = []
+    listener = lambda conn: commits.append(1)
+    event.listen(async_engine.sync_engine, "commit", listener)
+    flusher = asyncio.create_task(buffer.run())
+    await asyncio.sleep(0)
+
+    async def turn(i: int) -> float:
+        assert quota.reserve(1, 50)
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            ai_msg = await chat.save_assistant_reply(
+                db, user_id, conversation_id, 1, f"reply {i}", USAGE, reserved=50
+            )
+        assert ai_msg.id and ai_msg.created_at
+        return time.perf_counter() - start
+
+    try:
+        latencies = await asyncio.gather(*(turn(i) for i in range(TURNS)))
+    finally:
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+        event.remove(async_engine.sync_engine, "commit", listener)
+    return len(commits), sorted(latencies)
+
+
+async def count_usage_logs() -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(models.UsageLog))
+
+
+@pytest.mark.parametrize("mode, chat_messages", [("off", True), ("group", True), ("group", False)])
+def test_commits_per_turn(mode, chat_messages, conversation, quota, monkeypatch):
+    buffer = WriteBuffer(mode=mode, interval=0.02, chat_messages=chat_messages)
+    monkeypatch.setattr(chat, "write_buffer", buffer)
+
+    before = asyncio.run(count_usage_logs())
+    commits, latencies = asyncio.run(run_turns(buffer, *conversation, quota))
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+    label = mode if chat_messages else f"{mode}, replies unbuffered"
+    print(f"\n{label}: {commits / TURNS:.2f} commits/turn, p99 {p99 * 1000:.1f} ms")
+
+    assert asyncio.run(count_usage_logs()) - before == TURNS
+    assert quota.used(1) == TURNS * USAGE["total_tokens"]
+    if mode == "group" and chat_messages:
+        assert commits < TURNS / 2     # concurrent turns share commits
+    else:
+        assert commits == TURNS        # reply and usage log in one commit per turn
+
+
+class HangingSession:
+    """AsyncSessionLocal stand-in whose commit never finishes."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, *args):
+        pass
+
+    def add_all(self, objects):
+        pass
+
+    async def commit(self):
+        await asyncio.Event().wait()
+
+
+def test_flush_cancelled(monkeypatch):
+    monkeypatch.setattr(write_buffer_module, "AsyncSessionLocal", HangingSession)
+    buffer = WriteBuffer(mode="async")
+
+    async def scenario():
+        message = models.ChatMessage(user_id=1, conversation_id=1, role="assistant", content="hi")
+        waiting = asyncio.create_task(buffer.write([{"user_id": 1}], [message]))
+        await buffer.write([{"user_id": 1}])        # async mode: nobody waits
+        await asyncio.sleep(0)
+
+        flushing = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0.01)
+        flushing.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flushing
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(scenario())
+    # the unwaited usage log is kept for the next flush
+    assert buffer.stats()["queued_rows"] == 1
+    assert buffer.stats()["failures"] == 1
+
+
+def test_failed_write_releases_reservation(conversation, quota, monkeypatch):
+    class FailingBuffer:
+        enabled = True
+        chat_messages = True
+
+        async def write(self, usage_logs, messages=()):
+            raise RuntimeError("database is down")
+
+    monkeypatch.setattr(chat, "write_buffer", FailingBuffer())
+    assert quota.reserve(1, 10_000)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await chat.save_assistant_reply(db, *conversation, 1, "reply", USAGE, reserved=10_000)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+    assert quota.reserve(1, 10_000)     # the reservation was given back
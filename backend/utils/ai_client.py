@@ -0,0 +1,163 @@
+import json
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class AIProviderError(Exception):
+    """Provider returned an error or an unreadable response."""
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+class AIProvider:
+    """
+    OpenAI-compatible chat completion provider.
+
+    One long-lived `httpx.AsyncClient` per provider keeps TLS connections
+    alive between requests. Pool size / timeout come from the environment,
+    e.g. OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE, OPENAI_TIMEOUT.
+    Transport errors and timeouts are raised as AIProviderError.
+    """
+
+    def __init__(self, name: str, env_prefix: str, default_url: str, model: str,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.name = name
+        self.url = os.getenv(f"{env_prefix}_API_URL", default_url)
+        self.api_key = os.getenv(f"{env_prefix}_API_KEY")
+        self.model = model
+        self.temperature = 0.7
+        # prompt token budget of the chat context (utils.chat_context)
+        self.context_tokens = _env_int(
+            f"{env_prefix}_CONTEXT_TOKENS", _env_int("CONTEXT_TOKEN_BUDGET", 3000)
+        )
+        self.limits = httpx.Limits(
+            max_connections=_env_int(f"{env_prefix}_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int(f"{env_prefix}_MAX_KEEPALIVE", 20),
+            keepalive_expiry=_env_float(f"{env_prefix}_KEEPALIVE_EXPIRY", 30.0),
+        )
+        self.timeout = httpx.Timeout(
+            _env_float(f"{env_prefix}_TIMEOUT", 60.0),
+            connect=_env_float(f"{env_prefix}_CONNECT_TIMEOUT", 5.0),
+        )
+        self.transport = transport      # e.g. httpx.MockTransport in tests
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=HTTP2_AVAILABLE,
+                transport=self.transport,
+            )
+        return self._client
+
+    def _payload(self, messages: List[dict], stream: bool = False) -> dict:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+        }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    async def complete(self, messages: List[dict]) -> dict:
+        """Return the raw JSON body of a (non-streaming) completion."""
+        try:
+            response = await self.client.post(self.url, json=self._payload(messages))
+        except httpx.HTTPError as e:
+            raise AIProviderError(f"{self.name} Error: {e!r}") from e
+        if response.status_code != 200:
+            raise AIProviderError(f"{self.name} Error: {response.text}")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise AIProviderError(f"{self.name} Error: unreadable response") from e
+
+    async def stream(self, messages: List[dict], usage: Optional[dict] = None) -> AsyncIterator[str]:
+        """
+        Yield content deltas of a `stream: true` completion. If `usage` is
+        given it is filled with the token usage sent in the last chunk.
+        """
+        try:
+            async with self.client.stream(
+                "POST", self.url, json=self._payload(messages, stream=True)
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise AIProviderError(f"{self.name} Error: {response.text}")
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    chunk = json.loads(data)
+                    chunk_usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+                    if chunk_usage and usage is not None:
+                        usage.update(chunk_usage)
+                    choices = chunk.get("choices") or [{}]
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+        except httpx.HTTPError as e:
+            raise AIProviderError(f"{self.name} Error: {e!r}") from e
+        except ValueError as e:
+            raise AIProviderError(f"{self.name} Error: unreadable stream chunk") from e
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_providers: Dict[str, AIProvider] = {}
+
+
+def get_providers() -> List[AIProvider]:
+    """Providers in fallback order: OpenAI first, then Groq."""
+    if not _providers:
+        _providers["openai"] = AIProvider(
+            "OpenAI", "OPENAI", "https://api.openai.com/v1/chat/completions", "gpt-4o-mini"
+        )
+        _providers["groq"] = AIProvider(
+            "Groq", "GROQ", "https://api.groq.com/openai/v1/chat/completions", "llama-3.3-70b-versatile"
+        )
+    return list(_providers.values())
+
+
+async def close_clients():
+    """Close pooled connections (called on app shutdown)."""
+    for provider in _providers.values():
+        await provider.aclose()
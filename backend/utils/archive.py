@@ -0,0 +1,250 @@
+import asyncio
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+load_dotenv()
+
+# Messages older than this many days move to the archive (0 = no age rule)
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "180"))
+# Keep at most this many newest messages per user hot (0 = no limit)
+CHAT_ARCHIVE_KEEP_NEWEST = int(os.getenv("CHAT_ARCHIVE_KEEP_NEWEST", "0"))
+CHAT_ARCHIVE_BATCH_SIZE = int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", "500"))
+# Pause between batches, so the hot table never sees a long run of writes
+CHAT_ARCHIVE_BATCH_PAUSE = float(os.getenv("CHAT_ARCHIVE_BATCH_PAUSE", "0.05"))
+CHAT_ARCHIVE_INTERVAL = float(os.getenv("CHAT_ARCHIVE_INTERVAL", "3600"))
+
+
+class ArchiveMetrics:
+    """Counters of the archive runs in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+        self.rows_moved = 0
+        self.bytes_moved = 0        # uncompressed content removed from chat_messages
+        self.bytes_stored = 0       # compressed content written to the archive
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_rows = 0
+        self.last_run_seconds = 0.0
+
+    def record_batch(self, rows: int, bytes_moved: int, bytes_stored: int):
+        with self._lock:
+            self.rows_moved += rows
+            self.bytes_moved += bytes_moved
+            self.bytes_stored += bytes_stored
+
+    def record_run(self, rows: int, seconds: float, failed: bool = False):
+        with self._lock:
+            self.runs += 1
+            self.failures += failed
+            self.last_run_at = datetime.utcnow()
+            self.last_run_rows = rows
+            self.last_run_seconds = round(seconds, 3)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "failures": self.failures,
+                "rows_moved": self.rows_moved,
+                "bytes_moved": self.bytes_moved,
+                "bytes_stored": self.bytes_stored,
+                "bytes_reclaimed": self.bytes_moved - self.bytes_stored,
+                "last_run_at": self.last_run_at,
+                "last_run_rows": self.last_run_rows,
+                "last_run_seconds": self.last_run_seconds,
+            }
+
+
+archive_metrics = ArchiveMetrics()
+
+
+def _move_batch(db: Session, ids: List[int]) -> int:
+    """
+    Copy the given messages to the archive and delete them from chat_messages,
+    in one short transaction. Rows another archiver holds are skipped.
+    """
+    rows = db.execute(
+        select(
+            models.ChatMessage.id,
+            models.ChatMessage.user_id,
+            models.ChatMessage.conversation_id,
+            models.ChatMessage.role,
+            models.ChatMessage.content,
+            models.ChatMessage.created_at,
+        )
+        .where(models.ChatMessage.id.in_(ids))
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        db.rollback()
+        return 0
+
+    archived, bytes_moved, bytes_stored = [], 0, 0
+    for row in rows:
+        raw = row.content.encode("utf-8")
+        packed = zlib.compress(raw, 6)
+        bytes_moved += len(raw)
+        bytes_stored += len(packed)
+        archived.append({
+            "id": row.id,
+            "user_id": row.user_id,
+            "conversation_id": row.conversation_id,
+            "role": row.role,
+            "content_z": packed,
+            "content_bytes": len(raw),
+            "created_at": row.created_at,
+        })
+
+    db.execute(insert(models.ChatMessageArchive), archived)
+    db.execute(
+        delete(models.ChatMessage)
+        .where(models.ChatMessage.id.in_([row.id for row in rows]))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    archive_metrics.record_batch(len(rows), bytes_moved, bytes_stored)
+    return len(rows)
+
+
+def _aged_batches(db: Session, cutoff: datetime) -> Iterator[List[int]]:
+    """
+    Ids of messages created before `cutoff`, oldest first, in batches.
+    Walks the primary key from the start and stops at the first newer
+    message (ids grow with created_at), so no created_at index is needed.
+    """
+    after_id = 0
+    while True:
+        rows = db.execute(
+            select(models.ChatMessage.id, models.ChatMessage.created_at)
+            .where(models.ChatMessage.id > after_id)
+            .order_by(models.ChatMessage.id.asc())
+            .limit(CHAT_ARCHIVE_BATCH_SIZE)
+        ).all()
+        db.rollback()
+        ids = []
+        for row in rows:
+            if row.created_at >= cutoff:
+                break
+            ids.append(row.id)
+        if ids:
+            yield ids
+        if len(ids) < CHAT_ARCHIVE_BATCH_SIZE:
+            return
+        after_id = ids[-1]
+
+
+def _overflow_batches(db: Session, keep: int) -> Iterator[List[int]]:
+    """Ids of the messages past each user's newest `keep`, oldest first, in batches."""
+    user_ids = db.scalars(
+        select(models.ChatMessage.user_id)
+        .group_by(models.ChatMessage.user_id)
+        .having(func.count() > keep)
+    ).all()
+    db.rollback()
+
+    for user_id in user_ids:
+        # newest message that no longer fits; it and everything before it go
+        boundary = db.scalar(
+            select(models.ChatMessage.id)
+            .where(models.ChatMessage.user_id == user_id)
+            .order_by(models.ChatMessage.id.desc())
+            .offset(keep)
+            .limit(1)
+        )
+        db.rollback()
+        after_id = 0
+        while boundary is not None:
+            ids = db.scalars(
+                select(models.ChatMessage.id)
+                .where(
+                    models.ChatMessage.user_id == user_id,
+                    models.ChatMessage.id > after_id,
+                    models.ChatMessage.id <= boundary,
+                )
+                .order_by(models.ChatMessage.id.asc())
+                .limit(CHAT_ARCHIVE_BATCH_SIZE)
+            ).all()
+            db.rollback()
+            if ids:
+                yield ids
+            if len(ids) < CHAT_ARCHIVE_BATCH_SIZE:
+                break
+            after_id = ids[-1]
+
+
+def archive_messages() -> int:
+    """
+    Move cold chat messages to chat_messages_archive: older than
+    CHAT_ARCHIVE_AFTER_DAYS, or past the CHAT_ARCHIVE_KEEP_NEWEST newest of
+    their user. Returns the number of rows moved.
+
+    Both rules take a conversation's oldest messages first, so the archive
+    is always the older part of a thread and history reads can fall back
+    to it by id. Each batch is its own transaction that only locks the
+    (cold) rows it moves.
+    """
+    start = time.perf_counter()
+    moved = 0
+    db = SessionLocal()
+    try:
+        sources = []
+        if CHAT_ARCHIVE_AFTER_DAYS > 0:
+            cutoff = datetime.utcnow() - timedelta(days=CHAT_ARCHIVE_AFTER_DAYS)
+            sources.append(_aged_batches(db, cutoff))
+        if CHAT_ARCHIVE_KEEP_NEWEST > 0:
+            sources.append(_overflow_batches(db, CHAT_ARCHIVE_KEEP_NEWEST))
+
+        for batches in sources:
+            for ids in batches:
+                moved += _move_batch(db, ids)
+                time.sleep(CHAT_ARCHIVE_BATCH_PAUSE)
+    except Exception:
+        db.rollback()
+        archive_metrics.record_run(moved, time.perf_counter() - start, failed=True)
+        raise
+    finally:
+        db.close()
+
+    archive_metrics.record_run(moved, time.perf_counter() - start)
+    return moved
+
+
+async def archive_totals(db: AsyncSession) -> dict:
+    """Size of the archive table: rows, original and compressed content bytes."""
+    row = (
+        await db.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(models.ChatMessageArchive.content_bytes), 0),
+                func.coalesce(func.sum(func.length(models.ChatMessageArchive.content_z)), 0),
+            )
+        )
+    ).one()
+    return {"rows": row[0], "content_bytes": int(row[1]), "stored_bytes": int(row[2])}
+
+
+async def run_archive_worker():
+    """Background task: archive cold chat messages every CHAT_ARCHIVE_INTERVAL seconds."""
+    if CHAT_ARCHIVE_AFTER_DAYS <= 0 and CHAT_ARCHIVE_KEEP_NEWEST <= 0:
+        return
+    while True:
+        try:
+            await run_in_threadpool(archive_messages)
+        except Exception as e:
+            print("Chat archive failed:", e)
+        await asyncio.sleep(CHAT_ARCHIVE_INTERVAL)
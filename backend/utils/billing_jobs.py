@@ -0,0 +1,69 @@
+from typing import Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import joinedload
+
+import models
+from database import SessionLocal
+from utils.invoice import generate_invoice
+from utils.invoice_storage import invoice_storage, store_invoice
+from utils.jobs import enqueue, job_handler
+from utils.mailer import send_invoice_email
+
+# Jobs queued after a successful payment (see utils.jobs)
+
+
+def _get_payment(db, payment_id: int) -> Optional[models.Payment]:
+    return db.get(
+        models.Payment,
+        payment_id,
+        options=[joinedload(models.Payment.user), joinedload(models.Payment.plan)],
+    )
+
+
+def _render_invoice(payment_id: int):
+    db = SessionLocal()
+    try:
+        payment = _get_payment(db, payment_id)
+        if payment is None:
+            return
+        # Already rendered by an earlier run of this job: the email job was
+        # queued in the same commit, don't queue it twice.
+        if payment.invoice_filename and invoice_storage.exists(payment.invoice_filename):
+            return
+
+        invoice_name, pdf = generate_invoice(payment, payment.user, payment.plan)
+        payment.invoice_sha256 = store_invoice(invoice_name, pdf)
+        payment.invoice_filename = invoice_name
+        enqueue(db, "invoice.email", {"payment_id": payment_id})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _invoice_for(payment_id: int) -> Optional[Tuple[str, str, bytes]]:
+    db = SessionLocal()
+    try:
+        payment = _get_payment(db, payment_id)
+        if payment is None or not payment.invoice_filename:
+            return None
+        name = payment.invoice_filename
+        return payment.user.email, name, invoice_storage.read(name)
+    finally:
+        db.close()
+
+
+@job_handler("invoice.render")
+async def render_invoice(payload: dict):
+    """Render the PDF invoice of a payment, then queue its email."""
+    await run_in_threadpool(_render_invoice, payload["payment_id"])
+
+
+@job_handler("invoice.email")
+async def email_invoice(payload: dict):
+    """Email the rendered invoice to the user."""
+    invoice = await run_in_threadpool(_invoice_for, payload["payment_id"])
+    if invoice is None:
+        raise LookupError(f"invoice of payment {payload['payment_id']} is not rendered")
+    email, name, pdf = invoice
+    await send_invoice_email(email, name, pdf)
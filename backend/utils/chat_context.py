@@ -0,0 +1,246 @@
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from database import AsyncSessionLocal
+from utils.jobs import job_handler
+from utils.provider_router import get_router
+from utils.tokens import TOKENS_PER_MESSAGE, count_message_tokens, count_tokens
+
+load_dotenv()
+
+SYSTEM_PROMPT = "You are a helpful AI assistant."
+
+# Share of the token budget kept as verbatim recent turns when summarizing;
+# the rest of the budget is left for the summary and the new message.
+CONTEXT_RECENT_SHARE = float(os.getenv("CONTEXT_RECENT_SHARE", "0.5"))
+CONTEXT_SUMMARY_WORDS = int(os.getenv("CONTEXT_SUMMARY_WORDS", "200"))
+# Don't queue another summary for the same conversation within this many seconds
+SUMMARY_REQUEST_INTERVAL = float(os.getenv("SUMMARY_REQUEST_INTERVAL", "60"))
+
+HISTORY_PAGE_SIZE = 20
+
+SUMMARIZE_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI "
+    "assistant. Update the summary with the new messages. Keep facts, names, "
+    "decisions, open questions and the user's preferences; drop small talk. "
+    f"Answer with the summary only, at most {CONTEXT_SUMMARY_WORDS} words."
+)
+
+# conversation id -> time.monotonic() of the last summary request (per process)
+_summary_requested: Dict[int, float] = {}
+
+
+def context_budget() -> int:
+    """Prompt token budget: the smallest of the providers the prompt may go to."""
+    budgets = [p.context_tokens for p in get_router().providers if p.enabled]
+    return min(budgets) if budgets else int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+
+def _message_tokens(content: str) -> int:
+    return TOKENS_PER_MESSAGE + count_tokens(content)
+
+
+def _summary_message(summary: models.ChatSummary) -> dict:
+    return {
+        "role": "system",
+        "content": f"Summary of the earlier conversation:\n{summary.content}",
+    }
+
+
+async def build_context(
+    db: AsyncSession, conversation_id: int, current: models.ChatMessage
+) -> Tuple[List[dict], bool]:
+    """
+    Prompt for the reply to `current` (already flushed): system prompt, the
+    rolling summary if any, then as many turns as fit in the token budget,
+    newest first. `current` is always included, once.
+
+    Returns (messages, needs_summary): needs_summary is True when turns
+    newer than the summary had to be left out, i.e. the summary is behind.
+    """
+    budget = context_budget()
+    head = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+    summary = await db.get(models.ChatSummary, conversation_id)
+    after_id = 0
+    if summary is not None:
+        head.append(_summary_message(summary))
+        after_id = summary.last_message_id
+
+    used = count_message_tokens(head) + _message_tokens(current.content)
+    turns: List[dict] = []
+    needs_summary = False
+
+    before_id = current.id
+    while not needs_summary:
+        rows = (
+            await db.execute(
+                select(models.ChatMessage.id, models.ChatMessage.role, models.ChatMessage.content)
+                .where(
+                    models.ChatMessage.conversation_id == conversation_id,
+                    models.ChatMessage.id > after_id,
+                    models.ChatMessage.id < before_id,
+                )
+                .order_by(models.ChatMessage.id.desc())
+                .limit(HISTORY_PAGE_SIZE)
+            )
+        ).all()
+
+        for row in rows:
+            tokens = _message_tokens(row.content)
+            if used + tokens > budget:
+                needs_summary = True
+                break
+            used += tokens
+            turns.append({"role": row.role, "content": row.content})
+
+        if len(rows) < HISTORY_PAGE_SIZE:
+            break
+        before_id = rows[-1].id
+
+    turns.reverse()
+    return head + turns + [{"role": current.role, "content": current.content}], needs_summary
+
+
+def should_request_summary(conversation_id: int) -> bool:
+    """Debounce: one summary job per conversation per SUMMARY_REQUEST_INTERVAL in this process."""
+    now = time.monotonic()
+    last = _summary_requested.get(conversation_id)
+    if last is not None and now - last < SUMMARY_REQUEST_INTERVAL:
+        return False
+    _summary_requested[conversation_id] = now
+    if len(_summary_requested) > 10_000:
+        for key, requested in list(_summary_requested.items()):
+            if now - requested >= SUMMARY_REQUEST_INTERVAL:
+                del _summary_requested[key]
+    return True
+
+
+async def _fold(previous: str, rows) -> str:
+    transcript = "\n".join(f"{row.role}: {row.content}" for row in rows)
+    prompt = f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"
+    _, data = await get_router().complete([
+        {"role": "system", "content": SUMMARIZE_PROMPT},
+        {"role": "user", "content": prompt},
+    ])
+    return data["choices"][0]["message"]["content"].strip()
+
+
+async def _fold_until(db: AsyncSession, conversation_id: int, after_id: int) -> Optional[int]:
+    """
+    Id of the newest turn past the recent window (the newest
+    CONTEXT_RECENT_SHARE of the budget), None if every turn newer than
+    `after_id` still fits in it.
+    """
+    keep = int(context_budget() * CONTEXT_RECENT_SHARE)
+    recent = 0
+    result = await db.stream(
+        select(models.ChatMessage.id, models.ChatMessage.content)
+        .where(models.ChatMessage.conversation_id == conversation_id, models.ChatMessage.id > after_id)
+        .order_by(models.ChatMessage.id.desc())
+        .execution_options(yield_per=HISTORY_PAGE_SIZE)
+    )
+    try:
+        async for row in result:
+            recent += _message_tokens(row.content)
+            if recent > keep:
+                return row.id
+    finally:
+        await result.close()
+    return None
+
+
+async def _turns_to_fold(
+    db: AsyncSession, conversation_id: int, after_id: int, until_id: int, previous: str
+) -> list:
+    """The oldest turns in (after_id, until_id] that fit in one summary request, oldest first."""
+    fold_budget = context_budget() - count_tokens(previous) - count_tokens(SUMMARIZE_PROMPT)
+
+    folded = []
+    result = await db.stream(
+        select(models.ChatMessage.id, models.ChatMessage.role, models.ChatMessage.content)
+        .where(
+            models.ChatMessage.conversation_id == conversation_id,
+            models.ChatMessage.id > after_id,
+            models.ChatMessage.id <= until_id,
+        )
+        .order_by(models.ChatMessage.id.asc())
+        .execution_options(yield_per=HISTORY_PAGE_SIZE)
+    )
+    async for row in result:
+        tokens = _message_tokens(row.content)
+        if folded and tokens > fold_budget:
+            break
+        fold_budget -= tokens
+        folded.append(row)
+    await result.close()
+    return folded
+
+
+async def _store_summary(conversation_id: int, after_id: int, create: bool, values: dict) -> bool:
+    """Save the new summary, unless another run moved it meanwhile. Returns whether it was saved."""
+    async with AsyncSessionLocal() as db:
+        if create:
+            db.add(models.ChatSummary(conversation_id=conversation_id, **values))
+            try:
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()     # another run summarized first
+                return False
+            return True
+
+        result = await db.execute(
+            update(models.ChatSummary)
+            .where(
+                models.ChatSummary.conversation_id == conversation_id,
+                models.ChatSummary.last_message_id == after_id,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+
+@job_handler("chat.summarize")
+async def summarize_history(payload: dict):
+    """
+    Fold the turns that no longer fit in the prompt into the conversation's summary.
+    The newest CONTEXT_RECENT_SHARE of the budget stays verbatim. Older
+    turns are folded oldest first, one budget worth per summary request,
+    until the summary reaches the recent window, so none is skipped.
+    """
+    conversation_id = payload.get("conversation_id")
+    if conversation_id is None:
+        return      # queued before summaries were per conversation
+
+    async with AsyncSessionLocal() as db:
+        summary = await db.get(models.ChatSummary, conversation_id)
+        after_id = summary.last_message_id if summary else 0
+        previous = summary.content if summary else ""
+        until_id = await _fold_until(db, conversation_id, after_id)
+
+    create = summary is None
+    while until_id is not None and after_id < until_id:
+        async with AsyncSessionLocal() as db:
+            folded = await _turns_to_fold(db, conversation_id, after_id, until_id, previous)
+        if not folded:
+            return
+        # no DB connection is held while the provider works
+        content = await _fold(previous, folded)
+        values = {
+            "content": content,
+            "last_message_id": folded[-1].id,
+            "tokens": count_tokens(content),
+        }
+        if not await _store_summary(conversation_id, after_id, create, values):
+            return
+        create = False
+        after_id, previous = folded[-1].id, content
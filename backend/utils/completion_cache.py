@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# A reply served from the cache, or shared with an identical request in
+# flight, cost no provider tokens, so it is charged nothing.
+CACHED_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
+class CompletionCache:
+    """
+    In-process LRU + TTL cache for chat completions (opt-in: AI_CACHE_ENABLED).
+
+    Keyed on a hash of (model, temperature, normalized messages), capped by the
+    total size of the cached JSON in bytes. Concurrent misses for the same key
+    share a single upstream call (single-flight).
+    """
+
+    def __init__(self, enabled: bool = False, ttl: float = 300.0, max_bytes: int = 16 * 1024 * 1024):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: List[dict]) -> str:
+        normalized = [
+            {
+                "role": m["role"].strip().lower(),
+                "content": " ".join(m["content"].split()),
+            }
+            for m in messages
+        ]
+        raw = json.dumps([model, temperature, normalized], separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: dict):
+        size = len(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, size, time.monotonic() + self.ttl)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """get() that counts a hit; a miss is counted by the request that then fetches."""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+    async def get_or_join(self, key: str) -> Optional[dict]:
+        """
+        The cached value for `key`, or the result of an identical request
+        already in flight (its error is raised here too). None means there is
+        nothing to share: the caller now leads the fetch for `key` and must
+        report it with finish() or fail().
+        """
+        while True:
+            value = self.lookup(key)
+            if value is not None:
+                return value
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # the leading request was cancelled, not us: look again
+
+        self.misses += 1
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def finish(self, key: str, value: dict, store: bool = True):
+        """The leader's fetch for `key` succeeded: cache it and wake the followers."""
+        future = self._inflight.pop(key, None)
+        if store:
+            self.put(key, value)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def fail(self, key: str, error: BaseException):
+        """
+        The leader's fetch for `key` failed: followers get the same error. If
+        the leader was cancelled instead, they fetch for themselves.
+        """
+        future = self._inflight.pop(key, None)
+        if future is None or future.done():
+            return
+        if isinstance(error, Exception):
+            future.set_exception(error)
+            future.exception()  # mark retrieved, there may be no followers
+        else:
+            future.cancel()
+
+    async def get_or_fetch(
+        self, key: str, fetch: Callable[[], Awaitable[dict]]
+    ) -> Tuple[dict, bool]:
+        """
+        Returns (value, shared): shared is True when the value came from the
+        cache or from an identical request in flight rather than from fetch().
+        """
+        value = await self.get_or_join(key)
+        if value is not None:
+            return value, True
+
+        try:
+            value = await fetch()
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.finish(key, value)
+        return value, False
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+completion_cache = CompletionCache(
+    enabled=os.getenv("AI_CACHE_ENABLED", "false").lower() == "true",
+    ttl=float(os.getenv("AI_CACHE_TTL", "300")),
+    max_bytes=int(os.getenv("AI_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+)
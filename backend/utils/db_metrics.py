@@ -0,0 +1,221 @@
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds (seconds) of the checkout wait histogram; the last bucket is open
+WAIT_BUCKETS = (0.001, 0.01, 0.1, 1.0)
+
+
+class RequestDBStats:
+    """DB work of one request, reported in its Server-Timing header."""
+
+    __slots__ = ("queries", "query_time", "checkouts", "checkout_wait")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.checkouts = 0
+        self.checkout_wait = 0.0
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.query_time * 1000:.1f};desc="{self.queries} queries", '
+            f'db-pool;dur={self.checkout_wait * 1000:.1f};desc="{self.checkouts} checkouts"'
+        )
+
+
+_request_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("request_db_stats", default=None)
+
+
+class DBMetrics:
+    """
+    Process-wide pool and query counters, fed by engine / pool events.
+    Per-request numbers go to the RequestDBStats of the current context
+    (set by ServerTimingMiddleware).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.engines: Dict[str, object] = {}
+        self.queries = 0
+        self.query_time = 0.0
+        self.slowest_query = 0.0
+        self.checkouts = 0
+        self.checkout_wait = 0.0
+        self.max_checkout_wait = 0.0
+        self.wait_histogram: List[int] = [0] * (len(WAIT_BUCKETS) + 1)
+        self.pool_timeouts = 0
+        self.pings = 0
+        self.stale_connections = 0
+
+    def record_checkout(self, wait: float):
+        bucket = next((i for i, limit in enumerate(WAIT_BUCKETS) if wait < limit), len(WAIT_BUCKETS))
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait += wait
+            self.max_checkout_wait = max(self.max_checkout_wait, wait)
+            self.wait_histogram[bucket] += 1
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.checkouts += 1
+            stats.checkout_wait += wait
+
+    def record_timeout(self):
+        with self._lock:
+            self.pool_timeouts += 1
+
+    def record_ping(self, alive: bool):
+        with self._lock:
+            self.pings += 1
+            if not alive:
+                self.stale_connections += 1
+
+    def record_query(self, duration: float):
+        with self._lock:
+            self.queries += 1
+            self.query_time += duration
+            self.slowest_query = max(self.slowest_query, duration)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += duration
+
+    def stats(self) -> dict:
+        pools = {}
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            pools[name] = {"status": pool.status()}
+            if isinstance(pool, QueuePool):
+                pools[name].update(
+                    size=pool.size(),
+                    checked_out=pool.checkedout(),
+                    checked_in=pool.checkedin(),
+                    overflow=pool.overflow(),
+                )
+
+        with self._lock:
+            labels = [f"<{int(limit * 1000)}ms" for limit in WAIT_BUCKETS]
+            labels.append(f">={int(WAIT_BUCKETS[-1] * 1000)}ms")
+            return {
+                "pools": pools,
+                "checkouts": self.checkouts,
+                "avg_checkout_wait_ms": round(self.checkout_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_checkout_wait_ms": round(self.max_checkout_wait * 1000, 3),
+                "checkout_wait_histogram": dict(zip(labels, self.wait_histogram)),
+                "pool_timeouts": self.pool_timeouts,
+                "pings": self.pings,
+                "stale_connections": self.stale_connections,
+                "queries": self.queries,
+                "avg_query_ms": round(self.query_time / self.queries * 1000, 3) if self.queries else 0.0,
+                "slowest_query_ms": round(self.slowest_query * 1000, 3),
+            }
+
+
+db_metrics = DBMetrics()
+
+
+class TimedPoolMixin:
+    """Measures how long a checkout waits for a free connection (or a new one)."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            db_metrics.record_timeout()
+            raise
+        db_metrics.record_checkout(time.perf_counter() - start)
+        return conn
+
+
+def timed_pool_class(pool_class):
+    """The timed subclass of a queue pool class (QueuePool, AsyncAdaptedQueuePool)."""
+    return type(f"Timed{pool_class.__name__}", (TimedPoolMixin, pool_class), {})
+
+
+def instrument(name: str, engine, pre_ping: str = "always", ping_idle: float = 30.0):
+    """
+    Register the query timing hooks on `engine` (the sync engine, for an
+    async one pass `.sync_engine`) and its pool under `name`.
+
+    pre_ping="idle" pings a connection on checkout only when it sat in the
+    pool for more than `ping_idle` seconds; a dead one is replaced before
+    use. ("always" is create_engine(pool_pre_ping=True), "never" relies on
+    pool_recycle and the disconnect handling of the first failed query.)
+    """
+    db_metrics.engines[name] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        db_metrics.record_query(time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _failed_query(context):
+        if context.connection is not None:
+            starts = context.connection.info.get("query_start")
+            if starts:
+                starts.pop()
+
+    if pre_ping != "idle":
+        return
+
+    @event.listens_for(engine, "checkin")
+    def _checked_in(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < ping_idle:
+            return
+        try:
+            # some drivers already fail to open a cursor on a closed connection
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+        except Exception:
+            db_metrics.record_ping(alive=False)
+            # the pool discards this connection and checks out another
+            raise DisconnectionError("connection was closed while idle")
+        db_metrics.record_ping(alive=True)
+
+
+class ServerTimingMiddleware:
+    """
+    Counts the DB queries and pool checkouts of each HTTP request and adds
+    them as a `Server-Timing` header (pure ASGI). For streamed responses
+    the header covers the work done before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestDBStats()
+        token = _request_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
@@ -1,16 +1,16 @@
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 from datetime import datetime
-import os
+import io
 
 def generate_invoice(payment, user, plan):
-    invoice_dir = "invoices"
-    os.makedirs(invoice_dir, exist_ok=True)
+    """Render the PDF in memory; returns (filename, pdf bytes) for utils.invoice_storage."""
+    # reportlab is only needed by the job worker: import on first invoice
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
 
     filename = f"invoice_{payment.id}.pdf"
-    filepath = os.path.join(invoice_dir, filename)
+    buffer = io.BytesIO()
 
-    c = canvas.Canvas(filepath, pagesize=A4)
+    c = canvas.Canvas(buffer, pagesize=A4)
 
     c.setFont("Helvetica-Bold", 18)
     c.drawString(50, 800, "UKSChat - Invoice")
@@ -28,4 +28,4 @@ def generate_invoice(payment, user, plan):
     c.showPage()
     c.save()
 
-    return filename, filepath
+    return filename, buffer.getvalue()
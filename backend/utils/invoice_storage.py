@@ -0,0 +1,134 @@
+import hashlib
+import os
+import tempfile
+from typing import Dict
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, RedirectResponse, Response
+
+load_dotenv()
+
+
+class LocalInvoiceStorage:
+    """
+    Invoices as files under `root`. Point INVOICE_DIR at a shared volume
+    when running several nodes.
+
+    Downloads are FileResponses (Range / If-Range, and zero-copy
+    `http.response.pathsend` on servers that support it). Behind nginx, set
+    INVOICE_ACCEL_REDIRECT to an `internal` location serving the same
+    directory and nginx sends the file with sendfile instead of the app.
+    """
+
+    def __init__(self, root: str, accel_redirect: str = ""):
+        self.root = root
+        self.accel_redirect = accel_redirect.rstrip("/")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, os.path.basename(name))
+
+    def save(self, name: str, data: bytes):
+        os.makedirs(self.root, exist_ok=True)
+        # write + rename: readers never see a half-written PDF
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(name))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def read(self, name: str) -> bytes:
+        with open(self._path(name), "rb") as f:
+            return f.read()
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def response(self, name: str, headers: Dict[str, str]) -> Response:
+        if not os.path.exists(self._path(name)):
+            raise HTTPException(status_code=404, detail="Invoice file missing")
+        if self.accel_redirect:
+            return Response(
+                media_type="application/pdf",
+                headers={
+                    **headers,
+                    "X-Accel-Redirect": f"{self.accel_redirect}/{os.path.basename(name)}",
+                    "Content-Disposition": f'attachment; filename="{name}"',
+                },
+            )
+        return FileResponse(
+            self._path(name), media_type="application/pdf", filename=name, headers=headers
+        )
+
+
+class S3InvoiceStorage:
+    """
+    Invoices in an S3-compatible bucket (AWS, MinIO, R2...), shared by all
+    nodes. Downloads redirect to a short-lived presigned URL, so the object
+    store serves the bytes and Range requests. Needs `pip install boto3`.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "invoices/", endpoint_url: str = None, url_ttl: int = 300):
+        import boto3
+
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_ttl = url_ttl
+
+    def _key(self, name: str) -> str:
+        return self.prefix + os.path.basename(name)
+
+    def save(self, name: str, data: bytes):
+        self.client.put_object(
+            Bucket=self.bucket, Key=self._key(name), Body=data, ContentType="application/pdf"
+        )
+
+    def read(self, name: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(name))["Body"].read()
+
+    def exists(self, name: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+            return True
+        except ClientError:
+            return False
+
+    def response(self, name: str, headers: Dict[str, str]) -> Response:
+        url = self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._key(name),
+                "ResponseContentDisposition": f'attachment; filename="{name}"',
+            },
+            ExpiresIn=self.url_ttl,
+        )
+        return RedirectResponse(url, status_code=307, headers=headers)
+
+
+def _create_storage():
+    if os.getenv("INVOICE_STORAGE", "local").lower() == "s3":
+        return S3InvoiceStorage(
+            bucket=os.getenv("INVOICE_S3_BUCKET"),
+            prefix=os.getenv("INVOICE_S3_PREFIX", "invoices/"),
+            endpoint_url=os.getenv("INVOICE_S3_ENDPOINT_URL"),
+        )
+    return LocalInvoiceStorage(
+        os.getenv("INVOICE_DIR", "invoices"),
+        accel_redirect=os.getenv("INVOICE_ACCEL_REDIRECT", ""),
+    )
+
+
+invoice_storage = _create_storage()
+
+
+def store_invoice(name: str, data: bytes) -> str:
+    """Save an invoice and return its SHA-256 (stored on the payment, used as ETag)."""
+    invoice_storage.save(name, data)
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import random
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Union
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+load_dotenv()
+
+# Run the worker inside the API process; set to false when `python worker.py`
+# runs separately.
+JOBS_IN_PROCESS = os.getenv("JOBS_IN_PROCESS", "true").lower() == "true"
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "10"))
+JOB_LOCK_TIMEOUT = float(os.getenv("JOB_LOCK_TIMEOUT", "300"))
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "10"))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "3600"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# kind -> async handler(payload)
+HANDLERS: Dict[str, Callable[[dict], Awaitable[None]]] = {}
+
+
+def job_handler(kind: str):
+    """Register an async handler for a job kind. Handlers must be idempotent:
+    a job whose worker died is run again after JOB_LOCK_TIMEOUT."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(db: Union[Session, AsyncSession], kind: str, payload: dict, delay: float = 0, max_attempts: int = 8) -> models.Job:
+    """
+    Add a job in the caller's transaction (sync or async session). Workers
+    only see it once the caller commits, so the job and the change it
+    belongs to go together.
+    """
+    job = models.Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.add(job)
+    return job
+
+
+def requeue_stale_jobs() -> int:
+    """Jobs still `running` after JOB_LOCK_TIMEOUT lost their worker: retry or give up."""
+    stale = datetime.utcnow() - timedelta(seconds=JOB_LOCK_TIMEOUT)
+    db = SessionLocal()
+    try:
+        is_stale = (models.Job.status == "running", models.Job.locked_at < stale)
+        dead = db.execute(
+            update(models.Job)
+            .where(*is_stale, models.Job.attempts >= models.Job.max_attempts)
+            .values(status="dead", locked_at=None, locked_by=None, last_error="worker lock timed out")
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        requeued = db.execute(
+            update(models.Job)
+            .where(*is_stale)
+            .values(status="queued", locked_at=None, locked_by=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return dead + requeued
+    finally:
+        db.close()
+
+
+def claim_jobs(limit: int) -> List[models.Job]:
+    """
+    Claim up to `limit` due jobs for this worker.
+
+    `FOR UPDATE SKIP LOCKED` lets several workers poll without waiting on
+    each other's rows (MySQL 8+). The claim itself is a conditional UPDATE,
+    so on databases without row locks (SQLite) a job still goes to one
+    worker only.
+    """
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        candidates = (
+            db.query(models.Job.id)
+            .filter(models.Job.status == "queued", models.Job.run_at <= now)
+            .order_by(models.Job.run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        claimed = []
+        for (job_id,) in candidates:
+            won = db.execute(
+                update(models.Job)
+                .where(models.Job.id == job_id, models.Job.status == "queued")
+                .values(
+                    status="running",
+                    locked_at=now,
+                    locked_by=WORKER_ID,
+                    attempts=models.Job.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if won:
+                claimed.append(job_id)
+        db.commit()
+
+        if not claimed:
+            return []
+        jobs = db.query(models.Job).filter(models.Job.id.in_(claimed)).all()
+        db.expunge_all()
+        return jobs
+    finally:
+        db.close()
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def complete_job(job: models.Job):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.Job)
+            .where(models.Job.id == job.id, models.Job.locked_by == WORKER_ID)
+            .values(status="done", locked_at=None, locked_by=None, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def fail_job(job: models.Job, error: str):
+    """Retry with exponential backoff, or move to `dead` after max_attempts."""
+    if job.attempts >= job.max_attempts:
+        values = {"status": "dead"}
+    else:
+        values = {
+            "status": "queued",
+            "run_at": datetime.utcnow() + timedelta(seconds=_backoff(job.attempts)),
+        }
+
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.Job)
+            .where(models.Job.id == job.id, models.Job.locked_by == WORKER_ID)
+            .values(locked_at=None, locked_by=None, last_error=error[:2000], **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_job(job: models.Job):
+    handler = HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"no handler for job kind {job.kind!r}")
+        await handler(json.loads(job.payload))
+    except Exception as e:
+        print(f"Job {job.id} ({job.kind}) failed, attempt {job.attempts}:", e)
+        await run_in_threadpool(fail_job, job, f"{type(e).__name__}: {e}")
+    else:
+        await run_in_threadpool(complete_job, job)
+
+
+async def job_counts(db: AsyncSession) -> Dict[str, int]:
+    """Number of jobs per status."""
+    rows = await db.execute(
+        select(models.Job.status, func.count()).group_by(models.Job.status)
+    )
+    return {status: count for status, count in rows}
+
+
+async def run_job_worker():
+    """Background task: claim due jobs and run them, JOB_BATCH_SIZE at a time."""
+    while True:
+        try:
+            await run_in_threadpool(requeue_stale_jobs)
+            jobs = await run_in_threadpool(claim_jobs, JOB_BATCH_SIZE)
+        except Exception as e:
+            print("Job claim failed:", e)
+            jobs = []
+
+        if jobs:
+            await asyncio.gather(*(run_job(job) for job in jobs))
+        else:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
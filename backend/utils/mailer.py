@@ -1,28 +1,167 @@
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from dotenv import load_dotenv
+import asyncio
+import mimetypes
 import os
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
 
 load_dotenv()
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM=os.getenv("MAIL_FROM"),
-    MAIL_PORT=int(os.getenv("MAIL_PORT")),
-    MAIL_SERVER=os.getenv("MAIL_SERVER"),
-    MAIL_STARTTLS=os.getenv("MAIL_STARTTLS") == "True",
-    MAIL_SSL_TLS=os.getenv("MAIL_SSL_TLS") == "True",
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
+MAIL_USERNAME = os.getenv("MAIL_USERNAME")
+MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
+MAIL_FROM = os.getenv("MAIL_FROM")
+MAIL_FROM_NAME = os.getenv("MAIL_FROM_NAME", "UKSChat")
+MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
+MAIL_SERVER = os.getenv("MAIL_SERVER")
+MAIL_STARTTLS = os.getenv("MAIL_STARTTLS") == "True"
+MAIL_SSL_TLS = os.getenv("MAIL_SSL_TLS") == "True"
+MAIL_TIMEOUT = float(os.getenv("MAIL_TIMEOUT", "30"))
+
+
+def _retryable():
+    """
+    Errors of a connection that failed in transit (server hung up, idle
+    timeout on the server side...): it is dropped and the message retried
+    once on a new one. aiosmtplib is imported on first send.
+    """
+    import aiosmtplib
+
+    return (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, ConnectionError)
+
+
+class SMTPPool:
+    """
+    Small pool of connected, logged-in SMTP connections.
+
+    `send()` borrows a connection, `send_many()` sends a batch over the
+    pool with at most `size` messages in flight. Connections idle for
+    longer than `max_idle` or used for `max_messages` mails are replaced,
+    since servers drop those anyway. Bound to the event loop it was first
+    used on; a new loop (e.g. a separate worker) gets fresh connections.
+    """
+
+    def __init__(self, size: int = 3, max_idle: float = 60.0, max_messages: int = 100):
+        self.size = size
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: List[list] = []     # [smtp, last_used, messages_sent]
+        self.connects = 0
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.size)
+            self._idle = []
+
+    async def _connect(self) -> list:
+        import aiosmtplib
+
+        smtp = aiosmtplib.SMTP(
+            hostname=MAIL_SERVER,
+            port=MAIL_PORT,
+            use_tls=MAIL_SSL_TLS,
+            start_tls=MAIL_STARTTLS and not MAIL_SSL_TLS,
+            username=MAIL_USERNAME or None,     # no login for a local relay
+            password=MAIL_PASSWORD or None,
+            timeout=MAIL_TIMEOUT,
+        )
+        await smtp.connect()
+        self.connects += 1
+        return [smtp, time.monotonic(), 0]
+
+    @staticmethod
+    async def _discard(conn: list):
+        try:
+            await conn[0].quit()
+        except Exception:
+            conn[0].close()
+
+    async def _checkout(self) -> list:
+        while self._idle:
+            conn = self._idle.pop()     # most recently used first
+            if (
+                conn[0].is_connected
+                and time.monotonic() - conn[1] < self.max_idle
+                and conn[2] < self.max_messages
+            ):
+                return conn
+            await self._discard(conn)
+        return await self._connect()
+
+    async def send(self, message: EmailMessage):
+        self._bind()
+        async with self._slots:
+            conn = await self._checkout()
+            retryable = _retryable()
+            for retry in (False, True):
+                try:
+                    await conn[0].send_message(message)
+                    break
+                except retryable:
+                    conn[0].close()
+                    if retry:
+                        raise
+                    conn = await self._connect()
+                except BaseException:
+                    # unknown state (e.g. rejected mid-transaction): don't reuse
+                    await self._discard(conn)
+                    raise
+            conn[1] = time.monotonic()
+            conn[2] += 1
+            self._idle.append(conn)
+
+    async def send_many(self, messages: Iterable[EmailMessage]) -> List[Optional[Exception]]:
+        """Send a batch over the pooled connections. Returns one error (or None) per message."""
+        results = await asyncio.gather(
+            *(self.send(m) for m in messages), return_exceptions=True
+        )
+        return [r if isinstance(r, Exception) else None for r in results]
+
+    async def close(self):
+        """Quit all idle connections (called on shutdown)."""
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await self._discard(conn)
+
+
+mailer = SMTPPool(
+    size=int(os.getenv("MAIL_POOL_SIZE", "3")),
+    max_idle=float(os.getenv("MAIL_POOL_MAX_IDLE", "60")),
+    max_messages=int(os.getenv("MAIL_POOL_MAX_MESSAGES", "100")),
 )
 
-async def send_invoice_email(to_email: str, filepath: str):
-    message = MessageSchema(
-        subject="Your UKSChat Subscription Invoice",
-        recipients=[to_email],
-        body="Thank you for your purchase! Your invoice is attached.",
-        attachments=[filepath],
-        subtype="plain",
+
+def build_message(
+    to_email: str, subject: str, body: str, attachments: Iterable[Tuple[str, bytes]] = ()
+) -> EmailMessage:
+    """Plain-text email; `attachments` are (filename, content) pairs."""
+    message = EmailMessage()
+    message["From"] = formataddr((MAIL_FROM_NAME, MAIL_FROM))
+    message["To"] = to_email
+    message["Subject"] = subject
+    message.set_content(body)
+
+    for filename, content in attachments:
+        ctype, _ = mimetypes.guess_type(filename)
+        maintype, subtype = (ctype or "application/octet-stream").split("/", 1)
+        message.add_attachment(content, maintype=maintype, subtype=subtype, filename=filename)
+    return message
+
+
+def build_invoice_email(to_email: str, filename: str, pdf: bytes) -> EmailMessage:
+    return build_message(
+        to_email,
+        "Your UKSChat Subscription Invoice",
+        "Thank you for your purchase! Your invoice is attached.",
+        [(filename, pdf)],
     )
-    fm = FastMail(conf)
-    await fm.send_message(message)
+
+
+async def send_invoice_email(to_email: str, filename: str, pdf: bytes):
+    await mailer.send(build_invoice_email(to_email, filename, pdf))
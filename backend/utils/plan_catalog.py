@@ -0,0 +1,101 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from pydantic import TypeAdapter
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models, schemas
+from auth_context import auth_cache
+from database import SessionLocal
+
+load_dotenv()
+
+CATALOG = "plans"
+
+_plans_json = TypeAdapter(list[schemas.PlanOut])
+
+
+async def bump_plans_version(db: AsyncSession):
+    """
+    Call in the transaction of every plan write: once it commits, all
+    workers see a new version and reload their catalog.
+    """
+    bumped = (await db.execute(
+        update(models.CacheVersion)
+        .where(models.CacheVersion.name == CATALOG)
+        .values(version=models.CacheVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )).rowcount
+    if not bumped:
+        db.add(models.CacheVersion(name=CATALOG, version=2))
+
+
+class PlanCatalog:
+    """
+    Active plans as pre-encoded JSON + ETag, per worker.
+
+    The DB version counter is read at most once per `check_interval`
+    seconds; in between, requests (and 304s) don't touch the database.
+    Writes in this worker call `invalidate()` for an immediate re-check.
+    """
+
+    def __init__(self, check_interval: float = 5.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._entry: Optional[Tuple[str, bytes]] = None    # (etag, body), swapped as one
+        self._checked_at = 0.0
+
+    def is_fresh(self) -> bool:
+        return self._entry is not None and time.monotonic() - self._checked_at < self.check_interval
+
+    def get(self) -> Tuple[str, bytes]:
+        """(etag, JSON body) of the active plans, cheapest first."""
+        entry = self._entry
+        if entry is not None and self.is_fresh():
+            return entry
+
+        with self._lock:
+            if self.is_fresh():
+                return self._entry
+
+            db = SessionLocal()
+            try:
+                version = (
+                    db.query(models.CacheVersion.version)
+                    .filter(models.CacheVersion.name == CATALOG)
+                    .scalar()
+                ) or 1
+                if version != self._version or self._entry is None:
+                    plans = (
+                        db.query(models.Plan)
+                        .filter(models.Plan.is_active == True)
+                        .order_by(models.Plan.price.asc())
+                        .all()
+                    )
+                    body = _plans_json.dump_json(_plans_json.validate_python(plans, from_attributes=True))
+                    if self._version is not None:
+                        # a plan changed in another worker: cached auth
+                        # contexts embed plan data too
+                        auth_cache.clear()
+                    etag = f'"plans-{version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+                    self._entry = (etag, body)
+                    self._version = version
+            finally:
+                db.close()
+
+            self._checked_at = time.monotonic()
+            return self._entry
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+
+plan_catalog = PlanCatalog(
+    check_interval=float(os.getenv("PLAN_CATALOG_CHECK_INTERVAL", "5")),
+)
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from utils.ai_client import AIProvider, AIProviderError, get_providers
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class CircuitBreaker:
+    """
+    Per-provider health over the last `window` calls.
+
+    The breaker opens (provider is skipped) when the error rate or the share
+    of slow calls goes over its threshold. After `cooldown` seconds one probe
+    call is let through (half-open); its outcome closes or re-opens it.
+    """
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 5,
+        error_rate: float = 0.5,
+        slow_call: float = 20.0,
+        slow_rate: float = 0.5,
+        cooldown: float = 30.0,
+    ):
+        self.calls: deque = deque(maxlen=window)   # (ok, latency)
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.cooldown = cooldown
+        self.opened_at: Optional[float] = None
+        self.probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open":
+            # one probe at a time; a probe that never reported back (e.g. a
+            # cancelled hedge) stops blocking after another cooldown
+            now = time.monotonic()
+            if self.probe_started is None or now - self.probe_started >= self.cooldown:
+                self.probe_started = now
+                return True
+        return False
+
+    def record(self, ok: bool, latency: float):
+        self.calls.append((ok, latency))
+
+        if self.opened_at is not None:
+            # outcome of the half-open probe
+            self.probe_started = None
+            if ok and latency < self.slow_call:
+                self.opened_at = None
+                self.calls.clear()
+            else:
+                self.opened_at = time.monotonic()
+            return
+
+        if len(self.calls) < self.min_calls:
+            return
+        errors = sum(1 for call_ok, _ in self.calls if not call_ok)
+        slow = sum(1 for _, call_latency in self.calls if call_latency >= self.slow_call)
+        if errors / len(self.calls) >= self.error_rate or slow / len(self.calls) >= self.slow_rate:
+            self.opened_at = time.monotonic()
+
+    def p95(self) -> Optional[float]:
+        latencies = sorted(latency for ok, latency in self.calls if ok)
+        if len(latencies) < self.min_calls:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+
+class ProviderRouter:
+    """
+    Routes completions across providers in fallback order (OpenAI → Groq).
+
+    - unhealthy providers are skipped while their breaker is open
+    - one deadline (AI_DEADLINE seconds) covers the whole chain; when
+      streaming it bounds the wait for the first token, after which a reply
+      may pause at most AI_STREAM_IDLE_TIMEOUT seconds between chunks
+    - with AI_HEDGE=true the next provider is also started once the current
+      one is slower than its own p95, and the first answer wins
+    """
+
+    def __init__(self, providers: List[AIProvider]):
+        self.providers = providers
+        self.deadline = _env_float("AI_DEADLINE", 60.0)
+        self.idle_timeout = _env_float("AI_STREAM_IDLE_TIMEOUT", 30.0)
+        self.hedge = os.getenv("AI_HEDGE", "false").lower() == "true"
+        self.hedge_delay = _env_float("AI_HEDGE_DELAY", 5.0)
+        self.hedge_min_delay = _env_float("AI_HEDGE_MIN_DELAY", 0.5)
+        self.hedge_max_delay = _env_float("AI_HEDGE_MAX_DELAY", 10.0)
+        self.breakers: Dict[str, CircuitBreaker] = {
+            p.name: CircuitBreaker(
+                window=_env_int("AI_BREAKER_WINDOW", 20),
+                min_calls=_env_int("AI_BREAKER_MIN_CALLS", 5),
+                error_rate=_env_float("AI_BREAKER_ERROR_RATE", 0.5),
+                slow_call=_env_float("AI_BREAKER_SLOW_CALL", 20.0),
+                slow_rate=_env_float("AI_BREAKER_SLOW_RATE", 0.5),
+                cooldown=_env_float("AI_BREAKER_COOLDOWN", 30.0),
+            )
+            for p in providers
+        }
+
+    def _candidates(self) -> Iterator[AIProvider]:
+        """
+        Providers in fallback order. A breaker is only asked when its provider
+        is next in line, so a half-open probe slot isn't used up by a
+        provider that never gets called.
+        """
+        enabled = [p for p in self.providers if p.enabled]
+        allowed = False
+        for provider in enabled:
+            if self.breakers[provider.name].allow():
+                allowed = True
+                yield provider
+        if not allowed:
+            # Everything tripped: still try in order rather than fail outright.
+            yield from enabled
+
+    def _hedge_after(self, provider: AIProvider) -> float:
+        p95 = self.breakers[provider.name].p95()
+        if p95 is None:
+            return self.hedge_delay
+        return min(max(p95, self.hedge_min_delay), self.hedge_max_delay)
+
+    async def _attempt(self, provider: AIProvider, messages: List[dict]) -> Tuple[AIProvider, dict]:
+        started = time.monotonic()
+        try:
+            data = await provider.complete(messages)
+        except Exception:
+            self.breakers[provider.name].record(False, time.monotonic() - started)
+            raise
+        self.breakers[provider.name].record(True, time.monotonic() - started)
+        return provider, data
+
+    async def complete(self, messages: List[dict]) -> Tuple[AIProvider, dict]:
+        """Return (provider, raw completion JSON) from the first provider that answers."""
+        candidates = self._candidates()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        running: Dict[asyncio.Task, Tuple[AIProvider, float]] = {}
+        exhausted = False
+
+        def launch():
+            nonlocal exhausted
+            provider = next(candidates, None)
+            if provider is None:
+                exhausted = True
+                return
+            task = asyncio.ensure_future(self._attempt(provider, messages))
+            running[task] = (provider, loop.time())
+
+        launch()
+        if not running:
+            raise AIProviderError("No AI provider configured")
+        try:
+            while running:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+
+                timeout = remaining
+                can_hedge = self.hedge and not exhausted
+                if can_hedge:
+                    last_provider, last_started = list(running.values())[-1]
+                    hedge_at = last_started + self._hedge_after(last_provider)
+                    timeout = max(0.0, min(remaining, hedge_at - loop.time()))
+
+                done, _ = await asyncio.wait(
+                    running.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    provider, _ = running.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    logger.warning("%s failed: %r", provider.name, task.exception())
+
+                if not running:
+                    launch()        # failed → fall back right away
+                elif not done and can_hedge:
+                    launch()        # too slow → hedge with the next provider
+
+            for provider, started in running.values():
+                self.breakers[provider.name].record(False, loop.time() - started)
+        finally:
+            for task in running:
+                task.cancel()
+
+        raise AIProviderError("No valid AI response before the deadline")
+
+    async def stream(
+        self, messages: List[dict], usage: Optional[dict] = None
+    ) -> AsyncIterator[Optional[str]]:
+        """
+        Yield text deltas from the first healthy provider, falling back in
+        order. `None` is yielded when a provider dies mid-reply, so the caller
+        can drop the partial text before the next provider starts over.
+        `usage` is filled with the provider's token usage, if it reports it.
+
+        The deadline is for the first token (and starts over when a reply
+        breaks off); once a provider streams, only a pause longer than the
+        idle timeout between chunks counts as a failure. Providers not
+        started before the deadline aren't tried (nor held against).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        candidates = self._candidates()
+
+        while loop.time() < deadline:
+            provider = next(candidates, None)
+            if provider is None:
+                break
+            started = time.monotonic()
+            first_token: Optional[float] = None
+            produced = False
+            if usage is not None:
+                usage.clear()
+            deltas = provider.stream(messages, usage)
+            try:
+                while True:
+                    timeout = self.idle_timeout if produced else deadline - loop.time()
+                    try:
+                        delta = await asyncio.wait_for(deltas.__anext__(), timeout=max(timeout, 0.0))
+                    except StopAsyncIteration:
+                        break
+                    if not produced:
+                        produced = True
+                        first_token = time.monotonic() - started
+                    yield delta
+            except Exception as e:
+                self.breakers[provider.name].record(False, time.monotonic() - started)
+                logger.warning("%s stream failed: %r", provider.name, e)
+                if produced:
+                    yield None
+                    # the fallback gets a full deadline for its first token
+                    deadline = loop.time() + self.deadline
+                continue
+            finally:
+                await deltas.aclose()
+
+            # Stream length depends on the answer, so health is judged on
+            # time to first token.
+            self.breakers[provider.name].record(
+                True, first_token if first_token is not None else time.monotonic() - started
+            )
+            return
+
+        raise AIProviderError("No valid AI response before the deadline")
+
+
+_router: Optional[ProviderRouter] = None
+
+
+def get_router() -> ProviderRouter:
+    global _router
+    if _router is None:
+        _router = ProviderRouter(get_providers())
+    return _router
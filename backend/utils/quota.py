@@ -0,0 +1,331 @@
+import asyncio
+import os
+import threading
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, func, select, update
+
+import models
+from database import SessionLocal
+
+load_dotenv()
+
+FLUSH_BATCH_SIZE = 500
+# Token allowance period of a subscription (plans.tokens_per_month), see utils.scheduler
+TOKEN_PERIOD = timedelta(days=int(os.getenv("TOKEN_PERIOD_DAYS", "30")))
+
+
+class LocalQuotaStore:
+    """
+    Per-process token counters, keyed by subscription id.
+
+    For every subscription we keep `used` (tokens charged so far), `reserved`
+    (estimated tokens of in-flight requests), `limit` and `pending` (charged
+    but not yet written to subscriptions.used_tokens). Reads and updates are
+    atomic under one lock. Only correct with a single worker; use the Redis
+    store when running several.
+    """
+
+    # unflushed deltas die with the process: rebuild from usage_logs on start
+    rebuild_on_startup = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._quotas: Dict[int, Dict[str, int]] = {}
+
+    def ensure(self, sub_id: int, used: int, limit: int):
+        """Seed from the DB row the first time we see a subscription."""
+        with self._lock:
+            quota = self._quotas.get(sub_id)
+            if quota is None:
+                self._quotas[sub_id] = {"used": used, "reserved": 0, "limit": limit, "pending": 0}
+            else:
+                quota["limit"] = limit
+
+    def used(self, sub_id: int) -> Optional[int]:
+        with self._lock:
+            quota = self._quotas.get(sub_id)
+            return quota["used"] if quota else None
+
+    def reserve(self, sub_id: int, amount: int) -> bool:
+        with self._lock:
+            quota = self._quotas.get(sub_id)
+            if quota is None:
+                return False    # forgotten meanwhile (subscription expired)
+            if quota["used"] + quota["reserved"] + amount > quota["limit"]:
+                return False
+            quota["reserved"] += amount
+            return True
+
+    def settle(self, sub_id: int, reserved: int, actual: int):
+        with self._lock:
+            quota = self._quotas.get(sub_id)
+            if quota is None:
+                return      # expired mid-turn; the usage log still records it
+            quota["reserved"] = max(quota["reserved"] - reserved, 0)
+            quota["used"] += actual
+            quota["pending"] += actual
+
+    def release(self, sub_id: int, reserved: int):
+        with self._lock:
+            quota = self._quotas.get(sub_id)
+            if quota:
+                quota["reserved"] = max(quota["reserved"] - reserved, 0)
+
+    def drain(self) -> Dict[int, int]:
+        """Take all unflushed deltas (sub_id -> tokens)."""
+        with self._lock:
+            deltas = {}
+            for sub_id, quota in self._quotas.items():
+                if quota["pending"]:
+                    deltas[sub_id] = quota["pending"]
+                    quota["pending"] = 0
+            return deltas
+
+    def restore(self, deltas: Dict[int, int]):
+        """Put deltas back after a failed flush."""
+        with self._lock:
+            for sub_id, delta in deltas.items():
+                if sub_id in self._quotas:
+                    self._quotas[sub_id]["pending"] += delta
+
+    def forget(self, sub_ids: List[int]):
+        with self._lock:
+            for sub_id in sub_ids:
+                self._quotas.pop(sub_id, None)
+
+    def reset(self, limits: Dict[int, int]):
+        """New token period (sub_id -> limit): usage starts over, in-flight reservations stay."""
+        with self._lock:
+            for sub_id, limit in limits.items():
+                quota = self._quotas.get(sub_id)
+                reserved = quota["reserved"] if quota else 0
+                self._quotas[sub_id] = {"used": 0, "reserved": reserved, "limit": limit, "pending": 0}
+
+
+class RedisQuotaStore:
+    """
+    Same interface as LocalQuotaStore, shared by all workers through Redis.
+    Every check-and-update runs as one Lua script, so it is atomic across
+    processes. Needs `pip install redis` and QUOTA_BACKEND=redis + REDIS_URL.
+    """
+
+    # counters outlive worker restarts, nothing to rebuild
+    rebuild_on_startup = False
+
+    KEY_TTL = 40 * 24 * 3600
+    DIRTY = "quota:dirty"
+
+    RESERVE = """
+    local q = redis.call('HMGET', KEYS[1], 'used', 'reserved', 'limit')
+    if not q[1] then return -1 end
+    if tonumber(q[1]) + tonumber(q[2] or 0) + tonumber(ARGV[1]) > tonumber(q[3]) then return 0 end
+    redis.call('HINCRBY', KEYS[1], 'reserved', ARGV[1])
+    return 1
+    """
+
+    SETTLE = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+    redis.call('HINCRBY', KEYS[1], 'reserved', -tonumber(ARGV[1]))
+    redis.call('HINCRBY', KEYS[1], 'used', ARGV[2])
+    redis.call('HINCRBY', KEYS[1], 'pending', ARGV[2])
+    redis.call('SADD', KEYS[2], ARGV[3])
+    return 1
+    """
+
+    DRAIN = """
+    local out = {}
+    for _, id in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+        local key = 'quota:' .. id
+        local pending = tonumber(redis.call('HGET', key, 'pending') or 0)
+        if pending ~= 0 then
+            redis.call('HINCRBY', key, 'pending', -pending)
+            table.insert(out, id)
+            table.insert(out, pending)
+        end
+        redis.call('SREM', KEYS[1], id)
+    end
+    return out
+    """
+
+    def __init__(self, url: str):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self._reserve = self.redis.register_script(self.RESERVE)
+        self._settle = self.redis.register_script(self.SETTLE)
+        self._drain = self.redis.register_script(self.DRAIN)
+
+    @staticmethod
+    def _key(sub_id: int) -> str:
+        return f"quota:{sub_id}"
+
+    def ensure(self, sub_id: int, used: int, limit: int):
+        key = self._key(sub_id)
+        pipe = self.redis.pipeline()
+        pipe.hsetnx(key, "used", used)
+        pipe.hset(key, "limit", limit)
+        pipe.expire(key, self.KEY_TTL)
+        pipe.execute()
+
+    def used(self, sub_id: int) -> Optional[int]:
+        value = self.redis.hget(self._key(sub_id), "used")
+        return int(value) if value is not None else None
+
+    def reserve(self, sub_id: int, amount: int) -> bool:
+        return self._reserve(keys=[self._key(sub_id)], args=[amount]) == 1
+
+    def settle(self, sub_id: int, reserved: int, actual: int):
+        self._settle(keys=[self._key(sub_id), self.DIRTY], args=[reserved, actual, sub_id])
+
+    def release(self, sub_id: int, reserved: int):
+        self.redis.hincrby(self._key(sub_id), "reserved", -reserved)
+
+    def drain(self) -> Dict[int, int]:
+        flat = self._drain(keys=[self.DIRTY])
+        return {int(flat[i]): int(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+    def restore(self, deltas: Dict[int, int]):
+        pipe = self.redis.pipeline()
+        for sub_id, delta in deltas.items():
+            pipe.hincrby(self._key(sub_id), "pending", delta)
+            pipe.sadd(self.DIRTY, sub_id)
+        pipe.execute()
+
+    def forget(self, sub_ids: List[int]):
+        if sub_ids:
+            self.redis.delete(*[self._key(sub_id) for sub_id in sub_ids])
+
+    def reset(self, limits: Dict[int, int]):
+        pipe = self.redis.pipeline()
+        for sub_id, limit in limits.items():
+            key = self._key(sub_id)
+            pipe.hset(key, mapping={"used": 0, "pending": 0, "limit": limit})
+            pipe.expire(key, self.KEY_TTL)
+        pipe.execute()
+
+
+def _create_store():
+    if os.getenv("QUOTA_BACKEND", "local").lower() == "redis":
+        return RedisQuotaStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return LocalQuotaStore()
+
+
+quota_store = _create_store()
+
+FLUSH_INTERVAL = float(os.getenv("QUOTA_FLUSH_INTERVAL", "5"))
+
+
+def flush_quota_deltas() -> int:
+    """
+    Write aggregated token deltas to subscriptions.used_tokens, one
+    `UPDATE ... SET used_tokens = used_tokens + CASE id ...` per batch.
+    Returns the number of subscriptions updated.
+    """
+    deltas = quota_store.drain()
+    if not deltas:
+        return 0
+
+    db = SessionLocal()
+    try:
+        items = list(deltas.items())
+        for i in range(0, len(items), FLUSH_BATCH_SIZE):
+            batch = dict(items[i:i + FLUSH_BATCH_SIZE])
+            db.execute(
+                update(models.Subscription)
+                .where(models.Subscription.id.in_(batch.keys()))
+                .values(
+                    used_tokens=models.Subscription.used_tokens
+                    + case(batch, value=models.Subscription.id, else_=0)
+                )
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        quota_store.restore(deltas)
+        raise
+    finally:
+        db.close()
+
+    return len(deltas)
+
+
+def reconcile_quotas():
+    """
+    Startup: flush whatever is pending. For the in-process store, whose
+    unflushed deltas died with the previous process, also bring
+    used_tokens of active subscriptions up to the sum of their usage logs
+    in the current token period (earlier periods were reset by the scheduler).
+    """
+    flush_quota_deltas()
+    if not quota_store.rebuild_on_startup:
+        return
+
+    db = SessionLocal()
+    try:
+        after_id = 0
+        while True:
+            subs = db.execute(
+                select(
+                    models.Subscription.id,
+                    models.Subscription.used_tokens,
+                    models.Subscription.start_date,
+                    models.Subscription.tokens_reset_at,
+                )
+                .where(models.Subscription.status == "active", models.Subscription.id > after_id)
+                .order_by(models.Subscription.id)
+                .limit(FLUSH_BATCH_SIZE)
+            ).all()
+            if not subs:
+                break
+            after_id = subs[-1].id
+
+            period_start = {
+                s.id: s.tokens_reset_at - TOKEN_PERIOD if s.tokens_reset_at else s.start_date
+                for s in subs
+            }
+            logged = dict(db.execute(
+                select(models.UsageLog.subscription_id, func.sum(models.UsageLog.tokens_used))
+                .where(
+                    models.UsageLog.subscription_id.in_(period_start.keys()),
+                    models.UsageLog.created_at
+                    >= case(period_start, value=models.UsageLog.subscription_id),
+                )
+                .group_by(models.UsageLog.subscription_id)
+            ).all())
+
+            # Only ever raise the counter: logs from before usage_logs had a
+            # subscription_id are not linked and would otherwise zero it.
+            raised = {
+                s.id: int(logged[s.id])
+                for s in subs
+                if (logged.get(s.id) or 0) > (s.used_tokens or 0)
+            }
+            if raised:
+                db.execute(
+                    update(models.Subscription)
+                    .where(models.Subscription.id.in_(raised.keys()))
+                    .values(used_tokens=case(raised, value=models.Subscription.id))
+                    .execution_options(synchronize_session=False)
+                )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_quota_flusher():
+    """Background task: flush deltas every QUOTA_FLUSH_INTERVAL seconds."""
+    try:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await run_in_threadpool(flush_quota_deltas)
+            except Exception as e:
+                print("Quota flush failed:", e)
+    finally:
+        # last flush on shutdown
+        await run_in_threadpool(flush_quota_deltas)
@@ -0,0 +1,129 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+
+from auth_context import auth_cache
+from auth_utils import decode_access_token
+
+load_dotenv()
+
+# Limits for users without an active subscription: (requests/minute, burst)
+NO_PLAN_LIMITS = (3, 3)
+
+
+class TokenBuckets:
+    """
+    One token bucket per user: [tokens, last_refill], in an LRU dict.
+
+    A bucket that has been idle long enough to refill completely is the same
+    as a new one, so idle buckets are dropped from the LRU end; `max_users`
+    bounds memory on top of that.
+    """
+
+    def __init__(self, max_users: int = 100_000):
+        self.max_users = max_users
+        self._buckets: "OrderedDict[int, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: int, per_minute: int, burst: int) -> Tuple[bool, float]:
+        """Take one token. Returns (allowed, seconds until the next token)."""
+        rate = per_minute / 60.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(burst), now]
+                self._buckets[key] = bucket
+            else:
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            self._evict(now)
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0.0
+            return False, (1 - bucket[0]) / rate if rate > 0 else 60.0
+
+    def _evict(self, now: float):
+        # idle for 10 minutes = refilled for any sane limit
+        while self._buckets:
+            key, (_, last) = next(iter(self._buckets.items()))
+            if now - last < 600 and len(self._buckets) <= self.max_users:
+                break
+            self._buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimitMiddleware:
+    """
+    Per-user token-bucket limit on POST requests under `paths` (pure ASGI).
+
+    The user comes from the JWT `sub` claim, the bucket size from the user's
+    plan (Plan.requests_per_minute / Plan.burst) via the cached auth context,
+    so a decision needs no DB query.
+    Over the limit: 429 with Retry-After. Buckets are per worker process.
+    """
+
+    def __init__(self, app, paths=("/chat",)):
+        self.app = app
+        self.paths = tuple(paths)
+        self.enabled = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+        self.buckets = TokenBuckets()
+
+    def _user_id(self, scope) -> Optional[int]:
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer":
+                    return None
+                payload = decode_access_token(token)
+                sub = payload.get("sub") if payload else None
+                try:
+                    return int(sub) if sub is not None else None
+                except (TypeError, ValueError):
+                    return None     # not a user id: anonymous, the endpoint answers 401
+        return None
+
+    async def _limits_for(self, user_id: int) -> Tuple[int, int]:
+        ctx = auth_cache.get(user_id)
+        if ctx is None:
+            ctx = await auth_cache.aload(user_id)
+        if ctx is None or ctx.plan is None:
+            return NO_PLAN_LIMITS
+        return ctx.plan.requests_per_minute, ctx.plan.burst
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not self.enabled
+            or scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.paths)
+        ):
+            return await self.app(scope, receive, send)
+
+        user_id = self._user_id(scope)
+        if user_id is None:
+            # let the endpoint answer 401
+            return await self.app(scope, receive, send)
+
+        per_minute, burst = await self._limits_for(user_id)
+        allowed, retry_after = self.buckets.take(user_id, per_minute, burst)
+        if not allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests! Please slow down."},
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+            return await response(scope, receive, send)
+
+        return await self.app(scope, receive, send)
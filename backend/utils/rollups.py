@@ -0,0 +1,184 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Date, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+load_dotenv()
+
+USAGE_ROLLUP = "usage_daily"
+ROLLUP_BATCH_SIZE = 10_000
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", "30"))
+# usage_logs ids seen this long ago belong to committed rows, see rollup_usage()
+ROLLUP_SETTLE = timedelta(seconds=5)
+
+
+def _locked_state(db: Session) -> models.RollupState:
+    state = (
+        db.query(models.RollupState)
+        .filter(models.RollupState.name == USAGE_ROLLUP)
+        .with_for_update()
+        .first()
+    )
+    if state is None:
+        state = models.RollupState(name=USAGE_ROLLUP, last_id=0)
+        db.add(state)
+    return state
+
+
+def _advance_horizon(db: Session) -> int:
+    """
+    Returns the id up to which usage logs can be folded: the max id recorded
+    at least ROLLUP_SETTLE ago. Then records the current max id for a later
+    run. Both live in the rollup_state row, shared by every worker.
+    """
+    state = _locked_state(db)
+    now = datetime.utcnow()
+    horizon = state.last_id
+    if state.seen_max_id is not None and state.seen_at <= now - ROLLUP_SETTLE:
+        horizon = max(horizon, state.seen_max_id)
+        state.seen_max_id = None
+    if state.seen_max_id is None:
+        state.seen_max_id = db.query(func.max(models.UsageLog.id)).scalar() or 0
+        state.seen_at = now
+    db.commit()
+    return horizon
+
+
+def _rollup_usage_batch(db: Session, horizon: int) -> Tuple[int, bool]:
+    """
+    Fold the next batch of usage logs up to `horizon` in one transaction.
+    Returns (rows folded, caught up).
+    """
+    state = _locked_state(db)
+    if state.last_id >= horizon:
+        db.rollback()
+        return 0, True
+
+    upper = min(horizon, state.last_id + ROLLUP_BATCH_SIZE)
+    day = func.date(models.UsageLog.created_at, type_=Date)
+    groups = (
+        db.query(
+            day.label("day"),
+            models.UsageLog.user_id,
+            func.coalesce(func.sum(models.UsageLog.tokens_used), 0).label("tokens"),
+            func.coalesce(func.sum(models.UsageLog.prompt_tokens), 0).label("prompt_tokens"),
+            func.coalesce(func.sum(models.UsageLog.completion_tokens), 0).label("completion_tokens"),
+            func.count().label("requests"),
+        )
+        .filter(models.UsageLog.id > state.last_id, models.UsageLog.id <= upper)
+        .group_by(day, models.UsageLog.user_id)
+        .all()
+    )
+
+    if groups:
+        existing = {
+            (row.day, row.user_id): row
+            for row in db.query(models.UsageDaily).filter(
+                models.UsageDaily.day.in_({g.day for g in groups}),
+                models.UsageDaily.user_id.in_({g.user_id for g in groups}),
+            )
+        }
+        for g in groups:
+            row = existing.get((g.day, g.user_id))
+            if row is None:
+                db.add(models.UsageDaily(
+                    day=g.day,
+                    user_id=g.user_id,
+                    tokens=g.tokens,
+                    prompt_tokens=g.prompt_tokens,
+                    completion_tokens=g.completion_tokens,
+                    requests=g.requests,
+                ))
+            else:
+                row.tokens += g.tokens
+                row.prompt_tokens += g.prompt_tokens
+                row.completion_tokens += g.completion_tokens
+                row.requests += g.requests
+
+    state.last_id = upper
+    db.commit()
+    return sum(g.requests for g in groups), upper >= horizon
+
+
+def rollup_usage() -> int:
+    """
+    Catch-up job: fold usage_logs rows past the high-water mark into
+    usage_daily. Returns the number of log rows folded.
+
+    Ids are handed out at INSERT but rows show up at COMMIT, so the newest
+    ids can still have an uncommitted smaller neighbour. Only ids that
+    already existed ROLLUP_SETTLE ago (recorded in rollup_state by an
+    earlier run, of any worker) are folded; by now those have committed.
+    The state row is locked while a batch is folded, so several workers can
+    run this without counting a row twice.
+    """
+    db = SessionLocal()
+    try:
+        horizon = _advance_horizon(db)
+
+        total, done = 0, False
+        while not done:
+            folded, done = _rollup_usage_batch(db, horizon)
+            total += folded
+        return total
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def record_payment(db: AsyncSession, payment: models.Payment):
+    """
+    Add a payment that just succeeded to revenue_daily. Call it in the same
+    transaction that sets status = "success", so both commit together.
+    """
+    key = (
+        models.RevenueDaily.day == payment.created_at.date(),
+        models.RevenueDaily.plan_id == payment.plan_id,
+        models.RevenueDaily.currency == payment.currency,
+    )
+    increment = (
+        update(models.RevenueDaily)
+        .where(*key)
+        .values(
+            amount=models.RevenueDaily.amount + payment.amount,
+            payments=models.RevenueDaily.payments + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    if (await db.execute(increment)).rowcount:
+        return
+    try:
+        # first payment of the day for this plan; another request may race us
+        async with db.begin_nested():
+            db.add(models.RevenueDaily(
+                day=payment.created_at.date(),
+                plan_id=payment.plan_id,
+                currency=payment.currency,
+                amount=payment.amount,
+                payments=1,
+            ))
+    except IntegrityError:
+        await db.execute(increment)
+
+
+async def run_rollup_worker():
+    """Background task: run the usage catch-up every ROLLUP_INTERVAL seconds."""
+    while True:
+        try:
+            await run_in_threadpool(rollup_usage)
+        except Exception as e:
+            print("Usage rollup failed:", e)
+        await asyncio.sleep(ROLLUP_INTERVAL)
@@ -0,0 +1,189 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from auth_context import auth_cache
+from database import SessionLocal
+from utils.jobs import WORKER_ID
+from utils.quota import TOKEN_PERIOD, flush_quota_deltas, quota_store
+
+load_dotenv()
+
+# Run the subscription schedule inside the API (one process at a time holds
+# the lease); set to false when `python manage.py run-schedule` runs from cron.
+SCHEDULER_IN_PROCESS = os.getenv("SCHEDULER_IN_PROCESS", "true").lower() == "true"
+SCHEDULER_INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", "60"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "500"))
+
+SUBSCRIPTIONS_LEASE = "subscriptions"
+
+
+def acquire_lease(name: str, owner: str, ttl: float) -> bool:
+    """
+    Take or renew the lease `name` for `owner` until now + ttl. Only one
+    owner holds it at a time; a holder that stops renewing loses it when it
+    runs out. The conditional UPDATE makes this safe on any database.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    db = SessionLocal()
+    try:
+        won = db.execute(
+            update(models.SchedulerLease)
+            .where(
+                models.SchedulerLease.name == name,
+                (models.SchedulerLease.owner == owner) | (models.SchedulerLease.expires_at < now),
+            )
+            .values(owner=owner, expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not won and db.get(models.SchedulerLease, name) is None:
+            db.add(models.SchedulerLease(name=name, owner=owner, expires_at=expires_at))
+            won = 1
+        db.commit()
+        return bool(won)
+    except IntegrityError:
+        db.rollback()       # another process created it first
+        return False
+    finally:
+        db.close()
+
+
+def _expire_batch(db: Session, now: datetime) -> int:
+    """Expire the next batch of active subscriptions past their end_date."""
+    rows = db.execute(
+        select(models.Subscription.id, models.Subscription.user_id)
+        .where(models.Subscription.status == "active", models.Subscription.end_date <= now)
+        .order_by(models.Subscription.end_date)
+        .limit(SCHEDULER_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        db.rollback()
+        return 0
+
+    db.execute(
+        update(models.Subscription)
+        .where(models.Subscription.id.in_([row.id for row in rows]))
+        .values(status="expired")
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    quota_store.forget([row.id for row in rows])
+    for row in rows:
+        auth_cache.invalidate(row.user_id)
+    return len(rows)
+
+
+def _reset_batch(db: Session, now: datetime) -> int:
+    """Start a new token period for the next batch of active subscriptions due for one."""
+    rows = db.execute(
+        select(
+            models.Subscription.id,
+            models.Subscription.user_id,
+            models.Subscription.tokens_reset_at,
+            models.Plan.tokens_per_month,
+        )
+        .join(models.Plan, models.Plan.id == models.Subscription.plan_id)
+        .where(
+            models.Subscription.status == "active",
+            models.Subscription.tokens_reset_at <= now,
+        )
+        .order_by(models.Subscription.tokens_reset_at)
+        .limit(SCHEDULER_BATCH_SIZE)
+        .with_for_update(of=models.Subscription, skip_locked=True)
+    ).all()
+    if not rows:
+        db.rollback()
+        return 0
+
+    # next reset: whole periods after the last one, so resets don't drift
+    # with the schedule (and a long outage skips the missed ones)
+    next_reset: Dict[int, datetime] = {}
+    for row in rows:
+        reset_at = row.tokens_reset_at + TOKEN_PERIOD
+        while reset_at <= now:
+            reset_at += TOKEN_PERIOD
+        next_reset[row.id] = reset_at
+
+    db.execute(
+        update(models.Subscription)
+        .where(models.Subscription.id.in_(next_reset.keys()))
+        .values(
+            used_tokens=0,
+            tokens_reset_at=case(next_reset, value=models.Subscription.id),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    quota_store.reset({row.id: row.tokens_per_month for row in rows})
+    for row in rows:
+        auth_cache.invalidate(row.user_id)
+    return len(rows)
+
+
+def run_schedule() -> Dict[str, int]:
+    """
+    One pass: expire subscriptions past their end_date, then reset the
+    token counters of those whose period ended. Set-based UPDATEs over the
+    (status, end_date) / (status, tokens_reset_at) indexes, in batches of
+    SCHEDULER_BATCH_SIZE, each its own short transaction.
+
+    Afterwards the chat path can rely on status == "active" alone.
+
+    Only this process's caches are updated right away. Other API workers
+    keep a cached (still active) subscription until their auth context runs
+    out (AUTH_CACHE_TTL). Token counters are reset in the quota store: with
+    Redis that is shared by every worker, with the in-process store it
+    only covers this process (which is why that store is single-worker).
+    A turn still running when its subscription expires is finished, its
+    tokens are only recorded in usage_logs.
+    """
+    now = datetime.utcnow()
+    # tokens charged so far belong to the period that is ending
+    flush_quota_deltas()
+
+    counts = {"expired": 0, "reset": 0}
+    db = SessionLocal()
+    try:
+        for name, batch in (("expired", _expire_batch), ("reset", _reset_batch)):
+            while True:
+                done = batch(db, now)
+                counts[name] += done
+                if done < SCHEDULER_BATCH_SIZE:
+                    break
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return counts
+
+
+def run_schedule_as_leader(owner: str = WORKER_ID) -> Optional[Dict[str, int]]:
+    """run_schedule() if this process holds the lease, else None."""
+    if not acquire_lease(SUBSCRIPTIONS_LEASE, owner, ttl=SCHEDULER_INTERVAL * 3):
+        return None
+    return run_schedule()
+
+
+async def run_scheduler():
+    """Background task: run the subscription schedule every SCHEDULER_INTERVAL seconds."""
+    if not SCHEDULER_IN_PROCESS:
+        return
+    while True:
+        try:
+            await run_in_threadpool(run_schedule_as_leader)
+        except Exception as e:
+            print("Subscription scheduler failed:", e)
+        await asyncio.sleep(SCHEDULER_INTERVAL)
@@ -0,0 +1,53 @@
+from typing import List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+_encoding = None
+
+# Per-message overhead of the chat format (role, separators), per OpenAI docs.
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text` with tiktoken if installed, else ~4 chars/token."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(messages: List[dict]) -> int:
+    """Estimated prompt tokens of a chat completion request."""
+    total = TOKENS_PER_REPLY
+    for m in messages:
+        total += TOKENS_PER_MESSAGE + count_tokens(m["content"])
+    return total
+
+
+def usage_from_response(
+    usage: Optional[dict], messages: List[dict], reply_text: str
+) -> dict:
+    """
+    Normalize the provider's `usage` block to prompt/completion/total tokens.
+    Missing values are estimated locally.
+    """
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+
+    if prompt_tokens is None:
+        prompt_tokens = count_message_tokens(messages)
+    if completion_tokens is None:
+        completion_tokens = count_tokens(reply_text)
+
+    return {
+        "prompt_tokens": int(prompt_tokens),
+        "completion_tokens": int(completion_tokens),
+        "total_tokens": int(prompt_tokens) + int(completion_tokens),
+    }
@@ -0,0 +1,155 @@
+import asyncio
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import insert, select
+
+import models
+from database import AsyncSessionLocal
+
+load_dotenv()
+
+
+class WriteBuffer:
+    """
+    Group commit for the append-only rows of a chat turn: usage logs (and,
+    with `chat_messages`, assistant replies) are queued in memory and
+    written by one background task every `interval` seconds or as soon as
+    `max_rows` are waiting, in one transaction (multi-row INSERT for the
+    usage logs).
+
+    mode "group": every caller waits until its rows have committed, so a
+                  response is only sent once its turn is durable; concurrent
+                  turns share one commit.
+    mode "async": usage logs are written behind (the caller doesn't wait;
+                  a crash loses at most one interval of them). Chat messages
+                  are always waited for, their ids go back to the client.
+    mode "off":   the caller commits its rows itself, as before.
+    """
+
+    def __init__(self, mode: str = "off", interval: float = 0.02, max_rows: int = 200,
+                 chat_messages: bool = False):
+        self.mode = mode if mode in ("group", "async") else "off"
+        self.interval = interval
+        self.max_rows = max_rows
+        self.chat_messages = chat_messages
+        # (usage log rows, chat messages, future of a waiting caller or None)
+        self._pending: List[Tuple[List[dict], List[models.ChatMessage], Optional[asyncio.Future]]] = []
+        self._rows = 0
+        self._full: Optional[asyncio.Event] = None
+        self.running = False
+        self.flushes = 0
+        self.rows_written = 0
+        self.max_batch = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Only while the flusher runs (in the API process); otherwise callers commit directly."""
+        return self.mode != "off" and self.running
+
+    async def write(self, usage_logs: Sequence[dict], messages: Sequence[models.ChatMessage] = ()):
+        """
+        Queue usage log rows (column dicts) and new ChatMessage objects.
+        Returns once they are committed (messages then have their id and
+        created_at), except for usage logs alone in "async" mode.
+        """
+        future = None
+        if messages or self.mode == "group":
+            future = asyncio.get_running_loop().create_future()
+        self._pending.append((list(usage_logs), list(messages), future))
+        self._rows += len(usage_logs) + len(messages)
+        if self._rows >= self.max_rows and self._full is not None:
+            self._full.set()
+        if future is not None:
+            await future
+
+    async def flush(self) -> int:
+        """Write everything queued so far in one transaction. Returns the number of rows."""
+        pending, self._pending, self._rows = self._pending, [], 0
+        if not pending:
+            return 0
+
+        usage_logs = [row for entry in pending for row in entry[0]]
+        messages = [message for entry in pending for message in entry[1]]
+        committed = False
+        try:
+            async with AsyncSessionLocal() as db:
+                if usage_logs:
+                    await db.execute(insert(models.UsageLog), usage_logs)
+                db.add_all(messages)
+                await db.commit()
+                committed = True
+                if messages:
+                    # created_at is a server default: load it for all of them at once
+                    (await db.scalars(
+                        select(models.ChatMessage)
+                        .where(models.ChatMessage.id.in_([m.id for m in messages]))
+                        .execution_options(populate_existing=True)
+                    )).all()
+        except BaseException as e:
+            # also on cancellation (shutdown): no row is dropped silently and
+            # no caller is left waiting
+            self.failures += 1
+            error = e if isinstance(e, Exception) else RuntimeError("Write buffer flush was cancelled")
+            for usage, new_messages, future in pending:
+                if future is None:
+                    if not committed:
+                        # nobody waits for these: retry with the next flush
+                        self._pending.append((usage, new_messages, None))
+                        self._rows += len(usage)
+                elif not future.done():
+                    future.set_exception(error)
+            raise
+
+        rows = len(usage_logs) + len(messages)
+        self.flushes += 1
+        self.rows_written += rows
+        self.max_batch = max(self.max_batch, rows)
+        for _, _, future in pending:
+            if future is not None and not future.done():
+                future.set_result(None)
+        return rows
+
+    async def run(self):
+        """Background task: flush every `interval` seconds, or when `max_rows` are queued."""
+        if self.mode == "off":
+            return
+        self._full = asyncio.Event()
+        self.running = True
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._full.clear()
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print("Write buffer flush failed:", e)
+        finally:
+            # last flush on shutdown; later writes commit directly
+            self.running = False
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "chat_messages": self.chat_messages,
+            "queued_rows": self._rows,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "avg_batch": round(self.rows_written / self.flushes, 2) if self.flushes else 0.0,
+            "max_batch": self.max_batch,
+            "failures": self.failures,
+        }
+
+
+write_buffer = WriteBuffer(
+    mode=os.getenv("WRITE_BUFFER_MODE", "off").lower(),
+    interval=float(os.getenv("WRITE_BUFFER_INTERVAL_MS", "20")) / 1000,
+    max_rows=int(os.getenv("WRITE_BUFFER_MAX_ROWS", "200")),
+    chat_messages=os.getenv("WRITE_BUFFER_CHAT_MESSAGES", "true").lower() == "true",
+)
@@ -0,0 +1,25 @@
+"""
+Standalone background job worker.
+
+Run next to the API (`python worker.py`, as many as needed) and start the
+API with JOBS_IN_PROCESS=false to keep job work out of the web processes.
+"""
+import asyncio
+
+import utils.billing_jobs  # noqa: F401  (registers the invoice job handlers)
+import utils.chat_context  # noqa: F401  (registers the chat summary job handler)
+from utils.ai_client import close_clients
+from utils.jobs import run_job_worker
+from utils.mailer import mailer
+
+
+async def main():
+    try:
+        await run_job_worker()
+    finally:
+        await close_clients()
+        await mailer.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
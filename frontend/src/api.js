@@ -26,7 +26,7 @@ export async function login(email, password) {
 
 // ---------- CHAT ----------
 
-export async function sendMessage(message) {
+export async function sendMessage(message, conversationId) {
     const token = localStorage.getItem("token");
     const res = await fetch(`${API_BASE}/chat`, {
         method: "POST",
@@ -34,7 +34,7 @@ export async function sendMessage(message) {
             "Content-Type": "application/json",
             Authorization: `Bearer ${token}`,
         },
-        body: JSON.stringify({ message }),
+        body: JSON.stringify({ message, conversation_id: conversationId || null }),
     });
 
     const data = await res.json().catch(() => ({}));
@@ -42,6 +42,68 @@ export async function sendMessage(message) {
     return data;
 }
 
+export async function getChatHistory({ conversationId, beforeId, sinceId, limit } = {}) {
+    const token = localStorage.getItem("token");
+    const params = new URLSearchParams();
+    if (conversationId) params.set("conversation_id", conversationId);
+    if (beforeId) params.set("before_id", beforeId);
+    if (sinceId) params.set("since_id", sinceId);
+    if (limit) params.set("limit", limit);
+
+    const res = await fetch(`${API_BASE}/chat/history?${params}`, {
+        headers: {
+            "Content-Type": "application/json",
+            Authorization: `Bearer ${token}`,
+        },
+    });
+
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(data.detail || "Failed to load chat history");
+    return data;
+}
+
+// ---------- CONVERSATIONS ----------
+
+async function conversationRequest(path, options = {}) {
+    const token = localStorage.getItem("token");
+    const res = await fetch(`${API_BASE}/conversations${path}`, {
+        ...options,
+        headers: {
+            "Content-Type": "application/json",
+            Authorization: `Bearer ${token}`,
+        },
+    });
+    if (res.status === 204) return null;
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(data.detail || "Conversation request failed");
+    return data;
+}
+
+// one page, most recently active first: { items, next_cursor }
+export function getConversations(cursor) {
+    const params = new URLSearchParams();
+    if (cursor) params.set("cursor", cursor);
+    return conversationRequest(cursor ? `?${params}` : "");
+}
+
+export function createConversation(title) {
+    return conversationRequest("", {
+        method: "POST",
+        body: JSON.stringify({ title: title || null }),
+    });
+}
+
+export function renameConversation(id, title) {
+    return conversationRequest(`/${id}`, {
+        method: "PATCH",
+        body: JSON.stringify({ title }),
+    });
+}
+
+export function deleteConversation(id) {
+    return conversationRequest(`/${id}`, { method: "DELETE" });
+}
+
 // ---------- PLANS (PUBLIC) ----------
 
 export async function getActivePlans() {
@@ -135,8 +197,19 @@ export async function adminTogglePlan(id) {
 }
 
 // Billing
-export async function adminGetPayments() {
-    const res = await fetch(`${API_BASE}/admin/billing/payments`, {
+function paymentParams(filters = {}) {
+    const params = new URLSearchParams();
+    for (const [key, value] of Object.entries(filters)) {
+        if (value) params.set(key, value);
+    }
+    return params;
+}
+
+// One page: { items, next_cursor }. Filters: gateway, status, currency,
+// from, to, user_email, cursor, limit.
+export async function adminGetPayments(filters = {}) {
+    const params = paymentParams(filters);
+    const res = await fetch(`${API_BASE}/admin/billing/payments?${params}`, {
         headers: authHeaders(),
     });
     const data = await res.json().catch(() => ({}));
@@ -144,6 +217,23 @@ export async function adminGetPayments() {
     return data;
 }
 
+export async function adminExportPayments(format = "csv", filters = {}) {
+    const params = paymentParams({ ...filters, format });
+    const res = await fetch(`${API_BASE}/admin/billing/payments/export?${params}`, {
+        headers: authHeaders(),
+    });
+    if (!res.ok) {
+        const data = await res.json().catch(() => ({}));
+        throw new Error(data.detail || "Failed to export payments");
+    }
+    const url = URL.createObjectURL(await res.blob());
+    const link = document.createElement("a");
+    link.href = url;
+    link.download = `payments.${format}`;
+    link.click();
+    URL.revokeObjectURL(url);
+}
+
 export async function adminGetUsageSummary() {
     const res = await fetch(`${API_BASE}/admin/billing/usage-summary`, {
         headers: authHeaders(),
@@ -56,7 +56,7 @@ export default function AdminDashboard() {
                             <ul className="usage-list">
                                 {summary.top_users.slice(0, 5).map((u) => (
                                     <li key={u.email}>
-                                        <strong>{u.email}</strong> — {u.tokens} msgs
+                                        <strong>{u.email}</strong> — {u.tokens} tokens
                                     </li>
                                 ))}
                             </ul>
@@ -1,20 +1,39 @@
 import React, { useEffect, useState } from "react";
-import { adminGetPayments } from "../api";
+import { adminExportPayments, adminGetPayments } from "../api";
+
+const EMPTY_FILTERS = { gateway: "", status: "", currency: "", user_email: "", from: "", to: "" };
 
 export default function AdminPayments() {
     const [payments, setPayments] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [filters, setFilters] = useState(EMPTY_FILTERS);
     const [error, setError] = useState("");
 
+    const loadPage = async (cursor = null) => {
+        try {
+            const data = await adminGetPayments({ ...filters, cursor });
+            setPayments((prev) => (cursor ? [...prev, ...data.items] : data.items));
+            setNextCursor(data.next_cursor);
+            setError("");
+        } catch (e) {
+            setError(e.message);
+        }
+    };
+
     useEffect(() => {
-        (async () => {
-            try {
-                const data = await adminGetPayments();
-                setPayments(data);
-            } catch (e) {
-                setError(e.message);
-            }
-        })();
-    }, []);
+        loadPage();
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [filters]);
+
+    const setFilter = (key) => (e) => setFilters({ ...filters, [key]: e.target.value });
+
+    const exportAs = async (format) => {
+        try {
+            await adminExportPayments(format, filters);
+        } catch (e) {
+            setError(e.message);
+        }
+    };
 
     return (
         <div className="admin-page">
@@ -28,6 +47,39 @@ export default function AdminPayments() {
             <div className="admin-card">
                 {error && <div className="admin-error">{error}</div>}
 
+                <div className="payment-filters">
+                    <select value={filters.gateway} onChange={setFilter("gateway")}>
+                        <option value="">All gateways</option>
+                        <option value="razorpay">Razorpay</option>
+                        <option value="stripe">Stripe</option>
+                    </select>
+                    <select value={filters.status} onChange={setFilter("status")}>
+                        <option value="">All statuses</option>
+                        <option value="success">success</option>
+                        <option value="created">created</option>
+                        <option value="pending">pending</option>
+                    </select>
+                    <select value={filters.currency} onChange={setFilter("currency")}>
+                        <option value="">All currencies</option>
+                        <option value="INR">INR</option>
+                        <option value="USD">USD</option>
+                    </select>
+                    <input
+                        type="email"
+                        placeholder="User email"
+                        value={filters.user_email}
+                        onChange={setFilter("user_email")}
+                    />
+                    <input type="date" value={filters.from} onChange={setFilter("from")} />
+                    <input type="date" value={filters.to} onChange={setFilter("to")} />
+                    <button className="btn-secondary" onClick={() => exportAs("csv")}>
+                        Export CSV
+                    </button>
+                    <button className="btn-secondary" onClick={() => exportAs("ndjson")}>
+                        Export NDJSON
+                    </button>
+                </div>
+
                 <div className="table-wrapper">
                     <table className="plans-table">
                         <thead>
@@ -78,6 +130,12 @@ export default function AdminPayments() {
                         </tbody>
                     </table>
                 </div>
+
+                {nextCursor && (
+                    <button className="btn-secondary" onClick={() => loadPage(nextCursor)}>
+                        Load more
+                    </button>
+                )}
             </div>
         </div>
     );
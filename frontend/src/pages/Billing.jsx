@@ -6,9 +6,9 @@ export default function Billing() {
 
     useEffect(() => {
         (async () => {
-            const data = await adminGetPayments();
             const userEmail = localStorage.getItem("email");
-            setPayments(data.filter(p => p.user_email === userEmail));
+            const data = await adminGetPayments({ user_email: userEmail, limit: 100 });
+            setPayments(data.items);
         })();
     }, []);
 
@@ -1,5 +1,13 @@
 import React, { useEffect, useState } from "react";
-import { sendMessage, getMySubscription } from "../api";
+import {
+    sendMessage,
+    getMySubscription,
+    getChatHistory,
+    getConversations,
+    createConversation,
+    renameConversation,
+    deleteConversation,
+} from "../api";
 import ChatMessage from "../components/ChatMessage";
 
 export default function Chat() {
@@ -8,14 +16,94 @@ export default function Chat() {
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState("");
     const [sub, setSub] = useState(null);
+    const [conversations, setConversations] = useState([]);
+    const [conversationsCursor, setConversationsCursor] = useState(null);
+    const [conversationId, setConversationId] = useState(null);
+
+    const loadConversations = () =>
+        getConversations()
+            .then((page) => {
+                setConversations(page.items);
+                setConversationsCursor(page.next_cursor);
+            })
+            .catch(() => {});
+
+    const loadMoreConversations = () =>
+        getConversations(conversationsCursor)
+            .then((page) => {
+                setConversations((prev) => [
+                    ...prev,
+                    ...page.items.filter((c) => !prev.some((p) => p.id === c.id)),
+                ]);
+                setConversationsCursor(page.next_cursor);
+            })
+            .catch(() => {});
 
     useEffect(() => {
         (async () => {
             const s = await getMySubscription();
             setSub(s);
         })();
+        loadConversations();
+        // latest conversation by default
+        getChatHistory()
+            .then((page) => {
+                setConversationId(page.conversation_id);
+                setMessages(page.messages);
+            })
+            .catch(() => {});
     }, []);
 
+    const openConversation = async (id) => {
+        setError("");
+        setConversationId(id);
+        setMessages([]);
+        try {
+            const page = await getChatHistory({ conversationId: id });
+            setMessages(page.messages);
+        } catch (err) {
+            setError(err.message || "Failed to load chat history");
+        }
+    };
+
+    const handleNewChat = async () => {
+        try {
+            const conversation = await createConversation();
+            setConversations((prev) => [conversation, ...prev]);
+            setConversationId(conversation.id);
+            setMessages([]);
+        } catch (err) {
+            setError(err.message || "Could not start a new chat");
+        }
+    };
+
+    const handleRename = async (conversation) => {
+        const title = window.prompt("Rename chat", conversation.title);
+        if (!title || !title.trim()) return;
+        try {
+            const updated = await renameConversation(conversation.id, title.trim());
+            setConversations((prev) =>
+                prev.map((c) => (c.id === updated.id ? updated : c))
+            );
+        } catch (err) {
+            setError(err.message || "Rename failed");
+        }
+    };
+
+    const handleDelete = async (conversation) => {
+        if (!window.confirm(`Delete "${conversation.title}" and its messages?`)) return;
+        try {
+            await deleteConversation(conversation.id);
+            setConversations((prev) => prev.filter((c) => c.id !== conversation.id));
+            if (conversation.id === conversationId) {
+                setConversationId(null);
+                setMessages([]);
+            }
+        } catch (err) {
+            setError(err.message || "Delete failed");
+        }
+    };
+
     const handleSend = async (e) => {
         e.preventDefault();
         if (!input.trim()) return;
@@ -33,8 +121,13 @@ export default function Chat() {
         setLoading(true);
 
         try {
-            const res = await sendMessage(currentInput);
-            setMessages(res.history);
+            const res = await sendMessage(currentInput, conversationId);
+            setConversationId(res.conversation_id);
+            setMessages((prev) => [
+                ...prev.filter((m) => m.id !== newUserMessage.id),
+                ...res.messages,
+            ]);
+            loadConversations();
             const s = await getMySubscription();
             setSub(s);
         } catch (err) {
@@ -46,6 +139,48 @@ export default function Chat() {
 
     return (
         <div className="chat-page">
+            <aside className="chat-threads">
+                <button className="chat-new-thread" onClick={handleNewChat}>
+                    + New chat
+                </button>
+                <ul>
+                    {conversations.map((c) => (
+                        <li
+                            key={c.id}
+                            className={c.id === conversationId ? "active" : ""}
+                            onClick={() => openConversation(c.id)}
+                        >
+                            <span className="chat-thread-title">{c.title}</span>
+                            <span className="chat-thread-actions">
+                                <button
+                                    title="Rename"
+                                    onClick={(e) => {
+                                        e.stopPropagation();
+                                        handleRename(c);
+                                    }}
+                                >
+                                    ✎
+                                </button>
+                                <button
+                                    title="Delete"
+                                    onClick={(e) => {
+                                        e.stopPropagation();
+                                        handleDelete(c);
+                                    }}
+                                >
+                                    ✕
+                                </button>
+                            </span>
+                        </li>
+                    ))}
+                </ul>
+                {conversationsCursor && (
+                    <button className="chat-more-threads" onClick={loadMoreConversations}>
+                        Load more
+                    </button>
+                )}
+            </aside>
+
             <div className="chat-container">
                 <div className="chat-header">
                     <h2>Your AI Assistant</h2>
@@ -56,7 +191,7 @@ export default function Chat() {
                     <div className="current-plan-banner">
                         Plan: <strong>{sub.plan_name}</strong> —{" "}
                         <span>
-                            {sub.remaining_tokens} / {sub.tokens_per_month} messages left
+                            {sub.remaining_tokens} / {sub.tokens_per_month} tokens left
                         </span>
                     </div>
                 )}
@@ -55,7 +55,7 @@ export default function Pricing() {
                 <div className="current-plan-banner">
                     <span>
                         Current plan: <strong>{sub.plan_name}</strong> —{" "}
-                        {sub.remaining_tokens} / {sub.tokens_per_month} messages left
+                        {sub.remaining_tokens} / {sub.tokens_per_month} tokens left
                     </span>
                 </div>
             )}
@@ -78,7 +78,7 @@ export default function Pricing() {
                                 <span className="per">per month</span>
                             </div>
                             <ul className="plan-features">
-                                <li>{p.tokens_per_month} AI messages/month</li>
+                                <li>{p.tokens_per_month} AI tokens/month</li>
                                 <li>Email support</li>
                                 <li>Secure billing</li>
                             </ul>